@@ -0,0 +1,213 @@
+"""
+Account Pool Module
+Dùng nhiều cookie (tài khoản) cùng lúc: mỗi tài khoản có session và rate limiter riêng,
+request API được chia cho các tài khoản còn khỏe, tài khoản bị 429 / mất đăng nhập được cho nghỉ
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from retry_policy import AdaptiveRateLimiter, RetryPolicy
+
+
+class Account:
+    """Một cookie trong pool cùng session, rate limiter và bộ đếm của nó"""
+    
+    def __init__(self, name: str, cookie: str, session: requests.Session, limiter: AdaptiveRateLimiter):
+        """
+        Khởi tạo Account
+        
+        Args:
+            name: Tên hiển thị trong thống kê (không chứa cookie)
+            cookie: Cookie string của tài khoản
+            session: Session gửi request API của tài khoản
+            limiter: Rate limiter riêng của tài khoản
+        """
+        self.name = name
+        self.cookie = cookie
+        self.session = session
+        self.limiter = limiter
+        # Số request đang chạy, số lần lỗi liên tiếp và thời điểm hết nghỉ (time.monotonic)
+        self.in_flight = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+        self.stats = {'requests': 0, 'errors': 0, 'throttled': 0, 'login_required': 0, 'cooldowns': 0}
+    
+    def is_cooling(self, now: float) -> bool:
+        """Tài khoản đang trong thời gian nghỉ"""
+        return now < self.cooldown_until
+    
+    def state(self, now: float) -> str:
+        """
+        Trạng thái: "healthy", "cooling" (đang nghỉ) hoặc "checking"
+        (hết thời gian nghỉ, request kế tiếp sẽ cho biết tài khoản đã dùng lại được chưa)
+        """
+        if self.is_cooling(now):
+            return "cooling"
+        return "checking" if self.failures else "healthy"
+
+
+class AccountPool:
+    """
+    Chia request API cho nhiều tài khoản
+    
+    acquire() chọn tài khoản không nghỉ có ít request đang chạy nhất (rồi ít request
+    nhất), nên các job chạy song song được rải đều. Khi bị 429/403 hoặc API báo
+    chưa đăng nhập, tài khoản được cho nghỉ; thời gian nghỉ gấp đôi sau mỗi lần lỗi
+    liên tiếp (tối đa MAX_COOLDOWN). Hết thời gian nghỉ tài khoản được chọn lại như
+    bình thường, request thành công đầu tiên đưa nó về trạng thái khỏe.
+    Nếu mọi tài khoản đều đang nghỉ thì dùng tài khoản sắp hết nghỉ nhất
+    (rate limiter của nó vẫn tạm dừng theo Retry-After), không chặn job.
+    """
+    
+    # Thời gian nghỉ mặc định khi bị giới hạn tốc độ / khi mất đăng nhập (giây)
+    THROTTLE_COOLDOWN = 60.0
+    LOGIN_COOLDOWN = 600.0
+    # Thời gian nghỉ tối đa sau nhiều lần lỗi liên tiếp (giây)
+    MAX_COOLDOWN = 3600.0
+    # status_code trong JSON của API Douyin khi cookie không còn đăng nhập
+    LOGIN_STATUS_CODES = {8}
+    # HTTP status khi cookie không còn đăng nhập
+    LOGIN_HTTP_STATUS = {401}
+    
+    def __init__(self, cookies: List[str], session_factory: Callable[[str], requests.Session],
+                 rate: float = 2.0, burst: int = 4,
+                 throttle_cooldown: Optional[float] = None, login_cooldown: Optional[float] = None):
+        """
+        Khởi tạo AccountPool
+        
+        Args:
+            cookies: Danh sách cookie (cookie trùng bị bỏ; rỗng thì dùng một tài khoản không cookie)
+            session_factory: Hàm tạo session cho một cookie
+            rate: Số request API tối đa mỗi giây của mỗi tài khoản
+            burst: Số request được gửi dồn cùng lúc của mỗi tài khoản
+            throttle_cooldown: Thời gian nghỉ khi bị 429/403 (giây)
+            login_cooldown: Thời gian nghỉ khi mất đăng nhập (giây)
+        """
+        unique = []
+        for cookie in cookies:
+            cookie = (cookie or "").strip()
+            if cookie not in unique:
+                unique.append(cookie)
+        self.accounts = [
+            Account(f"account-{i + 1}", cookie, session_factory(cookie), AdaptiveRateLimiter(rate=rate, burst=burst))
+            for i, cookie in enumerate(unique or [""])
+        ]
+        self.throttle_cooldown = float(self.THROTTLE_COOLDOWN if throttle_cooldown is None else throttle_cooldown)
+        self.login_cooldown = float(self.LOGIN_COOLDOWN if login_cooldown is None else login_cooldown)
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls, cookies: List[str], session_factory: Callable[[str], requests.Session],
+                      settings: Dict) -> "AccountPool":
+        """Tạo AccountPool từ settings (api_rate, api_burst, cookie_cooldown, cookie_login_cooldown)"""
+        return cls(
+            cookies,
+            session_factory,
+            rate=settings.get("api_rate", 2.0),
+            burst=settings.get("api_burst", 4),
+            throttle_cooldown=settings.get("cookie_cooldown"),
+            login_cooldown=settings.get("cookie_login_cooldown")
+        )
+    
+    @property
+    def primary(self) -> Account:
+        """Tài khoản đầu tiên (cookie chính)"""
+        return self.accounts[0]
+    
+    def acquire(self) -> Account:
+        """
+        Chọn tài khoản cho một request API (gọi release() khi request xong)
+        
+        Returns:
+            Tài khoản không nghỉ ít bận nhất, hoặc tài khoản sắp hết nghỉ nhất nếu mọi tài khoản đều nghỉ
+        """
+        with self._lock:
+            now = time.monotonic()
+            ready = [account for account in self.accounts if not account.is_cooling(now)]
+            if ready:
+                account = min(ready, key=lambda a: (a.in_flight, a.stats['requests']))
+            else:
+                account = min(self.accounts, key=lambda a: a.cooldown_until)
+            account.in_flight += 1
+            account.stats['requests'] += 1
+            return account
+    
+    def release(self, account: Account, status_code: Optional[int] = None, data=None,
+                error: Optional[str] = None, retry_after: Optional[float] = None) -> Optional[str]:
+        """
+        Ghi nhận kết quả request của tài khoản
+        
+        Args:
+            account: Tài khoản đã lấy từ acquire()
+            status_code: HTTP status (None nếu lỗi kết nối)
+            data: JSON trả về (để nhận biết API báo chưa đăng nhập)
+            error: Mô tả lỗi kết nối / đọc response
+            retry_after: Số giây server yêu cầu chờ (header Retry-After)
+        
+        Returns:
+            "throttled", "login_required", "error" hoặc None nếu request thành công
+        """
+        if status_code in self.LOGIN_HTTP_STATUS or self.is_login_required(data):
+            outcome = "login_required"
+        elif status_code in RetryPolicy.THROTTLE_STATUS:
+            outcome = "throttled"
+        elif error is not None or status_code != 200:
+            outcome = "error"
+        else:
+            outcome = None
+        
+        with self._lock:
+            account.in_flight -= 1
+            if outcome is None:
+                account.failures = 0
+                return None
+            account.stats['errors'] += 1
+            account.last_error = error or (f"HTTP {status_code}" if status_code != 200 else "API báo chưa đăng nhập")
+            if outcome == "error":
+                return outcome
+            
+            account.stats[outcome] += 1
+            account.stats['cooldowns'] += 1
+            account.failures += 1
+            base = self.login_cooldown if outcome == "login_required" else self.throttle_cooldown
+            cooldown = min(self.MAX_COOLDOWN, base * 2 ** (account.failures - 1))
+            if retry_after is not None:
+                cooldown = max(cooldown, min(retry_after, self.MAX_COOLDOWN))
+            account.cooldown_until = max(account.cooldown_until, time.monotonic() + cooldown)
+        print(f"Tài khoản {account.name} tạm nghỉ {cooldown:.0f}s ({account.last_error})")
+        return outcome
+    
+    @classmethod
+    def is_login_required(cls, data) -> bool:
+        """JSON của API báo cookie không còn đăng nhập"""
+        return isinstance(data, dict) and data.get('status_code') in cls.LOGIN_STATUS_CODES
+    
+    def healthy_count(self) -> int:
+        """Số tài khoản không trong thời gian nghỉ"""
+        now = time.monotonic()
+        return sum(1 for account in self.accounts if not account.is_cooling(now))
+    
+    def get_stats(self) -> List[Dict]:
+        """
+        Thống kê từng tài khoản
+        
+        Returns:
+            Danh sách dict gồm name, state, requests, errors, throttled, login_required,
+            cooldowns, cooldown_left (giây), last_error, rate (rate limiter hiện tại)
+        """
+        now = time.monotonic()
+        stats = []
+        with self._lock:
+            for account in self.accounts:
+                entry = {'name': account.name, 'state': account.state(now)}
+                entry.update(account.stats)
+                entry['cooldown_left'] = round(max(0.0, account.cooldown_until - now), 1)
+                entry['last_error'] = account.last_error
+                entry['rate'] = account.limiter.rate
+                stats.append(entry)
+        return stats
@@ -0,0 +1,248 @@
+"""
+Bandwidth Module
+Giới hạn tổng băng thông tải (byte/giây), chia đều cho các lượt tải đang chạy, có lịch theo giờ
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def parse_rate(value) -> float:
+    """
+    Đọc giới hạn tốc độ từ config
+    
+    Args:
+        value: Số byte/giây, hoặc chuỗi có hậu tố K/M/G ("500K", "2M"); 0/None/"" = không giới hạn
+    
+    Returns:
+        Số byte/giây (0 = không giới hạn)
+    """
+    if value in (None, ""):
+        return 0.0
+    if isinstance(value, (int, float)):
+        return max(0.0, float(value))
+    text = str(value).strip().upper().rstrip('B').rstrip('/S')
+    factors = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    factor = factors.get(text[-1:], 1)
+    if text[-1:] in factors:
+        text = text[:-1]
+    try:
+        return max(0.0, float(text) * factor)
+    except ValueError:
+        print(f"Giới hạn băng thông không hợp lệ: {value}")
+        return 0.0
+
+
+def _parse_clock(value: str) -> int:
+    """Đổi "HH:MM" thành số phút trong ngày"""
+    hours, minutes = str(value).split(':')
+    return (int(hours) % 24) * 60 + int(minutes)
+
+
+class BandwidthLimiter:
+    """
+    Token bucket dùng chung cho toàn bộ byte tải về
+    
+    Mỗi lượt tải mở một TransferThrottle. Ngoài bucket chung, mỗi lượt tải
+    có bucket riêng với tốc độ bằng giới hạn chia cho số lượt đang hoạt động,
+    nên một video lớn (kể cả tải nhiều đoạn song song) không chiếm hết băng thông
+    của các video nhỏ. Lượt tải không nhận byte nào trong ACTIVE_WINDOW giây
+    không được tính khi chia phần.
+    
+    Lịch (schedule) là danh sách {"start": "HH:MM", "end": "HH:MM", "limit": ...};
+    ngoài các khung giờ trong lịch thì dùng giới hạn mặc định.
+    """
+    
+    # Lượng byte được dồn tối đa (tính theo số giây của tốc độ)
+    BURST_SECONDS = 0.25
+    # Lượt tải không tiêu thụ trong khoảng này (giây) không được tính khi chia phần
+    ACTIVE_WINDOW = 1.0
+    # Thời gian chờ tối đa mỗi lần (giây), để đổi giới hạn có hiệu lực nhanh
+    MAX_SLEEP = 0.25
+    # Chu kỳ kiểm tra lại lịch (giây)
+    SCHEDULE_CHECK = 1.0
+    
+    def __init__(self, limit=0, schedule: Optional[List[Dict]] = None):
+        """
+        Khởi tạo BandwidthLimiter
+        
+        Args:
+            limit: Giới hạn mặc định (byte/giây hoặc chuỗi "2M"), 0 = không giới hạn
+            schedule: Lịch giới hạn theo giờ trong ngày (tùy chọn)
+        """
+        self._lock = threading.Lock()
+        self._limit = parse_rate(limit)
+        self._schedule = self._parse_schedule(schedule)
+        self._rate = self._limit
+        self._rate_checked = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._transfers: Dict[int, "TransferThrottle"] = {}
+        self._stats = {'waits': 0, 'wait_seconds': 0.0, 'bytes': 0}
+        self._refresh_rate(force=True)
+    
+    @classmethod
+    def from_settings(cls, settings: Dict) -> "BandwidthLimiter":
+        """Tạo BandwidthLimiter từ settings (bandwidth_limit, bandwidth_schedule)"""
+        return cls(settings.get("bandwidth_limit", 0), settings.get("bandwidth_schedule"))
+    
+    @staticmethod
+    def _parse_schedule(schedule: Optional[List[Dict]]) -> List[tuple]:
+        """Đổi lịch trong config thành [(phút bắt đầu, phút kết thúc, byte/giây)]"""
+        windows = []
+        for entry in schedule or []:
+            try:
+                windows.append((
+                    _parse_clock(entry["start"]),
+                    _parse_clock(entry["end"]),
+                    parse_rate(entry.get("limit", 0))
+                ))
+            except (KeyError, ValueError, TypeError, AttributeError):
+                print(f"Bỏ qua khung giờ không hợp lệ trong bandwidth_schedule: {entry}")
+        return windows
+    
+    @property
+    def rate(self) -> float:
+        """Giới hạn đang áp dụng (byte/giây, 0 = không giới hạn)"""
+        self._refresh_rate()
+        return self._rate
+    
+    def set_limit(self, limit):
+        """Đổi giới hạn mặc định khi đang chạy (byte/giây hoặc chuỗi "2M", 0 = bỏ giới hạn)"""
+        with self._lock:
+            self._limit = parse_rate(limit)
+        self._refresh_rate(force=True)
+    
+    def set_schedule(self, schedule: Optional[List[Dict]]):
+        """Đổi lịch giới hạn theo giờ khi đang chạy"""
+        windows = self._parse_schedule(schedule)
+        with self._lock:
+            self._schedule = windows
+        self._refresh_rate(force=True)
+    
+    def limit_at(self, moment: Optional[datetime] = None) -> float:
+        """
+        Giới hạn theo lịch tại một thời điểm
+        
+        Args:
+            moment: Thời điểm cần xét (mặc định bây giờ)
+        
+        Returns:
+            Byte/giây (0 = không giới hạn)
+        """
+        moment = moment or datetime.now()
+        minute = moment.hour * 60 + moment.minute
+        for start, end, limit in self._schedule:
+            # Khung giờ qua nửa đêm (ví dụ 22:00 - 06:00)
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                return limit
+        return self._limit
+    
+    def _refresh_rate(self, force: bool = False):
+        """Cập nhật giới hạn theo lịch, tối đa một lần mỗi SCHEDULE_CHECK giây"""
+        now = time.monotonic()
+        if not force and now - self._rate_checked < self.SCHEDULE_CHECK:
+            return
+        rate = self.limit_at()
+        with self._lock:
+            self._rate_checked = now
+            if rate != self._rate:
+                self._rate = rate
+                self._tokens = min(self._tokens, rate * self.BURST_SECONDS)
+    
+    def open(self) -> "TransferThrottle":
+        """Bắt đầu một lượt tải, trả về TransferThrottle để gọi consume sau mỗi chunk"""
+        throttle = TransferThrottle(self)
+        with self._lock:
+            self._transfers[id(throttle)] = throttle
+        return throttle
+    
+    def _close(self, throttle: "TransferThrottle"):
+        """Kết thúc một lượt tải"""
+        with self._lock:
+            self._transfers.pop(id(throttle), None)
+    
+    def _consume(self, throttle: "TransferThrottle", num_bytes: int) -> float:
+        """
+        Chờ đến khi cả bucket chung và phần của lượt tải đủ cho num_bytes
+        
+        Returns:
+            Số giây đã chờ
+        """
+        self._refresh_rate()
+        if not self._rate:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                rate = self._rate
+                if not rate:
+                    break
+                now = time.monotonic()
+                throttle.last_active = now
+                active = sum(
+                    1 for t in self._transfers.values()
+                    if now - t.last_active <= self.ACTIVE_WINDOW
+                ) or 1
+                share = rate / active
+                
+                self._tokens = min(rate * self.BURST_SECONDS, self._tokens + (now - self._updated) * rate)
+                self._updated = now
+                throttle.tokens = min(
+                    share * self.BURST_SECONDS,
+                    throttle.tokens + (now - throttle.updated) * share
+                )
+                throttle.updated = now
+                
+                # Cho phép âm (nợ) để chunk lớn hơn burst vẫn đi qua được
+                if self._tokens > 0 and throttle.tokens > 0:
+                    self._tokens -= num_bytes
+                    throttle.tokens -= num_bytes
+                    self._stats['bytes'] += num_bytes
+                    if waited:
+                        self._stats['waits'] += 1
+                        self._stats['wait_seconds'] += waited
+                    break
+                wait = max(-self._tokens / rate, -throttle.tokens / share, 0.001)
+            wait = min(wait, self.MAX_SLEEP)
+            time.sleep(wait)
+            waited += wait
+        return waited
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê
+        
+        Returns:
+            Dict gồm rate (giới hạn đang áp dụng), limit (mặc định), transfers (số lượt đang mở),
+            bytes (số byte đã đi qua khi có giới hạn), waits (số lần phải chờ), wait_seconds
+        """
+        self._refresh_rate()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['rate'] = self._rate
+            stats['limit'] = self._limit
+            stats['transfers'] = len(self._transfers)
+        return stats
+
+
+class TransferThrottle:
+    """Phần băng thông của một lượt tải (dùng chung cho các đoạn của cùng một video)"""
+    
+    def __init__(self, limiter: BandwidthLimiter):
+        self.limiter = limiter
+        now = time.monotonic()
+        self.tokens = 0.0
+        self.updated = now
+        self.last_active = now
+    
+    def consume(self, num_bytes: int) -> float:
+        """Ghi nhận num_bytes vừa nhận, chờ nếu vượt quá phần được chia; trả về số giây đã chờ"""
+        return self.limiter._consume(self, num_bytes)
+    
+    def close(self):
+        """Kết thúc lượt tải"""
+        self.limiter._close(self)
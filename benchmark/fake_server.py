@@ -0,0 +1,427 @@
+"""
+Fake Douyin Server
+Server HTTP cục bộ giả lập API chi tiết video và CDN để benchmark không cần mạng thật
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeDouyinServer:
+    """
+    Giả lập /aweme/v1/web/aweme/detail/, danh sách bài của profile (aweme/post) và link phát trên CDN
+    
+    Nội dung video được sinh xác định theo video ID (không giữ cả file trong bộ nhớ),
+    hỗ trợ Range, ETag, Accept-Ranges như CDN thật. Có thể cấu hình độ trễ,
+    giới hạn băng thông, tỷ lệ lỗi 5xx, tỷ lệ 429 và tỷ lệ ngắt kết nối giữa chừng.
+    
+    Tỷ lệ gallery_rate bài (chọn cố định theo ID) là bài ảnh với gallery_images ảnh,
+    mỗi ảnh có link .webp và .jpeg.
+    
+    Mỗi sec_user_id có profile_posts bài; bài thứ k (k = 0 là cũ nhất) có video ID
+    và create_time cố định, nên tăng profile_posts giống như profile có bài mới.
+    
+    Link phát của video có tham số gen; revoke(video_id) thu hồi mọi link đã phát ra
+    của video (CDN trả 410), lần gọi API sau trả link mới.
+    """
+    
+    API_PATH = "/aweme/v1/web/aweme/detail/"
+    POST_PATH = "/aweme/v1/web/aweme/post/"
+    # create_time của bài cũ nhất, các bài sau cách nhau POST_INTERVAL giây
+    POST_EPOCH = 1700000000
+    POST_INTERVAL = 60
+    # Khối dữ liệu lặp lại để sinh nội dung file
+    BLOCK_SIZE = 64 * 1024
+    # Box ftyp ở đầu mỗi file video (để qua được bước kiểm tra header MP4)
+    MP4_HEADER = b'\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2'
+    # Trang lỗi trả thay cho file khi giả lập html_rate
+    ERROR_PAGE = b'<!DOCTYPE html><html><body>403 Forbidden</body></html>'
+    
+    def __init__(self, file_sizes: Optional[List[int]] = None, api_latency: float = 0.0,
+                 cdn_latency: float = 0.0, bandwidth: Optional[int] = None,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 disconnect_rate: float = 0.0, seed: int = 0, profile_posts: int = 100,
+                 gallery_rate: float = 0.0, gallery_images: int = 4,
+                 expired_cookies: Optional[List[str]] = None, html_rate: float = 0.0):
+        """
+        Khởi tạo FakeDouyinServer
+        
+        Args:
+            file_sizes: Các kích thước file (byte), video ID nào dùng kích thước nào
+                        được chọn cố định theo ID
+            api_latency: Độ trễ mỗi request API (giây)
+            cdn_latency: Độ trễ trước byte đầu tiên của CDN (giây)
+            bandwidth: Giới hạn băng thông mỗi kết nối CDN (byte/giây), None = không giới hạn
+            error_rate: Tỷ lệ request (API và CDN) trả về 503
+            throttle_rate: Tỷ lệ request API trả về 429
+            disconnect_rate: Tỷ lệ response CDN bị ngắt giữa chừng
+            seed: Seed cho các lỗi ngẫu nhiên (để lặp lại được)
+            profile_posts: Số bài của mỗi profile
+            gallery_rate: Tỷ lệ bài là bài ảnh
+            gallery_images: Số ảnh mỗi bài ảnh
+            expired_cookies: Cookie bị coi là hết đăng nhập (API trả status_code 8)
+            html_rate: Tỷ lệ response CDN là trang lỗi HTML (HTTP 200, text/html)
+        """
+        self.file_sizes = list(file_sizes or [1024 * 1024])
+        self.api_latency = api_latency
+        self.cdn_latency = cdn_latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.disconnect_rate = disconnect_rate
+        self.html_rate = html_rate
+        self.profile_posts = profile_posts
+        self.gallery_rate = gallery_rate
+        self.gallery_images = gallery_images
+        self.expired_cookies = set(expired_cookies or [])
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._block = random.Random(seed).getrandbits(self.BLOCK_SIZE * 8).to_bytes(self.BLOCK_SIZE, 'little')
+        # video ID -> thế hệ link phát hiện tại (link có gen cũ hơn đã bị thu hồi)
+        self._generations: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'api_requests': 0, 'cdn_requests': 0, 'errors': 0,
+            'throttled': 0, 'disconnects': 0, 'bytes_sent': 0, 'login_required': 0, 'html_pages': 0,
+            'revoked': 0
+        }
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.base_url = ""
+    
+    def config(self) -> Dict:
+        """Cấu hình server (lưu kèm kết quả benchmark)"""
+        return {
+            'file_sizes': self.file_sizes,
+            'api_latency': self.api_latency,
+            'cdn_latency': self.cdn_latency,
+            'bandwidth': self.bandwidth,
+            'error_rate': self.error_rate,
+            'throttle_rate': self.throttle_rate,
+            'disconnect_rate': self.disconnect_rate,
+            'html_rate': self.html_rate
+        }
+    
+    def start(self) -> str:
+        """
+        Chạy server trên cổng ngẫu nhiên ở luồng nền
+        
+        Returns:
+            URL gốc của server (http://127.0.0.1:<port>)
+        """
+        server = self
+        
+        class Handler(_FakeHandler):
+            fake = server
+        
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+    
+    def stop(self):
+        """Dừng server"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def size_of(self, video_id: str) -> int:
+        """Kích thước file của video ID (cố định theo ID)"""
+        digest = hashlib.md5(video_id.encode()).digest()
+        return self.file_sizes[digest[0] % len(self.file_sizes)]
+    
+    def profile_video_id(self, sec_uid: str, k: int) -> str:
+        """Video ID của bài thứ k (0 = cũ nhất) trong profile"""
+        base = 7 * 10 ** 18 + int(hashlib.md5(sec_uid.encode()).hexdigest()[:8], 16) * 10 ** 6
+        return str(base + k)
+    
+    def is_gallery(self, video_id: str) -> bool:
+        """Bài có phải bài ảnh không (cố định theo ID)"""
+        return hashlib.md5(video_id.encode()).digest()[1] < self.gallery_rate * 256
+    
+    def aweme(self, video_id: str, create_time: int) -> Dict:
+        """Dict aweme với play_addr (hoặc images nếu là bài ảnh) trỏ về CDN giả lập"""
+        aweme = {
+            'aweme_id': video_id,
+            'desc': f"Video {video_id}",
+            'create_time': create_time,
+            'author': {'nickname': "benchmark"},
+            'video': {
+                'duration': 15000,
+                'play_addr': {
+                    'url_list': [f"{self.base_url}/play/{video_id}.mp4?gen={self.generation(video_id)}"],
+                    'width': 720,
+                    'height': 1280,
+                    'data_size': self.size_of(video_id)
+                }
+            }
+        }
+        if self.is_gallery(video_id):
+            # Bài ảnh: play_addr là nhạc nền, ảnh nằm trong images
+            aweme['aweme_type'] = 68
+            aweme['images'] = [
+                {
+                    'url_list': [
+                        f"{self.base_url}/image/{video_id}_{n}.webp",
+                        f"{self.base_url}/image/{video_id}_{n}.jpeg"
+                    ],
+                    'download_url_list': [f"{self.base_url}/image/{video_id}_{n}.jpeg?watermark=1"],
+                    'width': 1080,
+                    'height': 1440
+                }
+                for n in range(self.gallery_images)
+            ]
+        return aweme
+    
+    def content(self, video_id: str, start: int, end: int) -> bytes:
+        """
+        Nội dung file trong khoảng [start, end]
+        
+        Mỗi video dùng khối dữ liệu chung dịch đi một đoạn theo ID nên các file khác nhau;
+        file video bắt đầu bằng MP4_HEADER.
+        """
+        offset = int(hashlib.md5(video_id.encode()).hexdigest()[:8], 16) % self.BLOCK_SIZE
+        block = self._block
+        out = bytearray()
+        position = start
+        while position <= end:
+            index = (position + offset) % self.BLOCK_SIZE
+            take = min(self.BLOCK_SIZE - index, end - position + 1)
+            out += block[index:index + take]
+            position += take
+        if start < len(self.MP4_HEADER) and '_' not in video_id:
+            head = self.MP4_HEADER[start:end + 1]
+            out[:len(head)] = head
+        return bytes(out)
+    
+    def generation(self, video_id: str) -> int:
+        """Thế hệ link phát hiện tại của video"""
+        with self._stats_lock:
+            return self._generations.get(video_id, 0)
+    
+    def revoke(self, video_id: str):
+        """Thu hồi các link phát đã phát ra của video (CDN trả 410 cho link cũ)"""
+        with self._stats_lock:
+            self._generations[video_id] = self._generations.get(video_id, 0) + 1
+    
+    def chance(self, rate: float) -> bool:
+        """Trả về True với xác suất rate"""
+        if rate <= 0:
+            return False
+        with self._random_lock:
+            return self._random.random() < rate
+    
+    def random_cut(self, length: int) -> int:
+        """Vị trí ngắt kết nối ngẫu nhiên trong body"""
+        with self._random_lock:
+            return self._random.randint(0, max(0, length - 1))
+    
+    def count(self, key: str, value: int = 1):
+        """Cộng bộ đếm thống kê"""
+        with self._stats_lock:
+            self._stats[key] += value
+    
+    def get_stats(self) -> Dict:
+        """Thống kê phía server: số request, lỗi, 429, ngắt kết nối, byte đã gửi"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    """Xử lý request cho FakeDouyinServer (thuộc tính fake được gán trong start)"""
+    
+    protocol_version = "HTTP/1.1"
+    fake: FakeDouyinServer = None
+    # Kích thước mỗi lần gửi khi giới hạn băng thông
+    SEND_BLOCK = 16 * 1024
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == self.fake.API_PATH:
+            self._handle_api(parse_qs(parsed.query))
+            return
+        if parsed.path == self.fake.POST_PATH:
+            self._handle_api(parse_qs(parsed.query), posts=True)
+            return
+        match = re.fullmatch(r'/play/(\d+)\.mp4', parsed.path)
+        if match:
+            gen = parse_qs(parsed.query).get('gen', [''])[0]
+            if gen.isdigit() and int(gen) < self.fake.generation(match.group(1)):
+                self.fake.count('revoked')
+                self._send_empty(410)
+                return
+            self._handle_cdn(match.group(1), send_body=True)
+            return
+        match = re.fullmatch(r'/image/(\d+_\d+)\.(jpeg|webp)', parsed.path)
+        if match:
+            self._handle_cdn(match.group(1), send_body=True, content_type=f"image/{match.group(2)}")
+            return
+        self._send_empty(404)
+    
+    def do_HEAD(self):
+        match = re.fullmatch(r'/play/(\d+)\.mp4', urlparse(self.path).path)
+        if match:
+            self._handle_cdn(match.group(1), send_body=False)
+        else:
+            self._send_empty(404)
+    
+    def _send_empty(self, status: int, headers: Optional[Dict] = None):
+        """Gửi response không có body"""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def _handle_api(self, params: Dict, posts: bool = False):
+        """Trả JSON giống aweme/detail (hoặc aweme/post nếu posts) với play_addr trỏ về CDN giả lập"""
+        fake = self.fake
+        fake.count('api_requests')
+        if fake.api_latency:
+            time.sleep(fake.api_latency)
+        if self.headers.get('Cookie') in fake.expired_cookies:
+            fake.count('login_required')
+            self._send_json({'status_code': 8, 'status_msg': 'login required'})
+            return
+        if fake.chance(fake.throttle_rate):
+            fake.count('throttled')
+            self._send_empty(429, {'Retry-After': '0'})
+            return
+        if fake.chance(fake.error_rate):
+            fake.count('errors')
+            self._send_empty(503)
+            return
+        
+        if posts:
+            body = self._post_page(params)
+            if body is None:
+                self._send_empty(400)
+                return
+        else:
+            video_id = params.get('aweme_id', [''])[0]
+            if not video_id.isdigit():
+                self._send_empty(400)
+                return
+            body = {'aweme_detail': fake.aweme(video_id, fake.POST_EPOCH)}
+        self._send_json(body)
+    
+    def _send_json(self, body: Dict):
+        """Gửi response JSON 200"""
+        body = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _post_page(self, params: Dict) -> Optional[Dict]:
+        """Một trang bài của profile, mới nhất trước; max_cursor là create_time (ms) của bài cuối trang trước"""
+        fake = self.fake
+        sec_uid = params.get('sec_user_id', [''])[0]
+        try:
+            cursor = int(params.get('max_cursor', ['0'])[0])
+            count = max(1, int(params.get('count', ['18'])[0]))
+        except ValueError:
+            return None
+        if not sec_uid:
+            return None
+        
+        # Bài k có create_time = POST_EPOCH + k * POST_INTERVAL
+        newest = fake.profile_posts - 1
+        if cursor:
+            newest = min(newest, (cursor // 1000 - fake.POST_EPOCH - 1) // fake.POST_INTERVAL)
+        ks = list(range(newest, max(-1, newest - count), -1))
+        awemes = [
+            fake.aweme(fake.profile_video_id(sec_uid, k), fake.POST_EPOCH + k * fake.POST_INTERVAL)
+            for k in ks
+        ]
+        return {
+            'aweme_list': awemes,
+            'has_more': 1 if ks and ks[-1] > 0 else 0,
+            'max_cursor': (awemes[-1]['create_time'] * 1000) if awemes else cursor
+        }
+    
+    def _parse_range(self, total: int) -> Tuple[int, int, bool]:
+        """Đọc header Range, trả về (start, end, có Range hợp lệ không)"""
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', '').strip())
+        if not match:
+            return 0, total - 1, False
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else total - 1
+        return start, min(end, total - 1), True
+    
+    def _handle_cdn(self, video_id: str, send_body: bool, content_type: str = "video/mp4"):
+        """Trả nội dung file (hỗ trợ Range), có thể chậm, lỗi hoặc bị ngắt giữa chừng"""
+        fake = self.fake
+        fake.count('cdn_requests')
+        if fake.cdn_latency:
+            time.sleep(fake.cdn_latency)
+        if fake.chance(fake.error_rate):
+            fake.count('errors')
+            self._send_empty(503)
+            return
+        if fake.chance(fake.html_rate):
+            fake.count('html_pages')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(fake.ERROR_PAGE)))
+            self.end_headers()
+            try:
+                if send_body:
+                    self.wfile.write(fake.ERROR_PAGE)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            return
+        
+        total = fake.size_of(video_id)
+        start, end, ranged = self._parse_range(total)
+        if start >= total:
+            self._send_empty(416, {'Content-Range': f"bytes */{total}"})
+            return
+        
+        length = end - start + 1
+        self.send_response(206 if ranged else 200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', f'"{video_id}-{total}"')
+        if ranged:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{total}")
+        self.end_headers()
+        if not send_body:
+            return
+        
+        cut = fake.random_cut(length) if fake.chance(fake.disconnect_rate) else None
+        sent = 0
+        started = time.monotonic()
+        try:
+            while sent < length:
+                block = min(self.SEND_BLOCK, length - sent)
+                if cut is not None and sent + block > cut:
+                    # Gửi nốt đến vị trí ngắt rồi đóng kết nối
+                    self.wfile.write(fake.content(video_id, start + sent, start + cut - 1) if cut > sent else b'')
+                    fake.count('bytes_sent', max(0, cut - sent))
+                    fake.count('disconnects')
+                    self.close_connection = True
+                    return
+                self.wfile.write(fake.content(video_id, start + sent, start + sent + block - 1))
+                sent += block
+                fake.count('bytes_sent', block)
+                if fake.bandwidth:
+                    # Giữ tốc độ trung bình không vượt quá bandwidth
+                    delay = sent / fake.bandwidth - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
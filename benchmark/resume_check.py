@@ -0,0 +1,106 @@
+"""
+Resume Check
+Kiểm tra tải tiếp sau khi tiến trình bị tắt ngang (SIGKILL): tiến trình con tải một video
+nhỏ hơn ngưỡng chia đoạn từ server giả lập và bị kill giữa chừng, lần tải sau phải tiếp tục
+từ vị trí đã lưu trong file .part.json thay vì tải lại từ byte 0
+
+Ví dụ:
+    python benchmark/resume_check.py
+    python benchmark/resume_check.py --size 40000000 --kill-after 3
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark.fake_server import FakeDouyinServer
+from downloader import VideoDownloader
+
+VIDEO_ID = "0"
+
+
+def make_settings(base_url: str) -> dict:
+    """Settings trỏ VideoDownloader tới server giả lập"""
+    return {'api_base': base_url, 'retry_base_delay': 0.01, 'api_rate': 100}
+
+
+def download(base_url: str, save_path: str) -> bool:
+    """Tải video VIDEO_ID của server giả lập về save_path"""
+    downloader = VideoDownloader("benchmark=1", make_settings(base_url))
+    with contextlib.redirect_stdout(io.StringIO()):
+        return downloader.download_video(f"{base_url}/play/{VIDEO_ID}.mp4", save_path)
+
+
+def run_child(base_url: str, save_path: str) -> int:
+    """Tiến trình con: tải cho tới khi bị tiến trình cha kill"""
+    return 0 if download(base_url, save_path) else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Kiểm tra tải tiếp sau khi tiến trình bị kill")
+    parser.add_argument('--child', nargs=2, metavar=('BASE_URL', 'SAVE_PATH'), help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, default=5 * 1000 * 1000,
+                        help="Kích thước video (byte), mặc định nhỏ hơn segment_min_size")
+    parser.add_argument('--bandwidth', type=int, default=1000 * 1000, help="Băng thông server giả lập (byte/giây)")
+    parser.add_argument('--kill-after', type=float, default=2.5, help="Kill tiến trình tải sau chừng này giây")
+    args = parser.parse_args(argv)
+    
+    if args.child:
+        return run_child(*args.child)
+    
+    server = FakeDouyinServer(file_sizes=[args.size], bandwidth=args.bandwidth)
+    base_url = server.start()
+    folder = tempfile.mkdtemp(prefix="douyin-resume-")
+    save_path = os.path.join(folder, "video.mp4")
+    try:
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--child', base_url, save_path])
+        time.sleep(args.kill_after)
+        if child.poll() is not None:
+            print(f"Tiến trình tải đã kết thúc trước khi bị kill (mã {child.returncode}), tăng --size hoặc giảm --bandwidth")
+            return 1
+        os.kill(child.pid, signal.SIGKILL)
+        child.wait()
+        
+        sent_before = server.get_stats()['bytes_sent']
+        if not download(base_url, save_path):
+            print("Tải tiếp thất bại")
+            return 1
+        resent = server.get_stats()['bytes_sent'] - sent_before
+        
+        with open(save_path, 'rb') as f:
+            correct = f.read() == server.content(VIDEO_ID, 0, args.size - 1)
+        print(f"Đã tải trước khi kill: {sent_before} byte, tải lại sau khi kill: {resent}/{args.size} byte")
+        if not correct:
+            print("LỖI: nội dung file không khớp")
+            return 1
+        # Phần tải lại chỉ gồm phần còn thiếu, phần chưa kịp lưu vị trí (tối đa PART_CHECKPOINT_INTERVAL giây
+        # mỗi kết nối) và phần server đã gửi nhưng còn nằm trong bộ đệm socket lúc kill
+        downloader = VideoDownloader("benchmark=1", make_settings(base_url))
+        connections = downloader.segment_count if args.size >= downloader.segment_min_size else 1
+        unsaved = args.bandwidth * VideoDownloader.PART_CHECKPOINT_INTERVAL
+        if connections == 1:
+            unsaved = min(unsaved, VideoDownloader.PART_CHECKPOINT)
+        allowed = int(args.size - sent_before + connections * (unsaved + 512 * 1024))
+        if resent >= args.size or resent > allowed:
+            print(f"LỖI: tải lại {resent} byte, nhiều hơn mức cho phép {allowed} byte (không tải tiếp được)")
+            return 1
+        print("OK")
+        return 0
+    finally:
+        server.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""
+Benchmark Runner
+Chạy VideoDownloader với server giả lập ở nhiều mức concurrency / chunk size / batch size
+và lưu kết quả dạng JSON để so sánh giữa các lần thay đổi code
+
+Ví dụ:
+    python benchmark/run.py --concurrency 1,3,6 --chunk-sizes 8192,65536 --batch-sizes 30
+    python benchmark/run.py --bandwidth 2000000 --disconnect-rate 0.1 --compare benchmark/results/baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark.fake_server import FakeDouyinServer
+from downloader import VideoDownloader, create_batch_downloader
+
+RESULTS_DIR = os.path.join(ROOT, "benchmark", "results")
+# Các tham số xác định một lần chạy (dùng để ghép cặp khi so sánh)
+RUN_KEYS = ('concurrency', 'chunk_size', 'batch_size', 'pipeline')
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentile theo nearest-rank, None nếu danh sách rỗng"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+class RssSampler:
+    """
+    Lấy mẫu bộ nhớ RSS của tiến trình trong khi chạy (chỉ Linux, đọc /proc/self/statm)
+    
+    Trên hệ điều hành khác peak là None; khi đó dùng --tracemalloc để đo bộ nhớ Python.
+    """
+    
+    INTERVAL = 0.05
+    
+    def __init__(self):
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+    
+    def _read_rss(self) -> Optional[int]:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self._page_size
+        except (OSError, ValueError, IndexError):
+            return None
+    
+    def _run(self):
+        while not self._stop.wait(self.INTERVAL):
+            rss = self._read_rss()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+    
+    def __enter__(self):
+        self.peak = self._read_rss()
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return False
+
+
+def run_once(server: FakeDouyinServer, concurrency: int, chunk_size: int, batch_size: int,
+             pipeline: bool, api_rate: float, measure_heap: bool, id_offset: int) -> Dict:
+    """
+    Chạy một batch và đo kết quả
+    
+    Args:
+        server: Server giả lập đang chạy
+        concurrency: Số job tải cùng lúc
+        chunk_size: Kích thước mỗi lần đọc body
+        batch_size: Số video trong batch
+        pipeline: Dùng PipelineDownloader
+        api_rate: Giới hạn request API mỗi giây của downloader
+        measure_heap: Đo peak bộ nhớ Python bằng tracemalloc (chậm hơn)
+        id_offset: Video ID bắt đầu (để mỗi lần chạy dùng video khác nhau)
+    
+    Returns:
+        Dict kết quả của lần chạy
+    """
+    settings = {
+        'api_base': server.base_url,
+        'chunk_size': chunk_size,
+        'max_concurrent': concurrency,
+        'pipeline_mode': pipeline,
+        'api_rate': api_rate,
+        'api_burst': max(4, concurrency),
+        'retry_base_delay': 0.05,
+        'retry_max_delay': 1.0,
+        'metadata_cache': False,
+        'skip_downloaded': False,
+        'short_link_cache': False
+    }
+    folder = tempfile.mkdtemp(prefix="douyin_bench_")
+    links = [f"https://www.douyin.com/video/{7 * 10 ** 18 + id_offset + i}" for i in range(batch_size)]
+    started_at: Dict[int, float] = {}
+    latencies: List[float] = []
+    results: List[Dict] = []
+    
+    def on_start(index, link):
+        started_at[index] = time.perf_counter()
+    
+    def on_result(index, result):
+        latencies.append(time.perf_counter() - started_at.get(index, time.perf_counter()))
+        results.append(result)
+    
+    downloader = VideoDownloader("benchmark=1", settings)
+    batch = create_batch_downloader(downloader, folder, settings)
+    if measure_heap:
+        tracemalloc.start()
+    try:
+        # Thông báo lỗi (retry, ngắt kết nối) của downloader không cần in ra
+        with RssSampler() as rss, contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            batch.run(links, on_start=on_start, on_result=on_result, collect_results=False)
+            elapsed = time.perf_counter() - started
+            cpu_time = time.process_time() - cpu_started
+        heap_peak = tracemalloc.get_traced_memory()[1] if measure_heap else None
+    finally:
+        if measure_heap:
+            tracemalloc.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    succeeded = [r for r in results if r.get('success')]
+    total_bytes = sum(server.size_of(r['video_id']) for r in succeeded)
+    return {
+        'concurrency': concurrency,
+        'chunk_size': chunk_size,
+        'batch_size': batch_size,
+        'pipeline': pipeline,
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'elapsed': round(elapsed, 3),
+        'videos_per_s': round(len(succeeded) / elapsed, 3) if elapsed else None,
+        'mb_per_s': round(total_bytes / elapsed / 1024 / 1024, 3) if elapsed else None,
+        # CPU của cả tiến trình (gồm cả server giả lập) trên mỗi MB tải về
+        'cpu_ms_per_mb': round(cpu_time * 1000 / (total_bytes / 1024 / 1024), 2) if total_bytes else None,
+        'latency_p50': round(percentile(latencies, 50) or 0, 4),
+        'latency_p99': round(percentile(latencies, 99) or 0, 4),
+        'peak_rss_mb': round(rss.peak / 1024 / 1024, 1) if rss.peak else None,
+        'peak_heap_mb': round(heap_peak / 1024 / 1024, 2) if heap_peak is not None else None,
+        'retries': sum(r.get('retries', 0) for r in results),
+        'throttled': sum(r.get('throttled', 0) for r in results),
+        'stalls': sum(r.get('stalls', 0) for r in results),
+        'connections': downloader.connections.get_stats()
+    }
+
+
+def git_revision() -> Optional[str]:
+    """Commit hiện tại của repo (để biết kết quả thuộc phiên bản nào)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def parse_int_list(value: str) -> List[int]:
+    """Đọc danh sách số nguyên dạng "1,3,6" (cho phép hậu tố K/M)"""
+    numbers = []
+    for part in value.split(','):
+        part = part.strip().upper()
+        factor = 1
+        if part.endswith('K'):
+            factor, part = 1024, part[:-1]
+        elif part.endswith('M'):
+            factor, part = 1024 * 1024, part[:-1]
+        numbers.append(int(float(part) * factor))
+    return numbers
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Benchmark VideoDownloader với server giả lập")
+    parser.add_argument("--concurrency", default="1,3,6", help="Các mức concurrency, ví dụ 1,3,6")
+    parser.add_argument("--chunk-sizes", default="8K,256K", help="Các chunk size, ví dụ 8K,256K")
+    parser.add_argument("--batch-sizes", default="20", help="Các batch size, ví dụ 20,100")
+    parser.add_argument("--pipeline", action="store_true", help="Dùng PipelineDownloader")
+    parser.add_argument("--file-sizes", default="1M", help="Kích thước file giả lập, ví dụ 512K,2M,10M")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Độ trễ API (giây)")
+    parser.add_argument("--cdn-latency", type=float, default=0.02, help="Độ trễ byte đầu tiên của CDN (giây)")
+    parser.add_argument("--bandwidth", type=str, default=None,
+                        help="Giới hạn băng thông mỗi kết nối CDN (byte/s, ví dụ 2M)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tỷ lệ request trả 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Tỷ lệ request API trả 429")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0,
+                        help="Tỷ lệ response CDN bị ngắt giữa chừng")
+    parser.add_argument("--html-rate", type=float, default=0.0,
+                        help="Tỷ lệ response CDN là trang lỗi HTML thay cho video")
+    parser.add_argument("--api-rate", type=float, default=1000.0,
+                        help="Giới hạn request API/giây của downloader (mặc định gần như không giới hạn)")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần lặp mỗi cấu hình (lấy lần có videos/s trung vị)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Đo peak bộ nhớ Python (làm chậm benchmark)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed cho lỗi ngẫu nhiên của server")
+    parser.add_argument("--label", default="", help="Nhãn ghi kèm kết quả")
+    parser.add_argument("--output", help="File JSON lưu kết quả (mặc định benchmark/results/<thời gian>.json)")
+    parser.add_argument("--compare", help="File kết quả cũ để so sánh")
+    return parser.parse_args(argv)
+
+
+def format_table(runs: List[Dict], baseline: Optional[Dict] = None) -> str:
+    """Bảng kết quả, kèm % thay đổi videos/s và MB/s so với baseline nếu có"""
+    previous = {}
+    if baseline:
+        previous = {tuple(run.get(key) for key in RUN_KEYS): run for run in baseline.get('runs', [])}
+    
+    header = f"{'conc':>5}{'chunk':>8}{'batch':>7}{'ok':>5}{'fail':>5}{'video/s':>10}{'MB/s':>9}{'p50(s)':>9}{'p99(s)':>9}{'cpu/MB':>8}{'rss MB':>8}"
+    if previous:
+        header += f"{'Δvideo/s':>10}{'ΔMB/s':>9}"
+    lines = [header]
+    for run in runs:
+        line = (
+            f"{run['concurrency']:>5}{run['chunk_size']:>8}{run['batch_size']:>7}"
+            f"{run['succeeded']:>5}{run['failed']:>5}{run['videos_per_s']:>10.2f}{run['mb_per_s']:>9.2f}"
+            f"{run['latency_p50']:>9.3f}{run['latency_p99']:>9.3f}"
+            f"{str(run.get('cpu_ms_per_mb') or '-'):>8}{str(run['peak_rss_mb'] or '-'):>8}"
+        )
+        old = previous.get(tuple(run.get(key) for key in RUN_KEYS))
+        if old:
+            line += f"{_change(run['videos_per_s'], old.get('videos_per_s')):>10}"
+            line += f"{_change(run['mb_per_s'], old.get('mb_per_s')):>9}"
+        elif previous:
+            line += f"{'-':>10}{'-':>9}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _change(new: Optional[float], old: Optional[float]) -> str:
+    """Phần trăm thay đổi dạng +12.3%"""
+    if not new or not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Chạy benchmark theo tham số dòng lệnh"""
+    args = parse_args(argv)
+    server = FakeDouyinServer(
+        file_sizes=parse_int_list(args.file_sizes),
+        api_latency=args.api_latency,
+        cdn_latency=args.cdn_latency,
+        bandwidth=parse_int_list(args.bandwidth)[0] if args.bandwidth else None,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        disconnect_rate=args.disconnect_rate,
+        html_rate=args.html_rate,
+        seed=args.seed
+    )
+    server.start()
+    
+    runs = []
+    id_offset = 0
+    combos = itertools.product(
+        parse_int_list(args.concurrency), parse_int_list(args.chunk_sizes), parse_int_list(args.batch_sizes)
+    )
+    try:
+        for concurrency, chunk_size, batch_size in combos:
+            attempts = []
+            for _ in range(max(1, args.repeat)):
+                attempts.append(run_once(
+                    server, concurrency, chunk_size, batch_size, args.pipeline,
+                    args.api_rate, args.tracemalloc, id_offset
+                ))
+                id_offset += batch_size
+            attempts.sort(key=lambda run: run['videos_per_s'] or 0)
+            run = attempts[len(attempts) // 2]
+            runs.append(run)
+            print(f"concurrency={concurrency} chunk={chunk_size} batch={batch_size}: "
+                  f"{run['videos_per_s']} video/s, {run['mb_per_s']} MB/s", file=sys.stderr)
+    finally:
+        server_stats = server.get_stats()
+        server.stop()
+    
+    report = {
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'label': args.label,
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'server': server.config(),
+        'server_stats': server_stats,
+        'runs': runs
+    }
+    
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('server') != report['server']:
+            print("Cảnh báo: cấu hình server giả lập khác với kết quả cũ, so sánh có thể không chính xác",
+                  file=sys.stderr)
+    print(format_table(runs, baseline))
+    print(f"Đã lưu kết quả: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,456 @@
+"""
+Command Line Entry Point
+Tải video hàng loạt không cần giao diện (server Linux, cron...)
+
+Ví dụ:
+    python cli.py links.txt --folder ./downloads --concurrency 5
+    cat links.txt | python cli.py - --output results.jsonl
+    echo https://www.douyin.com/user/<sec_uid> | python cli.py -
+
+Mỗi job xong sẽ ghi ngay một dòng JSON (kết quả process_video kèm thời gian).
+Link profile (/user/...) được thay bằng các video của profile, vừa lấy từng trang vừa tải;
+với --sync chỉ lấy các bài mới hơn lần chạy trước (ví dụ chạy hằng ngày bằng cron), --sync luôn dùng
+hàng đợi (--queue) để mốc đồng bộ chỉ tiến lên khi link của các bài mới đã được lưu; mỗi trang
+được ghi vào hàng đợi ngay khi lấy xong nên video được tải trong lúc vẫn đang lấy các trang sau.
+Với --queue, link được lưu vào hàng đợi trong thư mục tải về: nếu bị dừng hoặc tắt ngang,
+chạy lại `python cli.py --queue` để tiếp tục các link chưa xong. --list-jobs, --pause-job,
+--resume-job và --set-priority chỉ sửa hàng đợi rồi thoát (dùng được khi một lượt tải đang chạy).
+Không import Tkinter nên chạy được khi không có màn hình.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, TextIO
+
+# Thêm thư mục hiện tại vào path để import modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cookie_manager import CookieManager
+from downloader import VideoDownloader, create_batch_downloader
+from job_queue import JobQueue
+from link_import import LinkImporter
+from profile_crawler import ProfileCrawler, ProfileSyncStore
+from progress import format_bytes, format_eta
+
+# Khoảng cách giữa hai dòng --progress (giây)
+PROGRESS_INTERVAL = 2.0
+# Số link thêm vào hàng đợi mỗi transaction (sau mỗi lô mới lưu mốc đồng bộ profile)
+QUEUE_ADD_BATCH = 200
+# Lô chưa đủ QUEUE_ADD_BATCH link vẫn được ghi sau chừng này giây để worker có job ngay (giây)
+QUEUE_ADD_INTERVAL = 1.0
+# Chu kỳ kiểm tra khi tạm ngừng thêm link vì hàng đợi đã có đủ job chờ (giây)
+QUEUE_FULL_POLL = 0.5
+
+
+class ResultWriter:
+    """Ghi kết quả từng job ra JSONL ngay khi job kết thúc (thread-safe)"""
+    
+    def __init__(self, output: TextIO):
+        """
+        Khởi tạo ResultWriter
+        
+        Args:
+            output: Nơi ghi kết quả (file hoặc sys.stdout)
+        """
+        self.output = output
+        self._lock = threading.Lock()
+        self._started: Dict[int, float] = {}
+        self.total = 0
+        self.success = 0
+        self.skipped = 0
+        # Link trùng video với link khác trong cùng danh sách (không tính là lỗi)
+        self.duplicates = 0
+        # Job chưa kịp tải vì bị dừng (vẫn nằm trong hàng đợi nếu dùng --queue)
+        self.stopped = 0
+    
+    def on_start(self, index: int, link: str):
+        """Ghi nhận thời điểm job bắt đầu"""
+        with self._lock:
+            self._started[index] = time.time()
+    
+    def on_result(self, index: int, result: Dict):
+        """Ghi một dòng JSON cho job vừa kết thúc"""
+        finished = time.time()
+        with self._lock:
+            started = self._started.pop(index, finished)
+            result['started_at'] = round(started, 3)
+            result['finished_at'] = round(finished, 3)
+            result['elapsed'] = round(finished - started, 3)
+            self.total += 1
+            if result.get('success'):
+                self.success += 1
+            if result.get('skipped') == "downloaded":
+                self.skipped += 1
+            elif result.get('skipped') == "duplicate":
+                self.duplicates += 1
+            elif result.get('skipped') == "stopped":
+                self.stopped += 1
+            self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.output.flush()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(
+        description="Tải video Douyin hàng loạt không cần giao diện"
+    )
+    parser.add_argument("input", nargs="?",
+                        help="File chứa danh sách link video hoặc profile (mỗi dòng một link), '-' để đọc từ stdin"
+                             " (có thể bỏ trống khi dùng --queue)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="File JSONL ghi kết quả (mặc định stdout)")
+    parser.add_argument("-f", "--folder", help="Thư mục lưu video (mặc định theo config.json)")
+    parser.add_argument("-n", "--naming", choices=["video_id", "timestamp"],
+                        help="Chế độ đặt tên file")
+    parser.add_argument("-c", "--concurrency", type=int, help="Số video tải cùng lúc")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Tách lấy thông tin và tải file thành 2 giai đoạn song song")
+    parser.add_argument("--resolve-concurrency", type=int,
+                        help="Số luồng lấy thông tin video ở chế độ --pipeline")
+    parser.add_argument("--queue", action="store_true",
+                        help="Lưu link vào hàng đợi trong thư mục tải về và chạy các link chưa xong (tiếp tục được sau khi bị dừng)")
+    parser.add_argument("--priority", type=int, default=0,
+                        help="Độ ưu tiên của link thêm vào hàng đợi lần này (lớn hơn được tải trước)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Chạy lại các link đã thất bại trong hàng đợi")
+    parser.add_argument("--list-jobs", nargs="?", const="all", choices=("all",) + JobQueue.STATES,
+                        metavar="STATE", help="In các job trong hàng đợi (JSONL, theo thứ tự sẽ tải) rồi thoát")
+    parser.add_argument("--pause-job", type=int, action="append", metavar="ID",
+                        help="Tạm dừng job ID trong hàng đợi (lặp lại được) rồi thoát")
+    parser.add_argument("--resume-job", type=int, action="append", metavar="ID",
+                        help="Cho tải lại job ID đã tạm dừng (lặp lại được) rồi thoát")
+    parser.add_argument("--set-priority", type=int, nargs=2, action="append", metavar=("ID", "N"),
+                        help="Đổi độ ưu tiên của job ID thành N (lặp lại được) rồi thoát")
+    parser.add_argument("--sync", action="store_true",
+                        help="Link profile chỉ lấy các bài mới hơn lần đồng bộ trước (mốc lưu trong thư mục tải về, bật --queue)")
+    parser.add_argument("--config", help="Đường dẫn config.json")
+    parser.add_argument("--cookie", action="append",
+                        help="Cookie dùng cho lần chạy này, lặp lại để dùng nhiều tài khoản (mặc định theo config.json)")
+    parser.add_argument("--limit", metavar="RATE",
+                        help="Giới hạn tổng băng thông tải, ví dụ 500K hoặc 2M (byte/giây), 0 = không giới hạn")
+    parser.add_argument("--progress", action="store_true",
+                        help="In tổng tốc độ tải và thời gian còn lại ra stderr trong khi chạy")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Ghi thời gian từng giai đoạn của mỗi job ra FILE (JSONL) và in bản tổng hợp khi xong")
+    parser.add_argument("--stats", action="store_true",
+                        help="In thống kê host CDN / cache / rate limit ra stderr khi xong")
+    return parser.parse_args(argv)
+
+
+def build_settings(cookie_manager: CookieManager, args: argparse.Namespace) -> Dict:
+    """Gộp settings trong config.json với tham số dòng lệnh"""
+    settings = cookie_manager.get_settings()
+    if args.naming:
+        settings["naming_mode"] = args.naming
+    if args.concurrency:
+        settings["max_concurrent"] = args.concurrency
+    if args.pipeline:
+        settings["pipeline_mode"] = True
+    if args.resolve_concurrency:
+        settings["resolve_concurrent"] = args.resolve_concurrency
+    if args.limit is not None:
+        settings["bandwidth_limit"] = args.limit
+    if args.trace:
+        settings["trace_file"] = args.trace
+    return settings
+
+
+def print_stats(downloader: VideoDownloader, batch, job_queue: Optional[JobQueue] = None,
+                profiles: Optional[ProfileCrawler] = None):
+    """In thống kê chi tiết ra stderr"""
+    stats = {
+        'hosts': downloader.get_host_stats(),
+        'api_rate_limit': downloader.api_limiter.get_stats(),
+        'accounts': downloader.accounts.get_stats(),
+        'connections': downloader.connections.get_stats()
+    }
+    if downloader.metadata_cache:
+        stats['metadata_cache'] = downloader.metadata_cache.get_stats()
+    if downloader.ledger:
+        stats['ledger'] = downloader.ledger.get_stats()
+    stats['short_links'] = downloader.short_links.get_stats()
+    stats['bandwidth'] = downloader.bandwidth.get_stats()
+    if hasattr(batch, 'get_stats'):
+        stats['pipeline'] = batch.get_stats()
+    if job_queue:
+        stats['queue'] = job_queue.get_stats()
+    if profiles and profiles.get_stats()['profiles']:
+        stats['profiles'] = profiles.get_stats()
+        if profiles.store:
+            stats['profiles']['sync'] = profiles.store.get_stats()
+    print(json.dumps(stats, ensure_ascii=False, indent=2), file=sys.stderr)
+
+
+def print_progress(downloader: VideoDownloader, writer: ResultWriter):
+    """In một dòng tiến độ tổng hợp ra stderr"""
+    aggregate = downloader.progress.aggregate()
+    line = (
+        f"[{writer.total} job xong] {aggregate['active']} đang tải · "
+        f"{format_bytes(aggregate['received'])}/{format_bytes(aggregate['total'])} · "
+        f"{format_bytes(aggregate['speed'])}/s · còn {format_eta(aggregate['eta'])}"
+    )
+    if aggregate['stalled']:
+        line += f" · {aggregate['stalled']} đang đứng"
+    print(line, file=sys.stderr)
+
+
+def manage_queue(args: argparse.Namespace, download_folder: str) -> int:
+    """
+    Xử lý --list-jobs / --pause-job / --resume-job / --set-priority
+    
+    Hàng đợi được mở không khôi phục job đang chạy, nên dùng được khi một tiến trình
+    khác đang tải: job tạm dừng / đổi ưu tiên có hiệu lực từ lần lấy job tiếp theo.
+    
+    Returns:
+        Exit code: 0 nếu thành công, 1 nếu có ID không tồn tại
+    """
+    job_queue = JobQueue.for_folder(download_folder, recover=False)
+    missing = []
+    
+    def update(job_id: int, apply: Callable[[], None]):
+        if job_queue.get_job(job_id) is None:
+            missing.append(job_id)
+            return
+        apply()
+        job = job_queue.get_job(job_id)
+        print(f"Job {job_id}: {job['state']}, ưu tiên {job['priority']}"
+              + (", đang tạm dừng" if job['paused'] else ""), file=sys.stderr)
+    
+    try:
+        for job_id in args.pause_job or []:
+            update(job_id, lambda: job_queue.pause_job(job_id))
+        for job_id in args.resume_job or []:
+            update(job_id, lambda: job_queue.resume_job(job_id))
+        for job_id, priority in args.set_priority or []:
+            update(job_id, lambda: job_queue.set_priority(job_id, priority))
+        if args.list_jobs:
+            state = None if args.list_jobs == "all" else args.list_jobs
+            for job in job_queue.list_jobs(state, limit=None):
+                print(json.dumps(job, ensure_ascii=False))
+    finally:
+        job_queue.close()
+    for job_id in missing:
+        print(f"Lỗi: không có job {job_id} trong hàng đợi", file=sys.stderr)
+    return 1 if missing else 0
+
+
+def add_to_queue(job_queue: JobQueue, links: Iterable[str], priority: int, profiles: ProfileCrawler,
+                 should_stop: Optional[Callable[[], bool]] = None, max_pending: Optional[int] = None) -> int:
+    """
+    Thêm link vào hàng đợi theo từng lô, lưu mốc đồng bộ profile sau khi lô đã được ghi
+    
+    Lô được ghi khi đủ QUEUE_ADD_BATCH link, sau QUEUE_ADD_INTERVAL giây hoặc khi một
+    trang của profile đang đồng bộ vừa xong (có mốc chờ lưu), nên khi chạy song song
+    với run_queue thì video của trang đầu được tải gần như ngay. Với max_pending, việc
+    đọc link (duyệt profile) tạm ngừng khi hàng đợi đã có đủ job chờ, để link phát lấy
+    sẵn từ danh sách bài không bị cũ hoặc bị bỏ khỏi bộ nhớ trước khi được tải.
+    
+    Args:
+        job_queue: Hàng đợi job
+        links: Link đã chuẩn hóa (có thể gồm video của các profile đang đồng bộ)
+        priority: Độ ưu tiên của link
+        profiles: ProfileCrawler sinh ra link của profile
+        should_stop: Hàm trả về True khi cần ngừng thêm link (tùy chọn)
+        max_pending: Số job pending tối đa trước khi tạm ngừng đọc thêm link (tùy chọn)
+    
+    Returns:
+        Số link mới được thêm
+    """
+    added = 0
+    batch = []
+    flushed_at = time.monotonic()
+    for link in links:
+        batch.append(link)
+        if len(batch) >= QUEUE_ADD_BATCH or time.monotonic() - flushed_at >= QUEUE_ADD_INTERVAL \
+                or profiles.has_pending_marks():
+            added += job_queue.add(batch, priority=priority)
+            profiles.save_marks()
+            batch = []
+            flushed_at = time.monotonic()
+            while max_pending is not None and job_queue.count(JobQueue.PENDING) >= max_pending:
+                if should_stop is not None and should_stop():
+                    break
+                time.sleep(QUEUE_FULL_POLL)
+        if should_stop is not None and should_stop():
+            break
+    added += job_queue.add(batch, priority=priority)
+    profiles.save_marks()
+    return added
+
+
+def run_queue_feeding(batch, job_queue: JobQueue, links: Iterable[str], priority: int,
+                      profiles: ProfileCrawler, **callbacks) -> List[Dict]:
+    """
+    Chạy run_queue trong khi một luồng khác thêm link vào hàng đợi (add_to_queue)
+    
+    Giống BatchDownloader.run với generator: video của trang profile đầu tiên được
+    tải trong lúc các trang sau còn đang được lấy.
+    
+    Args:
+        batch: BatchDownloader / PipelineDownloader
+        job_queue: Hàng đợi job
+        links: Link đã chuẩn hóa
+        priority: Độ ưu tiên của link
+        profiles: ProfileCrawler sinh ra link của profile
+        callbacks: on_start, on_result truyền cho run_queue
+    
+    Returns:
+        Kết quả của run_queue
+    """
+    feeding = threading.Event()
+    feeding.set()
+    
+    def feed():
+        try:
+            add_to_queue(job_queue, links, priority, profiles, should_stop=lambda: batch.is_stopped,
+                         max_pending=batch.downloader.PREFETCHED_LIMIT // 2)
+        except Exception as e:
+            print(f"Lỗi khi thêm link vào hàng đợi: {e}")
+        finally:
+            feeding.clear()
+    
+    feeder = threading.Thread(target=feed, name="queue-feeder", daemon=True)
+    feeder.start()
+    try:
+        return batch.run_queue(job_queue, feeding=feeding, **callbacks)
+    finally:
+        # Ghi xong lô cuối trước khi hàng đợi bị đóng
+        feeder.join()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Chạy tải hàng loạt từ dòng lệnh
+    
+    Returns:
+        Exit code: 0 nếu mọi job thành công, 1 nếu có job lỗi, 2 nếu thiếu cookie/input
+    """
+    args = parse_args(argv)
+    if args.sync:
+        # Mốc đồng bộ chỉ được lưu sau khi link đã vào hàng đợi, nếu không link chưa tải xong sẽ bị mất
+        args.queue = True
+    managing = args.list_jobs or args.pause_job or args.resume_job or args.set_priority
+    if not args.input and not args.queue and not managing:
+        print("Lỗi: cần file danh sách link (hoặc dùng --queue để chạy tiếp hàng đợi)", file=sys.stderr)
+        return 2
+    cookie_manager = CookieManager(args.config)
+    try:
+        if managing:
+            return manage_queue(args, args.folder or cookie_manager.get_download_folder())
+        return run(args, cookie_manager)
+    finally:
+        cookie_manager.close()
+
+
+def run(args: argparse.Namespace, cookie_manager: CookieManager) -> int:
+    """
+    Tải các link theo tham số dòng lệnh (phần chính của main)
+    
+    Returns:
+        Exit code như main
+    """
+    cookies = args.cookie or cookie_manager.get_cookies()
+    if not cookies:
+        print("Lỗi: chưa có cookie (lưu trong config.json hoặc truyền --cookie)", file=sys.stderr)
+        return 2
+    
+    download_folder = args.folder or cookie_manager.get_download_folder()
+    os.makedirs(download_folder, exist_ok=True)
+    settings = build_settings(cookie_manager, args)
+    
+    try:
+        input_stream = None
+        if args.input:
+            input_stream = sys.stdin if args.input == "-" else open(args.input, 'r', encoding='utf-8')
+    except OSError as e:
+        print(f"Lỗi: không thể đọc file {args.input}: {e}", file=sys.stderr)
+        return 2
+    output_stream = sys.stdout if args.output == "-" else open(args.output, 'a', encoding='utf-8')
+    
+    downloader = VideoDownloader(cookies, settings)
+    downloader.open_stores(download_folder)
+    batch = create_batch_downloader(downloader, download_folder, settings)
+    writer = ResultWriter(output_stream)
+    # Link rút gọn được phân giải theo lô ngay trên luồng đọc link
+    profiles = ProfileCrawler(
+        downloader,
+        page_size=settings.get("profile_page_size", 18),
+        store=ProfileSyncStore.for_folder(download_folder) if args.sync else None
+    )
+    importer = LinkImporter(downloader, resolve_short=True, profiles=profiles)
+    
+    job_queue = None
+    if args.queue:
+        job_queue = JobQueue.for_folder(download_folder)
+        if job_queue.get_stats()['recovered']:
+            print(f"Khôi phục {job_queue.get_stats()['recovered']} job đang chạy dở từ lần trước", file=sys.stderr)
+        if args.retry_failed:
+            job_queue.retry_failed()
+        print(f"Hàng đợi: {job_queue.count(JobQueue.PENDING)} link chờ tải"
+              + (", link mới được thêm trong lúc tải" if input_stream is not None else ""), file=sys.stderr)
+        if input_stream is not None:
+            # Link mới được thêm dần trong lúc tải, không chờ đọc hết danh sách / duyệt hết profile
+            target = run_queue_feeding
+            kwargs = {
+                'batch': batch, 'job_queue': job_queue, 'links': importer.iter_links(input_stream),
+                'priority': args.priority, 'profiles': profiles
+            }
+        else:
+            target, kwargs = batch.run_queue, {'job_queue': job_queue}
+    else:
+        target, kwargs = batch.run, {'links': importer.iter_links(input_stream), 'collect_results': False}
+    kwargs.update(on_start=writer.on_start, on_result=writer.on_result)
+    
+    started = time.time()
+    runner = threading.Thread(target=target, kwargs=kwargs, daemon=True)
+    # Thông báo lỗi của downloader được in bằng print: chuyển sang stderr
+    # để stdout chỉ chứa các dòng JSONL
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            runner.start()
+            try:
+                while runner.is_alive():
+                    runner.join(PROGRESS_INTERVAL if args.progress else 0.5)
+                    if args.progress and runner.is_alive():
+                        print_progress(downloader, writer)
+            except KeyboardInterrupt:
+                print("\nĐang dừng, chờ các job đang chạy kết thúc...")
+                batch.stop()
+                while runner.is_alive():
+                    runner.join(0.5)
+    finally:
+        if input_stream not in (None, sys.stdin):
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    
+    elapsed = time.time() - started
+    if input_stream is not None:
+        print(importer.summary(), file=sys.stderr)
+    print(
+        f"Hoàn tất {writer.total} job trong {elapsed:.1f}s | "
+        f"Thành công: {writer.success} (bỏ qua vì đã tải: {writer.skipped}) | "
+        f"Trùng lặp: {writer.duplicates} | Đã dừng: {writer.stopped} | "
+        f"Thất bại: {writer.total - writer.success - writer.duplicates - writer.stopped}",
+        file=sys.stderr
+    )
+    if args.stats:
+        print_stats(downloader, batch, job_queue, profiles)
+    if downloader.tracer.enabled:
+        print(downloader.tracer.format_summary(), file=sys.stderr)
+    downloader.close_stores()
+    if job_queue:
+        job_queue.close()
+    if profiles.store:
+        profiles.store.close()
+    
+    return 0 if writer.success + writer.duplicates == writer.total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Connection Pool Module
+Quản lý pool kết nối HTTP: pool riêng cho API và CDN theo số luồng, cache DNS và thống kê tái sử dụng kết nối
+"""
+
+import socket
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+
+class DnsCache:
+    """
+    Cache kết quả phân giải DNS theo host (dùng chung cho mọi luồng)
+    
+    Các edge CDN trả về nhiều địa chỉ; địa chỉ được dùng lần lượt (round-robin)
+    để các kết nối mới không dồn vào một edge. Địa chỉ không kết nối được
+    thì bị bỏ khỏi danh sách, hết địa chỉ thì lần sau phân giải lại.
+    """
+    
+    def __init__(self, ttl: float = 300):
+        """
+        Khởi tạo DnsCache
+        
+        Args:
+            ttl: Thời gian giữ kết quả (giây)
+        """
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._next: Dict[Tuple[str, int], int] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'failures': 0, 'evictions': 0}
+    
+    def lookup(self, host: str, port: int) -> Optional[str]:
+        """
+        Lấy địa chỉ IP của host (từ cache hoặc phân giải mới)
+        
+        Args:
+            host: Tên host
+            port: Cổng
+        
+        Returns:
+            Địa chỉ IP, None nếu không phân giải được (để urllib3 tự phân giải và báo lỗi)
+        """
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._stats['hits'] += 1
+                return self._pick(key, entry[1])
+            self._stats['misses'] += 1
+        
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except OSError:
+            with self._lock:
+                self._stats['failures'] += 1
+            return None
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if not addresses:
+            return None
+        with self._lock:
+            self._entries[key] = (now + self.ttl, addresses)
+            return self._pick(key, addresses)
+    
+    def _pick(self, key: Tuple[str, int], addresses: List[str]) -> str:
+        """Chọn địa chỉ kế tiếp theo vòng (gọi khi giữ lock)"""
+        index = self._next.get(key, 0)
+        self._next[key] = index + 1
+        return addresses[index % len(addresses)]
+    
+    def forget(self, host: str, port: int, address: str):
+        """Bỏ một địa chỉ không kết nối được khỏi cache của host"""
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or address not in entry[1]:
+                return
+            self._stats['evictions'] += 1
+            addresses = [a for a in entry[1] if a != address]
+            if addresses:
+                self._entries[key] = (entry[0], addresses)
+            else:
+                del self._entries[key]
+    
+    def get_stats(self) -> Dict:
+        """Thống kê: hits, misses, failures, evictions và số host đang cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['hosts'] = len(self._entries)
+        return stats
+
+
+class TrackedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter ghi nhận số request, số kết nối mới, số lần chờ pool
+    và phân giải DNS qua DnsCache
+    """
+    
+    def __init__(self, name: str, dns_cache: Optional[DnsCache] = None, **kwargs):
+        """
+        Khởi tạo TrackedAdapter
+        
+        Args:
+            name: Tên pool trong thống kê ("api", "cdn")
+            dns_cache: Cache DNS dùng chung (tùy chọn)
+            **kwargs: pool_connections, pool_maxsize, pool_block của HTTPAdapter
+        """
+        self.name = name
+        self.dns_cache = dns_cache
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0, 'new_connections': 0, 'waits': 0,
+            'wait_seconds': 0.0, 'discarded': 0
+        }
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        """Tạo PoolManager dùng các lớp pool có thống kê"""
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _tracked_pool(HTTPConnectionPool, HTTPConnection, self),
+            'https': _tracked_pool(HTTPSConnectionPool, HTTPSConnection, self)
+        }
+    
+    def send(self, request, **kwargs):
+        """Gửi request (đếm số request đi qua pool)"""
+        self.count('requests')
+        return super().send(request, **kwargs)
+    
+    def count(self, key: str, value=1):
+        """Cộng bộ đếm thống kê"""
+        with self._stats_lock:
+            self._stats[key] += value
+    
+    def get_stats(self) -> Dict:
+        """
+        Thống kê của pool
+        
+        Returns:
+            Dict gồm requests, new_connections, reused, reuse_ratio,
+            waits (số lần pool hết kết nối rảnh), wait_seconds, discarded
+            (kết nối bị đóng vì pool đã đầy), pool_maxsize, pool_connections
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['reused'] = max(0, stats['requests'] - stats['new_connections'])
+        stats['reuse_ratio'] = round(stats['reused'] / stats['requests'], 3) if stats['requests'] else None
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats['pool_maxsize'] = self._pool_maxsize
+        stats['pool_connections'] = self._pool_connections
+        return stats
+
+
+def _tracked_pool(pool_base, connection_base, adapter: TrackedAdapter):
+    """Tạo lớp connection pool gắn với adapter (đếm kết nối mới, lần chờ, kết nối bị bỏ)"""
+    
+    class TrackedConnection(connection_base):
+        def _new_conn(self):
+            adapter.count('new_connections')
+            dns_cache = adapter.dns_cache
+            host = self._dns_host
+            address = dns_cache.lookup(host, self.port) if dns_cache else None
+            if address is None or address == host:
+                return super()._new_conn()
+            # Chỉ thay địa chỉ kết nối; SNI và kiểm tra chứng chỉ vẫn dùng self.host
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except NewConnectionError:
+                # Địa chỉ đã cache có thể không còn dùng được: phân giải lại
+                dns_cache.forget(host, self.port, address)
+                self._dns_host = host
+                return super()._new_conn()
+            finally:
+                self._dns_host = host
+    
+    class TrackedPool(pool_base):
+        ConnectionCls = TrackedConnection
+        
+        def _get_conn(self, timeout=None):
+            idle = self.pool is not None and not self.pool.empty()
+            started = time.monotonic()
+            conn = super()._get_conn(timeout)
+            if not idle:
+                adapter.count('waits')
+                adapter.count('wait_seconds', time.monotonic() - started)
+            return conn
+        
+        def _put_conn(self, conn):
+            if conn is not None and self.pool is not None and self.pool.full():
+                adapter.count('discarded')
+            super()._put_conn(conn)
+    
+    return TrackedPool
+
+
+class ConnectionManager:
+    """
+    Gắn adapter cho session: pool "api" cho host API / link rút gọn, pool "cdn" cho mọi host còn lại
+    
+    Kích thước pool tính theo số luồng: pool API đủ cho số luồng gọi API,
+    pool CDN đủ cho số video tải cùng lúc nhân số đoạn mỗi video, nên kết nối
+    keep-alive được dùng lại giữa các job thay vì mở rồi đóng.
+    """
+    
+    # Số host CDN (edge/mirror) giữ pool cùng lúc
+    CDN_HOSTS = 16
+    # Số host API giữ pool cùng lúc
+    API_HOSTS = 4
+    
+    def __init__(self, api_hosts: Iterable[str], api_pool_size: int = 4, cdn_pool_size: int = 12,
+                 block: bool = False, dns_ttl: float = 300):
+        """
+        Khởi tạo ConnectionManager
+        
+        Args:
+            api_hosts: Tiền tố URL đi qua pool API (ví dụ "https://www.douyin.com/")
+            api_pool_size: Số kết nối giữ lại cho mỗi host API
+            cdn_pool_size: Số kết nối giữ lại cho mỗi host CDN
+            block: Chờ kết nối rảnh khi pool đã đủ thay vì mở thêm kết nối tạm
+            dns_ttl: Thời gian cache DNS (giây), 0 = tắt
+        """
+        self.api_hosts = list(dict.fromkeys(api_hosts))
+        self.dns_cache = DnsCache(dns_ttl) if dns_ttl and dns_ttl > 0 else None
+        self.api = TrackedAdapter(
+            "api", self.dns_cache, pool_connections=self.API_HOSTS,
+            pool_maxsize=max(1, int(api_pool_size)), pool_block=block
+        )
+        self.cdn = TrackedAdapter(
+            "cdn", self.dns_cache, pool_connections=self.CDN_HOSTS,
+            pool_maxsize=max(1, int(cdn_pool_size)), pool_block=block
+        )
+    
+    @classmethod
+    def from_settings(cls, settings: Dict, api_hosts: Iterable[str]) -> "ConnectionManager":
+        """
+        Tạo ConnectionManager với kích thước pool tính từ settings
+        
+        Args:
+            settings: Phần "settings" trong config.json
+            api_hosts: Tiền tố URL đi qua pool API
+        """
+        workers = max(1, int(settings.get("max_concurrent", 3) or 1))
+        api_workers = max(
+            workers,
+            int(settings.get("resolve_concurrent", 2) or 1) if settings.get("pipeline_mode") else 1,
+            int(settings.get("short_link_concurrency", 8) or 1)
+        )
+        segments = max(1, int(settings.get("segment_count", 4)))
+        return cls(
+            api_hosts,
+            api_pool_size=settings.get("api_pool_size") or api_workers,
+            cdn_pool_size=settings.get("cdn_pool_size") or workers * segments,
+            block=bool(settings.get("pool_block", False)),
+            dns_ttl=settings.get("dns_cache_ttl", 300)
+        )
+    
+    def mount(self, session: requests.Session):
+        """Gắn adapter vào session (host API trước, còn lại đi qua pool CDN)"""
+        session.mount("http://", self.cdn)
+        session.mount("https://", self.cdn)
+        for prefix in self.api_hosts:
+            session.mount(prefix, self.api)
+    
+    def get_stats(self) -> Dict:
+        """Thống kê pool api, cdn và cache DNS"""
+        stats = {'api': self.api.get_stats(), 'cdn': self.cdn.get_stats()}
+        if self.dns_cache:
+            stats['dns'] = self.dns_cache.get_stats()
+        return stats
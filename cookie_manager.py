@@ -3,19 +3,41 @@ Cookie Manager Module
 Quản lý việc lưu và đọc cookie từ file config.json
 """
 
+import atexit
+import copy
 import json
 import os
-from typing import Optional
+import tempfile
+import threading
+from typing import List, Optional
 
 
 class CookieManager:
     """Quản lý cookie Douyin"""
     
     CONFIG_FILE = "config.json"
+    # Thời gian gom nhiều lần set_setting thành một lần ghi file (giây)
+    WRITE_DELAY = 0.5
     
-    def __init__(self):
-        """Khởi tạo CookieManager"""
-        self.config_file = self.CONFIG_FILE
+    def __init__(self, config_file: Optional[str] = None):
+        """
+        Khởi tạo CookieManager
+        
+        Args:
+            config_file: Đường dẫn file cấu hình (mặc định config.json)
+        """
+        self.config_file = config_file or self.CONFIG_FILE
+        
+        # Cấu hình được giữ trong bộ nhớ, chỉ đọc lại khi file thay đổi (mtime/size)
+        self._lock = threading.RLock()
+        self._config = None
+        self._config_stamp = None
+        self._pending_settings = {}
+        self._flush_timer = None
+        self._ensured_folders = set()
+        # Lưới an toàn nếu close() không được gọi; close() bỏ đăng ký
+        atexit.register(self.flush)
+        
         self._ensure_config_exists()
     
     def _ensure_config_exists(self):
@@ -31,18 +53,107 @@ class CookieManager:
             }
             self._save_config(default_config)
     
-    def _load_config(self) -> dict:
-        """Đọc cấu hình từ file"""
+    def _file_stamp(self):
+        """Dấu hiệu nhận biết file cấu hình đã thay đổi (mtime, size)"""
+        try:
+            stat = os.stat(self.config_file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+    
+    def _read_config_file(self) -> Optional[dict]:
+        """Đọc và parse file cấu hình, None nếu không có hoặc bị hỏng"""
         try:
             with open(self.config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+                config = json.load(f)
+            return config if isinstance(config, dict) else None
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Lỗi khi đọc {self.config_file}: {e}")
+            return None
+    
+    def _cached_config(self) -> dict:
+        """
+        Lấy cấu hình trong bộ nhớ, đọc lại file nếu mtime/size đã thay đổi
+        
+        Nếu file bị hỏng thì giữ nguyên bản đang có trong bộ nhớ
+        (không thay bằng {} để tránh mất cookie).
+        Dict trả về là bản dùng chung, không được sửa trực tiếp.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._config is None or stamp != self._config_stamp:
+                config = self._read_config_file()
+                if config is None:
+                    config = self._config if self._config is not None else {}
+                elif self._pending_settings:
+                    # Giữ các setting chưa kịp ghi xuống file
+                    config.setdefault("settings", {}).update(self._pending_settings)
+                self._config = config
+                self._config_stamp = stamp
+            return self._config
+    
+    def _load_config(self) -> dict:
+        """Đọc cấu hình (bản sao, có thể sửa rồi truyền cho _save_config)"""
+        return copy.deepcopy(self._cached_config())
     
     def _save_config(self, config: dict):
-        """Lưu cấu hình vào file"""
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        """
+        Lưu cấu hình vào file
+        
+        Ghi ra file tạm cùng thư mục rồi đổi tên, nên nếu bị tắt ngang
+        thì file cũ vẫn còn nguyên.
+        """
+        with self._lock:
+            self._cancel_flush()
+            directory = os.path.dirname(os.path.abspath(self.config_file))
+            fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_file)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            self._pending_settings = {}
+            self._config = copy.deepcopy(config)
+            self._config_stamp = self._file_stamp()
+    
+    def _schedule_flush(self):
+        """Hẹn ghi file sau WRITE_DELAY giây (gọi khi đang giữ lock)"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.WRITE_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def _cancel_flush(self):
+        """Hủy lần ghi đã hẹn (gọi khi đang giữ lock)"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+    
+    def flush(self):
+        """Ghi ngay các setting đang chờ xuống file"""
+        with self._lock:
+            self._flush_timer = None
+            if self._pending_settings:
+                try:
+                    self._save_config(self._load_config())
+                except Exception as e:
+                    print(f"Lỗi khi lưu cấu hình: {e}")
+    
+    def close(self):
+        """Ghi nốt setting đang chờ và bỏ đăng ký flush khi thoát (gọi khi không dùng nữa)"""
+        with self._lock:
+            self._cancel_flush()
+        self.flush()
+        atexit.unregister(self.flush)
     
     def save_cookie(self, cookie: str) -> bool:
         """
@@ -58,9 +169,10 @@ class CookieManager:
             if not cookie or not cookie.strip():
                 return False
             
-            config = self._load_config()
-            config["cookie"] = cookie.strip()
-            self._save_config(config)
+            with self._lock:
+                config = self._load_config()
+                config["cookie"] = cookie.strip()
+                self._save_config(config)
             return True
         except Exception as e:
             print(f"Lỗi khi lưu cookie: {e}")
@@ -74,13 +186,62 @@ class CookieManager:
             Cookie string hoặc None nếu không có
         """
         try:
-            config = self._load_config()
+            config = self._cached_config()
             cookie = config.get("cookie", "")
             return cookie if cookie else None
         except Exception as e:
             print(f"Lỗi khi đọc cookie: {e}")
             return None
     
+    def save_cookies(self, cookies: List[str]) -> bool:
+        """
+        Lưu danh sách cookie của nhiều tài khoản vào config.json
+        
+        Cookie đầu tiên là cookie chính ("cookie"), các cookie còn lại nằm trong "cookies".
+        
+        Args:
+            cookies: Danh sách cookie string (dòng trống và cookie trùng bị bỏ)
+            
+        Returns:
+            True nếu lưu thành công, False nếu danh sách rỗng hoặc có lỗi
+        """
+        try:
+            unique = []
+            for cookie in cookies:
+                cookie = (cookie or "").strip()
+                if cookie and cookie not in unique:
+                    unique.append(cookie)
+            if not unique:
+                return False
+            
+            with self._lock:
+                config = self._load_config()
+                config["cookie"] = unique[0]
+                config["cookies"] = unique[1:]
+                self._save_config(config)
+            return True
+        except Exception as e:
+            print(f"Lỗi khi lưu cookie: {e}")
+            return False
+    
+    def get_cookies(self) -> List[str]:
+        """
+        Lấy mọi cookie đã lưu (cookie chính đứng đầu)
+        
+        Returns:
+            Danh sách cookie string, rỗng nếu chưa có
+        """
+        try:
+            config = self._cached_config()
+            cookies = []
+            for cookie in [config.get("cookie", "")] + list(config.get("cookies") or []):
+                if cookie and cookie not in cookies:
+                    cookies.append(cookie)
+            return cookies
+        except Exception as e:
+            print(f"Lỗi khi đọc cookie: {e}")
+            return []
+    
     def validate_cookie(self, cookie: str) -> bool:
         """
         Kiểm tra định dạng cookie cơ bản
@@ -101,30 +262,44 @@ class CookieManager:
     
     def get_download_folder(self) -> str:
         """Lấy thư mục tải về"""
-        config = self._load_config()
+        config = self._cached_config()
         folder = config.get("download_folder", "./downloads")
         
-        # Tạo thư mục nếu chưa tồn tại
-        os.makedirs(folder, exist_ok=True)
+        # Tạo thư mục nếu chưa tồn tại (mỗi thư mục chỉ kiểm tra một lần)
+        if folder not in self._ensured_folders:
+            os.makedirs(folder, exist_ok=True)
+            self._ensured_folders.add(folder)
         return folder
     
     def set_download_folder(self, folder: str):
         """Thiết lập thư mục tải về"""
-        config = self._load_config()
-        config["download_folder"] = folder
-        self._save_config(config)
+        with self._lock:
+            config = self._load_config()
+            config["download_folder"] = folder
+            self._save_config(config)
+    
+    def get_settings(self) -> dict:
+        """Lấy toàn bộ settings (bản sao)"""
+        config = self._cached_config()
+        return copy.deepcopy(config.get("settings", {}))
     
     def get_setting(self, key: str, default=None):
         """Lấy một setting cụ thể"""
-        config = self._load_config()
+        config = self._cached_config()
         return config.get("settings", {}).get(key, default)
     
     def set_setting(self, key: str, value):
-        """Thiết lập một setting"""
-        config = self._load_config()
-        if "settings" not in config:
-            config["settings"] = {}
-        config["settings"][key] = value
-        self._save_config(config)
+        """
+        Thiết lập một setting
+        
+        Giá trị có hiệu lực ngay trong bộ nhớ; việc ghi file được hoãn
+        WRITE_DELAY giây để gom nhiều lần set_setting liên tiếp thành một lần ghi.
+        Gọi flush() nếu cần ghi ngay.
+        """
+        with self._lock:
+            config = self._cached_config()
+            config.setdefault("settings", {})[key] = value
+            self._pending_settings[key] = value
+            self._schedule_flush()
 
 
@@ -0,0 +1,172 @@
+"""
+Download Ledger Module
+Ghi lại các video đã tải xong để bỏ qua ở những lần chạy sau
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class DownloadLedger:
+    """
+    Sổ ghi các video đã tải xong (video_id, đường dẫn, kích thước, hash nội dung)
+    
+    Tra cứu theo video_id là khóa chính nên rất nhanh, không cần gọi mạng;
+    một bản ghi chỉ được coi là còn hiệu lực khi file vẫn tồn tại với đúng kích thước.
+    Bài ảnh được ghi theo thư mục: size là tổng kích thước các ảnh và files là số ảnh,
+    cả hai phải khớp với nội dung thư mục.
+    
+    content_hash có dạng "<thuật toán>:<hex>": "sha256-1m:..." là hash theo khối của
+    integrity.BlockHasher, "sha256:..." là SHA-256 của cả file (bản ghi từ phiên bản cũ).
+    """
+    
+    FILENAME = ".douyin_ledger.sqlite3"
+    
+    def __init__(self, db_path: str):
+        """
+        Khởi tạo DownloadLedger
+        
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._stats = {'skipped': 0, 'recorded': 0, 'stale': 0}
+        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            " video_id TEXT PRIMARY KEY,"
+            " file_path TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " content_hash TEXT,"
+            " completed_at REAL NOT NULL,"
+            " files INTEGER)"
+        )
+        self._migrate()
+        self._conn.commit()
+    
+    def _migrate(self):
+        """Cập nhật ledger tạo bởi phiên bản cũ"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(downloads)")}
+        # Cột sha256 cũ chứa SHA-256 hex của cả file: đổi tên và thêm tiền tố thuật toán
+        if 'sha256' in columns:
+            self._conn.execute("ALTER TABLE downloads RENAME COLUMN sha256 TO content_hash")
+            self._conn.execute(
+                "UPDATE downloads SET content_hash = 'sha256:' || content_hash"
+                " WHERE content_hash IS NOT NULL AND instr(content_hash, ':') = 0"
+            )
+        # Số ảnh của bài ảnh
+        if 'files' not in columns:
+            self._conn.execute("ALTER TABLE downloads ADD COLUMN files INTEGER")
+    
+    @classmethod
+    def for_folder(cls, download_folder: str) -> "DownloadLedger":
+        """Tạo ledger nằm trong thư mục tải về"""
+        return cls(os.path.join(download_folder, cls.FILENAME))
+    
+    def lookup(self, video_id: str) -> Optional[Dict]:
+        """
+        Tra cứu video đã tải
+        
+        Args:
+            video_id: ID video
+        
+        Returns:
+            Dict {video_id, file_path, size, files, content_hash, completed_at} nếu video đã tải
+            và file (hoặc thư mục ảnh) vẫn còn nguyên, ngược lại None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_path, size, files, content_hash, completed_at FROM downloads WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        
+        file_path, size, files, content_hash, completed_at = row
+        try:
+            if os.path.isdir(file_path):
+                intact = files is not None and self._folder_size(file_path) == (size, files)
+            else:
+                intact = os.path.getsize(file_path) == size
+        except OSError:
+            intact = False
+        
+        with self._lock:
+            self._stats['skipped' if intact else 'stale'] += 1
+        if not intact:
+            return None
+        return {
+            'video_id': video_id,
+            'file_path': file_path,
+            'size': size,
+            'files': files,
+            'content_hash': content_hash,
+            'completed_at': completed_at
+        }
+    
+    def record(self, video_id: str, file_path: str, size: Optional[int] = None,
+               content_hash: Optional[str] = None, files: Optional[int] = None):
+        """
+        Ghi nhận một video (hoặc bài ảnh) đã tải xong
+        
+        Args:
+            video_id: ID video
+            file_path: Đường dẫn file đã lưu, hoặc thư mục ảnh của bài ảnh
+            size: Kích thước file / tổng kích thước các ảnh (mặc định đọc từ đĩa)
+            content_hash: Hash nội dung dạng "<thuật toán>:<hex>" (tùy chọn)
+            files: Số ảnh trong thư mục (mặc định đọc từ đĩa, chỉ dùng cho thư mục)
+        """
+        if not video_id:
+            return
+        if os.path.isdir(file_path):
+            if size is None or files is None:
+                size, files = self._folder_size(file_path)
+        elif size is None:
+            size = os.path.getsize(file_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads"
+                " (video_id, file_path, size, files, content_hash, completed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, file_path, size, files, content_hash, time.time())
+            )
+            self._conn.commit()
+            self._stats['recorded'] += 1
+    
+    @staticmethod
+    def _folder_size(folder: str) -> Tuple[int, int]:
+        """(tổng kích thước, số file) của các file trong thư mục"""
+        total = count = 0
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+                    count += 1
+        return total, count
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê ledger
+        
+        Returns:
+            Dict gồm skipped (bỏ qua vì đã tải), stale (bản ghi nhưng file mất/đổi),
+            recorded (ghi mới trong phiên này), entries
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+        return stats
+    
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
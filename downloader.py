@@ -6,36 +6,144 @@ Xử lý việc tải video từ Douyin
 import os
 import re
 import time
+import threading
+import queue
+import http.client
 import requests
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterable, Iterator, Callable, Tuple, Union
 from urllib.parse import urlparse, parse_qs
 import json
 
+from account_pool import AccountPool
+from download_ledger import DownloadLedger
+from gallery import GalleryDownloader
+from integrity import BlockHasher, BlockWriter, IntegrityError, check_content_type, check_mp4_header
+from metadata_cache import MetadataCache
+from mirrors import MirrorSelector
+from progress import ProgressTracker, TransferProgress, TransferStalled
+from bandwidth import BandwidthLimiter, TransferThrottle
+from connection_pool import ConnectionManager
+from job_queue import JobQueue
+from retry_policy import RetryPolicy, parse_retry_after
+from short_links import RedirectCache, ShortLinkResolver
+from tracing import Tracer
+
 
 class VideoDownloader:
     """Xử lý tải video Douyin"""
     
-    def __init__(self, cookie: str):
+    # Hậu tố file đang tải dở
+    PART_SUFFIX = ".part"
+    # Số lần thử lại cho mỗi đoạn khi tải nhiều đoạn
+    SEGMENT_RETRIES = 3
+    # Số mirror tối đa được gửi request cùng lúc ở chế độ "race"
+    RACE_MIRRORS = 3
+    # Kích thước mặc định mỗi lần đọc body (byte)
+    CHUNK_SIZE = 256 * 1024
+    # HTTP status của CDN khi link phát đã ký bị thu hồi / hết hạn
+    DEAD_LINK_STATUS = {403, 410}
+    # Lưu vị trí đã ghi vào file phụ sau mỗi chừng này byte hoặc giây, tùy điều kiện nào đến trước
+    # (file .part đã cấp phát trước nên kích thước file không cho biết đã tải được bao nhiêu)
+    PART_CHECKPOINT = 1024 * 1024
+    PART_CHECKPOINT_INTERVAL = 1.0
+    # Số thông tin video lấy sẵn (từ danh sách bài của profile) giữ chờ job dùng
+    PREFETCHED_LIMIT = 1000
+    
+    def __init__(self, cookie: Union[str, List[str]], settings: Optional[Dict] = None,
+                 metadata_cache: Optional[MetadataCache] = None,
+                 ledger: Optional[DownloadLedger] = None):
         """
         Khởi tạo VideoDownloader
         
         Args:
-            cookie: Cookie string để xác thực
+            cookie: Cookie string để xác thực, hoặc danh sách cookie của nhiều tài khoản
+                (request API được chia cho các tài khoản, cookie đầu tiên dùng cho CDN / link rút gọn)
+            settings: Phần "settings" trong config.json (tùy chọn)
+            metadata_cache: Cache thông tin video để khỏi gọi lại API (tùy chọn)
+            ledger: Sổ ghi video đã tải để bỏ qua khi chạy lại (tùy chọn)
         """
-        self.cookie = cookie
+        cookies = [cookie] if isinstance(cookie, str) else list(cookie)
+        self.cookie = cookies[0] if cookies else ""
+        self.settings = settings or {}
+        self.metadata_cache = metadata_cache
+        self.ledger = ledger
         self.session = requests.Session()
         self._setup_session()
+        
+        # Địa chỉ API (đổi sang server giả lập khi chạy benchmark) và kích thước mỗi lần đọc body
+        self.api_base = self.settings.get("api_base", "https://www.douyin.com").rstrip('/')
+        self.chunk_size = max(1024, int(self.settings.get("chunk_size", self.CHUNK_SIZE)))
+        
+        # Pool kết nối riêng cho API (kể cả link rút gọn) và CDN, kích thước theo số luồng, có cache DNS
+        api_hosts = [f"{self.api_base}/"] + [
+            f"{scheme}://{host}/" for host in ShortLinkResolver.SHORT_HOSTS for scheme in ("https", "http")
+        ]
+        self.connections = ConnectionManager.from_settings(self.settings, api_hosts)
+        self.connections.mount(self.session)
+        
+        # Tải nhiều đoạn song song cho file lớn (1 = tắt)
+        self.segment_count = max(1, int(self.settings.get("segment_count", 4)))
+        self.segment_min_size = int(self.settings.get("segment_min_size", 8 * 1024 * 1024))
+        
+        # Chọn mirror CDN: "ranked" (theo thống kê host), "race" (thử song song) hoặc "first"
+        self.mirror_strategy = self.settings.get("mirror_strategy", "ranked")
+        self.mirrors = MirrorSelector()
+        
+        # Thử lại có backoff; mỗi tài khoản (cookie) có session và giới hạn tốc độ gọi API riêng,
+        # api_limiter là rate limiter của cookie chính
+        self.retry_policy = RetryPolicy.from_settings(self.settings)
+        self.accounts = AccountPool.from_settings(cookies, self._account_session, self.settings)
+        self.api_limiter = self.accounts.primary.limiter
+        # Phân giải link rút gọn v.douyin.com (cache được mở trong open_stores)
+        self.short_links = ShortLinkResolver(
+            self.session,
+            max_workers=self.settings.get("short_link_concurrency", 8)
+        )
+        
+        # Tiến độ theo byte (gán progress.callback để nhận cập nhật);
+        # không nhận byte nào trong stall_timeout giây thì hủy kết nối và thử lại
+        self.progress = ProgressTracker(interval=self.settings.get("progress_interval", 0.5))
+        self.stall_timeout = float(self.settings.get("stall_timeout", 30))
+        
+        # Bài ảnh: tải song song tối đa image_concurrency ảnh mỗi bài
+        self.gallery = GalleryDownloader(self, max_workers=self.settings.get("image_concurrency", 4))
+        
+        # Giới hạn tổng băng thông tải (bandwidth_limit, bandwidth_schedule), chia đều cho các video đang tải
+        self.bandwidth = BandwidthLimiter.from_settings(self.settings)
+        
+        # Trace thời gian từng giai đoạn ra JSONL (tắt nếu không có trace_file)
+        self.tracer = Tracer(self.settings.get("trace_file"))
+        
+        # Bộ đếm retry/throttle của job đang chạy trên từng luồng
+        self._job_stats = threading.local()
+        
+        # Giữ chỗ tên file khi nhiều job chạy song song
+        self._path_lock = threading.Lock()
+        self._reserved_paths = set()
+        
+        # Thông tin video đã có sẵn từ danh sách bài (profile), job dùng thay cho gọi aweme/detail
+        self._prefetched_lock = threading.Lock()
+        self._prefetched: Dict[str, Dict] = {}
     
-    def _setup_session(self):
-        """Thiết lập session với headers và cookie"""
+    def _setup_session(self, session: Optional[requests.Session] = None, cookie: Optional[str] = None):
+        """Thiết lập session (mặc định session chính) với headers và cookie"""
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
             "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
             "Referer": "https://www.douyin.com/",
-            "Cookie": self.cookie
+            "Cookie": self.cookie if cookie is None else cookie
         }
-        self.session.headers.update(headers)
+        (session or self.session).headers.update(headers)
+    
+    def _account_session(self, cookie: str) -> requests.Session:
+        """Session gọi API của một tài khoản: cookie chính dùng session chính, cookie khác có session riêng chung pool kết nối"""
+        if cookie == self.cookie.strip():
+            return self.session
+        session = requests.Session()
+        self._setup_session(session, cookie)
+        self.connections.mount(session)
+        return session
     
     def normalize_url(self, url: str) -> Optional[str]:
         """
@@ -65,6 +173,53 @@ class VideoDownloader:
         except Exception:
             return url
     
+    def canonical_url(self, video_id: str) -> str:
+        """Link video dạng chuẩn từ video ID"""
+        return f"https://www.douyin.com/video/{video_id}"
+    
+    def resolve_short_url(self, url: str) -> Optional[str]:
+        """
+        Đổi link rút gọn (v.douyin.com/xxxx) thành link video dạng chuẩn
+        
+        Args:
+            url: URL đã chuẩn hóa
+            
+        Returns:
+            Link dạng chuẩn, chính url nếu không phải link rút gọn,
+            hoặc None nếu không phân giải được
+        """
+        if not self.short_links.is_short_link(url):
+            return url
+        video_id = self.short_links.resolve(url)
+        return self.canonical_url(video_id) if video_id else None
+    
+    def resolve_short_links(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Phân giải song song nhiều link rút gọn
+        
+        Args:
+            urls: Các URL đã chuẩn hóa (link không rút gọn được bỏ qua)
+            
+        Returns:
+            Dict {link rút gọn: link dạng chuẩn hoặc None}
+        """
+        short_urls = [url for url in urls if self.short_links.is_short_link(url)]
+        resolved = self.short_links.resolve_many(short_urls)
+        return {
+            url: self.canonical_url(video_id) if video_id else None
+            for url, video_id in resolved.items()
+        }
+    
+    def known_video_id(self, url: str) -> Optional[str]:
+        """
+        Video ID biết được mà không cần gọi mạng
+        
+        Lấy từ URL, hoặc từ cache link rút gọn nếu là link rút gọn đã phân giải trước đó.
+        """
+        if self.short_links.is_short_link(url):
+            return self.short_links.cached_video_id(url)
+        return self.extract_video_id(url)
+    
     def extract_video_id(self, url: str) -> Optional[str]:
         """
         Trích xuất video ID từ URL
@@ -79,6 +234,7 @@ class VideoDownloader:
             # Pattern cho video ID trong URL Douyin
             patterns = [
                 r'/video/(\d+)',
+                r'/note/(\d+)',
                 r'video_id=(\d+)',
                 r'item_id=(\d+)',
             ]
@@ -101,12 +257,16 @@ class VideoDownloader:
             print(f"Lỗi khi trích xuất video ID: {e}")
             return None
     
-    def get_video_info(self, url: str) -> Optional[Dict]:
+    def get_video_info(self, url: str, use_cache: bool = True) -> Optional[Dict]:
         """
         Lấy thông tin video từ Douyin API
         
+        Thông tin lấy từ danh sách bài của profile hoặc từ cache có thêm key 'source'
+        ("prefetched" / "cache") để biết link phát có thể đã cũ.
+        
         Args:
             url: URL video
+            use_cache: False để bỏ qua thông tin có sẵn / cache và luôn gọi API
             
         Returns:
             Dict chứa thông tin video hoặc None nếu lỗi
@@ -116,36 +276,33 @@ class VideoDownloader:
             if not video_id:
                 return None
             
+            # Thông tin đã có sẵn từ danh sách bài của profile
+            prefetched = self.take_prefetched(video_id) if use_cache else None
+            if prefetched:
+                self.tracer.add_count('prefetched_info')
+                prefetched['source'] = "prefetched"
+                return prefetched
+            
+            # Dùng lại thông tin đã lấy nếu link phát còn hạn
+            if self.metadata_cache and use_cache:
+                with self.tracer.span('metadata_cache'):
+                    cached = self.metadata_cache.get(video_id)
+                if cached:
+                    cached['source'] = "cache"
+                    return cached
+            
             # API endpoint để lấy thông tin video
             # Lưu ý: API này có thể thay đổi, cần cập nhật theo thời gian
-            api_url = f"https://www.douyin.com/aweme/v1/web/aweme/detail/?aweme_id={video_id}"
+            api_url = f"{self.api_base}/aweme/v1/web/aweme/detail/?aweme_id={video_id}"
             
-            response = self.session.get(api_url, timeout=10)
+            data = self._api_get_json(api_url)
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Parse response để lấy link video
-                # Cấu trúc response có thể thay đổi
-                if 'aweme_detail' in data:
-                    aweme = data['aweme_detail']
-                    video_info = {
-                        'video_id': video_id,
-                        'title': aweme.get('desc', ''),
-                        'author': aweme.get('author', {}).get('nickname', ''),
-                        'video_url': None
-                    }
-                    
-                    # Tìm link video trong response
-                    video_data = aweme.get('video', {})
-                    if video_data:
-                        play_addr = video_data.get('play_addr', {})
-                        if play_addr:
-                            url_list = play_addr.get('url_list', [])
-                            if url_list:
-                                video_info['video_url'] = url_list[0]
-                    
-                    return video_info
+            # Cấu trúc response có thể thay đổi
+            if data is not None and 'aweme_detail' in data:
+                video_info = self.parse_aweme(data['aweme_detail'], video_id)
+                if self.metadata_cache and (video_info['video_url'] or video_info['images']):
+                    self.metadata_cache.put(video_info)
+                return video_info
             
             return None
             
@@ -156,38 +313,873 @@ class VideoDownloader:
             print(f"Lỗi không xác định: {e}")
             return None
     
-    def download_video(self, video_url: str, save_path: str) -> bool:
+    @staticmethod
+    def parse_aweme(aweme: Dict, video_id: Optional[str] = None) -> Dict:
+        """
+        Đọc thông tin video từ một aweme (dùng cho cả aweme/detail và danh sách bài của profile)
+        
+        Bài ảnh (có 'images') có media_type "gallery" và danh sách ảnh trong 'images';
+        link phát (nếu có) của bài ảnh là nhạc nền nên không được dùng.
+        
+        Args:
+            aweme: Dict aweme trong response API
+            video_id: ID video (mặc định lấy aweme_id)
+            
+        Returns:
+            Dict thông tin video, video_url là None nếu không có link phát
+        """
+        video_info = {
+            'video_id': video_id or str(aweme.get('aweme_id') or ''),
+            'title': aweme.get('desc', ''),
+            'author': (aweme.get('author') or {}).get('nickname', ''),
+            'video_url': None,
+            'video_urls': [],
+            'create_time': aweme.get('create_time'),
+            'duration': None,
+            'width': None,
+            'height': None,
+            'data_size': None,
+            'media_type': "video",
+            'images': GalleryDownloader.parse_images(aweme)
+        }
+        if video_info['images']:
+            video_info['media_type'] = "gallery"
+            return video_info
+        
+        # Tìm link video trong response
+        video_data = aweme.get('video') or {}
+        if video_data:
+            play_addr = video_data.get('play_addr') or {}
+            if play_addr:
+                url_list = play_addr.get('url_list', [])
+                if url_list:
+                    video_info['video_url'] = url_list[0]
+                    video_info['video_urls'] = list(url_list)
+                video_info['width'] = play_addr.get('width')
+                video_info['height'] = play_addr.get('height')
+                video_info['data_size'] = play_addr.get('data_size')
+            video_info['duration'] = video_data.get('duration')
+        return video_info
+    
+    def add_prefetched(self, video_info: Dict):
+        """
+        Giữ thông tin video đã có sẵn (link phát lấy từ danh sách bài) để job
+        của video này khỏi gọi aweme/detail
+        
+        Chỉ giữ tối đa PREFETCHED_LIMIT video, bỏ video cũ nhất khi đầy
+        (job đó sẽ gọi API như bình thường).
+        """
+        with self._prefetched_lock:
+            self._prefetched[video_info['video_id']] = video_info
+            while len(self._prefetched) > self.PREFETCHED_LIMIT:
+                del self._prefetched[next(iter(self._prefetched))]
+    
+    def take_prefetched(self, video_id: str) -> Optional[Dict]:
+        """Lấy (và bỏ khỏi danh sách giữ) thông tin video đã có sẵn, None nếu không có"""
+        with self._prefetched_lock:
+            return self._prefetched.pop(video_id, None)
+    
+    def _api_get_json(self, api_url: str) -> Optional[Dict]:
+        """
+        Gọi API qua tài khoản đang khỏe và rate limiter của nó, thử lại lỗi tạm thời với backoff + jitter
+        
+        429/403 làm rate limiter của tài khoản giảm tốc và tạm dừng theo Retry-After;
+        429/403 hoặc API báo chưa đăng nhập làm tài khoản bị cho nghỉ, lần thử sau dùng tài khoản khác.
+        
+        Args:
+            api_url: URL API
+            
+        Returns:
+            JSON trả về, hoặc None nếu lỗi vĩnh viễn / hết số lần thử
+        """
+        policy = self.retry_policy
+        for attempt in range(1, policy.max_attempts + 1):
+            account = self.accounts.acquire()
+            waited = account.limiter.acquire()
+            self._count_job_stat('rate_limit_wait', waited)
+            self.tracer.add_time('rate_limit_wait', waited)
+            retry_after = None
+            try:
+                with self.tracer.span('api'):
+                    response = account.session.get(api_url, timeout=10)
+                    data = response.json() if response.status_code == 200 else None
+                self.tracer.add_count('api_requests')
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.accounts.release(account, error=str(e))
+                if not policy.is_retryable_error(e):
+                    raise
+                error = e
+            else:
+                if response.status_code in policy.THROTTLE_STATUS:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                outcome = self.accounts.release(account, response.status_code, data, retry_after=retry_after)
+                if outcome is None:
+                    account.limiter.on_success()
+                    return data
+                if response.status_code in policy.THROTTLE_STATUS:
+                    account.limiter.on_throttle(retry_after)
+                    self._count_job_stat('throttled')
+                if outcome == "login_required":
+                    error = f"cookie {account.name} chưa đăng nhập"
+                    if not self.accounts.healthy_count():
+                        print(f"Lỗi khi lấy thông tin video: {error}")
+                        return None
+                elif not policy.is_retryable_status(response.status_code):
+                    print(f"Lỗi khi lấy thông tin video: HTTP {response.status_code}")
+                    return None
+                else:
+                    error = f"HTTP {response.status_code}"
+            
+            if attempt == policy.max_attempts:
+                print(f"Lỗi khi lấy thông tin video sau {attempt} lần thử: {error}")
+                return None
+            self._count_job_stat('retries')
+            # Còn tài khoản khỏe thì thử lại ngay bằng tài khoản đó, không chờ Retry-After
+            if self.accounts.healthy_count():
+                retry_after = None
+            with self.tracer.span('backoff'):
+                time.sleep(policy.delay(attempt, retry_after))
+        return None
+    
+    def _count_job_stat(self, key: str, value=1):
+        """Cộng dồn bộ đếm (retries, throttled, rate_limit_wait, stalls) của job trên luồng hiện tại"""
+        stats = getattr(self._job_stats, 'values', None)
+        if stats is None:
+            stats = self._job_stats.values = {}
+        stats[key] = stats.get(key, 0) + value
+    
+    def _merge_job_stats(self, result: Dict):
+        """Chuyển bộ đếm của luồng hiện tại vào dict kết quả rồi đặt lại"""
+        stats = getattr(self._job_stats, 'values', None) or {}
+        self._job_stats.values = {}
+        for key in ('retries', 'throttled', 'rate_limit_wait', 'stalls'):
+            result[key] = result.get(key, 0) + stats.get(key, 0)
+    
+    def download_video(self, video_url: str, save_path: str, mirrors: Optional[List[str]] = None,
+                       job: Optional[str] = None, video_id: Optional[str] = None,
+                       integrity: Optional[Dict] = None) -> bool:
         """
         Tải video từ URL về máy
         
+        Dữ liệu được ghi vào file <save_path>.part kèm file phụ .part.json
+        lưu kích thước và validator (ETag/Last-Modified). Nếu kết nối bị ngắt,
+        lần thử sau (hoặc lần chạy sau) sẽ tải tiếp bằng header Range,
+        lần lượt qua các mirror khác nếu có.
+        Dữ liệu được kiểm tra ngay trong lúc ghi (Content-Type, kích thước theo
+        Content-Length, hash nội dung tính dần); file .part chỉ được đổi tên thành
+        save_path khi đủ số byte và bắt đầu bằng box ftyp của MP4, nếu không thì tải lại.
+        
         Args:
             video_url: URL video thực tế
             save_path: Đường dẫn lưu file
+            mirrors: Các URL mirror tương đương (play_addr.url_list), tùy chọn
+            job: Khóa job trong cập nhật tiến độ (mặc định save_path)
+            video_id: ID video gửi kèm cập nhật tiến độ (tùy chọn)
+            integrity: Dict nhận kết quả kiểm tra khi tải thành công: size, content_hash;
+                       khi thất bại vì mọi lần thử đều bị 403/410 hoặc dữ liệu sai thì có
+                       dead_link = True (link phát không còn dùng được) (tùy chọn)
             
         Returns:
             True nếu tải thành công, False nếu lỗi
         """
+        part_path = save_path + self.PART_SUFFIX
+        meta_path = part_path + ".json"
+        hasher = BlockHasher()
+        transfer = self.progress.start(job or save_path, video_id, os.path.basename(save_path))
+        throttle = self.bandwidth.open()
+        state = "failed"
+        
         try:
-            response = self.session.get(video_url, stream=True, timeout=30)
-            response.raise_for_status()
-            
             # Tạo thư mục nếu chưa tồn tại
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+            
+            with self.tracer.span('mirror_select'):
+                urls = self._select_mirrors(video_url, mirrors, resuming=os.path.exists(meta_path))
+            policy = self.retry_policy
+            attempts = max(policy.max_attempts, len(urls))
+            # Số lần thử lỗi và có lần nào lỗi vì lý do khác link hỏng không
+            failures = 0
+            other_error = False
+            for attempt in range(attempts):
+                if attempt > 0:
+                    self._count_job_stat('retries')
+                # Mỗi lần thử bắt đầu từ mirror kế tiếp, tải tiếp đúng vị trí byte cũ
+                shift = attempt % len(urls)
+                try:
+                    if self._download_to_part(urls[shift:] + urls[:shift], part_path, meta_path,
+                                              transfer, throttle, hasher):
+                        with self.tracer.span('verify'):
+                            verified = self._verify_part(part_path, meta_path, hasher)
+                        if integrity is not None:
+                            integrity.update(verified)
+                        with self.tracer.span('finalize'):
+                            os.replace(part_path, save_path)
+                            self._remove_file(meta_path)
+                        state = "done"
+                        return True
+                except requests.exceptions.RequestException as e:
+                    print(f"Lỗi khi tải video (lần {attempt + 1}/{attempts}): {e}")
+                    state = "stalled" if isinstance(e, TransferStalled) else "failed"
+                    failures += 1
+                    other_error = other_error or not self._is_dead_link_error(e)
+                    response = getattr(e, 'response', None)
+                    retry_after = None
+                    if response is not None and response.status_code in policy.THROTTLE_STATUS:
+                        self._count_job_stat('throttled')
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    next_attempt = attempt + 1
+                    # Lỗi vĩnh viễn: chỉ thử tiếp nếu còn mirror chưa thử
+                    if not policy.is_retryable_error(e) and next_attempt >= len(urls):
+                        break
+                    # Đã thử hết các mirror một lượt: chờ backoff trước khi thử lại
+                    if next_attempt < attempts and next_attempt >= len(urls):
+                        with self.tracer.span('backoff'):
+                            time.sleep(policy.delay(next_attempt - len(urls) + 1, retry_after))
             
-            # Tải file
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            if integrity is not None and failures and not other_error:
+                integrity['dead_link'] = True
+            return False
             
+        except Exception as e:
+            print(f"Lỗi không xác định khi tải: {e}")
+            state = "failed"
+            return False
+        finally:
+            throttle.close()
+            transfer.finish(state)
+    
+    @classmethod
+    def _is_dead_link_error(cls, error: Exception) -> bool:
+        """Lỗi cho thấy link phát không còn dùng được: 403/410 hoặc server trả dữ liệu sai (trang lỗi...)"""
+        if isinstance(error, IntegrityError):
             return True
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code in cls.DEAD_LINK_STATUS
+    
+    def _select_mirrors(self, video_url: str, mirrors: Optional[List[str]], resuming: bool) -> List[str]:
+        """
+        Xác định thứ tự thử các mirror theo mirror_strategy
+        
+        Args:
+            video_url: URL video chính
+            mirrors: Các URL mirror tương đương
+            resuming: True nếu đang tải tiếp file .part (không cần race)
+            
+        Returns:
+            Danh sách URL theo thứ tự thử, luôn có ít nhất video_url
+        """
+        urls = list(dict.fromkeys(url for url in [video_url] + list(mirrors or []) if url))
+        if len(urls) <= 1 or self.mirror_strategy == "first":
+            return urls
+        urls = self.mirrors.order(urls)
+        if self.mirror_strategy == "race" and not resuming:
+            urls = self._race_mirrors(urls)
+        return urls
+    
+    def _race_mirrors(self, urls: List[str]) -> List[str]:
+        """
+        Gửi request Range 1 byte tới các mirror đầu danh sách cùng lúc,
+        đưa mirror phản hồi thành công đầu tiên lên đầu
+        
+        Các mirror phản hồi chậm hơn vẫn được ghi nhận độ trễ cho lần sau.
+        """
+        winner = []
+        lock = threading.Lock()
+        found = threading.Event()
+        
+        def probe(url: str):
+            try:
+                with self._open_stream(url, {'Range': 'bytes=0-0'}) as response:
+                    if response.status_code in (200, 206):
+                        with lock:
+                            if not winner:
+                                winner.append(url)
+                                found.set()
+            except requests.exceptions.RequestException:
+                pass
+        
+        threads = [
+            threading.Thread(target=probe, args=(url,), daemon=True)
+            for url in urls[:self.RACE_MIRRORS]
+        ]
+        for thread in threads:
+            thread.start()
+        while not found.wait(0.05):
+            if not any(thread.is_alive() for thread in threads):
+                break
+        
+        if not winner:
+            return urls
+        return [winner[0]] + [url for url in urls if url != winner[0]]
+    
+    def _open_stream(self, url: str, headers: Dict) -> requests.Response:
+        """
+        Gửi GET dạng stream và ghi nhận độ trễ / lỗi của host vào MirrorSelector
+        
+        Args:
+            url: URL cần tải
+            headers: Header bổ sung (Range, If-Range...)
             
+        Returns:
+            Response (chưa đọc body)
+        """
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, stream=True, timeout=(30, self.stall_timeout), headers=headers)
+        except requests.exceptions.RequestException as e:
+            self.mirrors.record_failure(url, type(e).__name__)
+            self.tracer.add_time('cdn_ttfb', time.monotonic() - started)
+            raise
+        ttfb = time.monotonic() - started
+        self.mirrors.record_response(url, ttfb)
+        # Gồm cả kết nối TCP/TLS (nếu không dùng lại kết nối cũ) đến khi nhận header
+        self.tracer.add_time('cdn_ttfb', ttfb)
+        self.tracer.add_count('cdn_requests')
+        if response.status_code >= 400 and response.status_code != 416:
+            self.mirrors.record_failure(url, f"HTTP {response.status_code}")
+        return response
+    
+    def _write_stream(self, url: str, response: requests.Response, f,
+                      limit: Optional[int] = None, on_bytes: Optional[Callable[[int], None]] = None,
+                      throttle: Optional[TransferThrottle] = None, hasher: Optional[BlockWriter] = None) -> int:
+        """
+        Ghi body của response vào file đang mở và ghi nhận tốc độ của host
+        
+        Nếu stream bị ngắt sau stall_timeout giây không nhận được byte nào
+        thì báo TransferStalled để lần thử sau chuyển sang mirror khác.
+        Body được đọc thẳng vào một buffer dùng lại (xem _iter_body).
+        
+        Args:
+            url: URL của response (để thống kê theo host)
+            response: Response dạng stream
+            f: File đã mở để ghi, đã seek đúng vị trí
+            limit: Số byte tối đa cần ghi (None = đến hết stream)
+            on_bytes: Callback(số byte) sau mỗi lần ghi
+            throttle: Phần băng thông của lượt tải (chờ sau mỗi chunk nếu vượt giới hạn)
+            hasher: Cập nhật hash nội dung với từng chunk trước khi ghi (tùy chọn)
+        
+        Returns:
+            Số byte đã ghi
+        """
+        received = 0
+        started = last_byte = time.monotonic()
+        # Chỉ đo thời gian ghi đĩa khi đang bật trace
+        trace = self.tracer.current()
+        disk_time = 0.0
+        throttle_wait = 0.0
+        try:
+            for chunk in self._iter_body(response, limit):
+                if not chunk:
+                    continue
+                last_byte = time.monotonic()
+                if hasher is not None:
+                    hasher.update(chunk)
+                if trace is None:
+                    f.write(chunk)
+                else:
+                    write_started = time.perf_counter()
+                    f.write(chunk)
+                    disk_time += time.perf_counter() - write_started
+                received += len(chunk)
+                if on_bytes:
+                    on_bytes(len(chunk))
+                if throttle is not None:
+                    throttle_wait += throttle.consume(len(chunk))
+                if limit is not None and received >= limit:
+                    break
         except requests.exceptions.RequestException as e:
-            print(f"Lỗi khi tải video: {e}")
+            if trace is not None:
+                self._trace_transfer(trace, time.monotonic() - started, disk_time, throttle_wait, received)
+            stalled = time.monotonic() - last_byte >= self.stall_timeout * 0.9
+            self.mirrors.record_failure(url, "Stalled" if stalled else type(e).__name__, received)
+            if stalled and not isinstance(e, TransferStalled):
+                self._count_job_stat('stalls')
+                raise TransferStalled(
+                    f"Không nhận được dữ liệu trong {self.stall_timeout:.0f}s ({received} byte đã nhận)"
+                ) from e
+            raise
+        self.mirrors.record_success(url, received, time.monotonic() - started)
+        if trace is not None:
+            self._trace_transfer(trace, time.monotonic() - started, disk_time, throttle_wait, received)
+        return received
+    
+    def _iter_body(self, response: requests.Response, limit: Optional[int] = None):
+        """
+        Đọc body theo từng khối chunk_size
+        
+        Body không nén được đọc bằng readinto của http.client vào một bytearray dùng lại
+        cho cả lượt đọc: không tạo object bytes cho mỗi khối và bỏ qua lớp đệm của urllib3.
+        Khối trả về là memoryview của buffer đó, chỉ hợp lệ đến lần lặp kế tiếp.
+        Body có Content-Encoding (hoặc không lấy được http.client response) thì dùng iter_content.
+        
+        Args:
+            response: Response dạng stream
+            limit: Số byte tối đa cần đọc (None = đến hết stream)
+            
+        Yields:
+            Khối dữ liệu (memoryview hoặc bytes)
+        """
+        raw = response.raw
+        fp = getattr(raw, '_fp', None)
+        encoding = response.headers.get('Content-Encoding', 'identity').lower()
+        if encoding not in ('', 'identity') or not hasattr(fp, 'readinto'):
+            received = 0
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if limit is not None:
+                    chunk = chunk[:limit - received]
+                received += len(chunk)
+                yield chunk
+                if limit is not None and received >= limit:
+                    return
+            return
+        
+        view = memoryview(bytearray(self.chunk_size))
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+            # Đổi lỗi sang lỗi requests giống iter_content để logic thử lại không đổi
+            try:
+                count = fp.readinto(view[:size])
+            except http.client.HTTPException as e:
+                raise requests.exceptions.ChunkedEncodingError(e)
+            except OSError as e:
+                raise requests.exceptions.ConnectionError(e)
+            if not count:
+                # http.client không báo lỗi khi kết nối đóng trước khi đủ Content-Length
+                if fp.length:
+                    raise requests.exceptions.ChunkedEncodingError(http.client.IncompleteRead(b'', fp.length))
+                break
+            if remaining is not None:
+                remaining -= count
+            yield view[:count]
+        # Đã đọc hết body: trả kết nối về pool (urllib3 không biết body đã được đọc qua http.client)
+        if fp.isclosed():
+            raw.release_conn()
+    
+    @staticmethod
+    def _preallocate(f, size: int):
+        """Cấp phát trước size byte cho file đang mở (posix_fallocate nếu có, không thì truncate)"""
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass
+        f.truncate(size)
+    
+    @staticmethod
+    def _trace_transfer(trace, elapsed: float, disk_time: float, throttle_wait: float, received: int):
+        """Ghi thời gian nhận body (trừ phần ghi đĩa và chờ băng thông), thời gian ghi đĩa và số byte vào trace"""
+        trace.add_time('transfer', elapsed - disk_time - throttle_wait)
+        trace.add_time('disk_write', disk_time)
+        if throttle_wait:
+            trace.add_time('bandwidth_wait', throttle_wait)
+        trace.add_count('bytes', received)
+    
+    def _download_to_part(self, urls: List[str], part_path: str, meta_path: str,
+                          transfer: TransferProgress, throttle: Optional[TransferThrottle] = None,
+                          hasher: Optional[BlockHasher] = None) -> bool:
+        """
+        Tải (hoặc tải tiếp) dữ liệu vào file .part
+        
+        Args:
+            urls: Các URL mirror, URL đầu tiên được dùng trước
+            part_path: Đường dẫn file .part
+            meta_path: Đường dẫn file phụ chứa kích thước, validator và hash các khối đã tải
+            transfer: Tiến độ của lượt tải
+            throttle: Phần băng thông của lượt tải (tùy chọn)
+            hasher: Hash nội dung của file, dùng chung cho các lần thử (tùy chọn)
+        
+        Returns:
+            True nếu file .part đã đủ số byte, False nếu cần thử lại
+        
+        Raises:
+            IntegrityError: Content-Type / Content-Length không đúng, hoặc stream kết thúc khi chưa đủ byte
+        """
+        video_url = urls[0]
+        hasher = hasher or BlockHasher()
+        meta = self._load_part_meta(meta_path)
+        if meta:
+            hasher.load(meta.get('blocks'), meta.get('length'))
+        if meta and meta.get('segments'):
+            return self._download_segments(urls, part_path, meta_path, meta, transfer, throttle, hasher)
+        
+        offset = os.path.getsize(part_path) if meta and os.path.exists(part_path) else 0
+        # File .part đã cấp phát trước: vị trí tải tiếp nằm trong file phụ chứ không phải kích thước file
+        if offset and meta.get('written') is not None:
+            offset = min(offset, meta['written'])
+        expected = meta.get('length') if meta else None
+        if expected is not None and offset > expected:
+            offset = 0
+        
+        headers = {}
+        if offset > 0:
+            headers['Range'] = f"bytes={offset}-"
+            validator = self._part_validator(meta, video_url)
+            if validator:
+                headers['If-Range'] = validator
+        
+        with self._open_stream(video_url, headers) as response:
+            # File .part đã đủ từ lần trước, chỉ còn thiếu bước đổi tên
+            if response.status_code == 416 and offset > 0 and offset == expected:
+                return True
+            response.raise_for_status()
+            self._check_response(video_url, response)
+            content_length = response.headers.get('Content-Length')
+            
+            if response.status_code == 206:
+                total = self._parse_content_range_total(response.headers.get('Content-Range'))
+                if total is not None and expected is not None and total != expected:
+                    # File trên server đã khác, bỏ phần cũ và tải lại từ đầu
+                    self._remove_file(part_path)
+                    self._remove_file(meta_path)
+                    hasher.reset()
+                    return False
+                if total is not None and content_length and content_length.isdigit() \
+                        and int(content_length) != total - offset:
+                    raise IntegrityError(
+                        f"Content-Length {content_length} không khớp đoạn còn thiếu {total - offset} byte"
+                    )
+                mode = 'r+b'
+                transfer.reset(offset, total)
+            else:
+                # Server trả toàn bộ file (không hỗ trợ Range hoặc validator đã đổi)
+                total = int(content_length) if content_length and content_length.isdigit() else None
+                if total == 0:
+                    raise IntegrityError("Server trả về file rỗng (Content-Length: 0)")
+                hasher.reset(total)
+                meta = {
+                    'length': total,
+                    'host': self.mirrors.host_of(video_url),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+                if self._should_segment(response, total):
+                    # Đóng kết nối này, tải lại bằng nhiều kết nối Range song song
+                    meta['segments'] = self._split_segments(total)
+                    self._save_part_meta(meta_path, meta)
+                    mode = None
+                else:
+                    if total:
+                        meta['written'] = 0
+                    self._save_part_meta(meta_path, meta)
+                    mode = 'wb'
+                    offset = 0
+                    transfer.reset(0, total)
+            
+            if mode is not None:
+                with open(part_path, mode) as f:
+                    if mode == 'wb' and total:
+                        self._preallocate(f, total)
+                    f.seek(offset)
+                    self._write_part(video_url, response, f, meta, meta_path, offset, transfer, throttle,
+                                     hasher.writer(part_path, 0, offset))
+        
+        if mode is None:
+            self._remove_file(part_path)
+            return self._download_segments(urls, part_path, meta_path, meta, transfer, throttle, hasher)
+        
+        if total is None:
+            # Server không báo kích thước: coi như đủ khi stream kết thúc bình thường
+            return True
+        size = meta['written'] if meta.get('written') is not None else os.path.getsize(part_path)
+        if size > total:
+            self._remove_file(part_path)
+            self._remove_file(meta_path)
+            hasher.reset()
+        if size != total:
+            # Stream kết thúc "bình thường" nhưng số byte khác Content-Length
+            raise IntegrityError(f"Nhận {size}/{total} byte theo Content-Length")
+        return True
+    
+    def _write_part(self, video_url: str, response: requests.Response, f, meta: Dict, meta_path: str,
+                    offset: int, transfer: TransferProgress, throttle: Optional[TransferThrottle],
+                    writer: BlockWriter):
+        """
+        Ghi body vào file .part từ vị trí offset, cập nhật hash nội dung qua writer
+        
+        Nếu file đã cấp phát trước (meta có 'written'), vị trí đã ghi và hash các khối đã xong
+        được lưu vào file phụ sau mỗi PART_CHECKPOINT byte / PART_CHECKPOINT_INTERVAL giây và
+        khi kết thúc (kể cả khi lỗi) để lần sau (kể cả sau khi tiến trình bị tắt ngang) tải tiếp đúng chỗ.
+        """
+        if meta.get('written') is None:
+            self._write_stream(video_url, response, f, on_bytes=transfer.add, throttle=throttle, hasher=writer)
+            writer.finish()
+            return
+        
+        position = [offset, offset]
+        last_saved = [time.monotonic()]
+        
+        def on_bytes(num_bytes: int):
+            position[0] += num_bytes
+            transfer.add(num_bytes)
+            now = time.monotonic()
+            if position[0] - position[1] >= self.PART_CHECKPOINT \
+                    or now - last_saved[0] >= self.PART_CHECKPOINT_INTERVAL:
+                f.flush()
+                position[1] = meta['written'] = position[0]
+                meta['blocks'] = writer.hasher.snapshot()
+                self._save_part_meta(meta_path, meta)
+                last_saved[0] = now
+        
+        try:
+            self._write_stream(video_url, response, f, on_bytes=on_bytes, throttle=throttle, hasher=writer)
+            writer.finish()
+        finally:
+            f.flush()
+            meta['written'] = position[0]
+            meta['blocks'] = writer.hasher.snapshot()
+            self._save_part_meta(meta_path, meta)
+    
+    def _should_segment(self, response: requests.Response, total: Optional[int]) -> bool:
+        """Kiểm tra có nên tải file này bằng nhiều kết nối song song không"""
+        if self.segment_count <= 1 or total is None or total < self.segment_min_size:
             return False
-        except Exception as e:
-            print(f"Lỗi không xác định khi tải: {e}")
+        return response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    
+    def _split_segments(self, total: int) -> List[List[int]]:
+        """Chia file thành các đoạn [start, end, số byte đã nhận], bắt đầu ở ranh giới khối hash"""
+        size = -(-total // self.segment_count)
+        size = -(-size // BlockHasher.BLOCK_SIZE) * BlockHasher.BLOCK_SIZE
+        starts = list(range(0, total, size))
+        # Phần lẻ cuối file nhỏ hơn một khối thì gộp vào đoạn trước
+        if len(starts) > 1 and total - starts[-1] < BlockHasher.BLOCK_SIZE:
+            starts.pop()
+        ends = starts[1:] + [total]
+        return [[start, end - 1, 0] for start, end in zip(starts, ends)]
+    
+    def _download_segments(self, urls: List[str], part_path: str, meta_path: str, meta: Dict,
+                           transfer: TransferProgress, throttle: Optional[TransferThrottle] = None,
+                           hasher: Optional[BlockHasher] = None) -> bool:
+        """
+        Tải các đoạn còn thiếu song song, ghi đúng vị trí vào file .part đã cấp phát trước
+        
+        Tiến độ từng đoạn được lưu vào file phụ nên có thể tải tiếp ở lần sau.
+        Đoạn bị lỗi được thử lại qua mirror kế tiếp.
+        
+        Args:
+            urls: Các URL mirror, URL đầu tiên được dùng trước
+            part_path: Đường dẫn file .part
+            meta_path: Đường dẫn file phụ
+            meta: Nội dung file phụ (có key 'segments')
+            transfer: Tiến độ của lượt tải (cộng dồn byte của mọi đoạn)
+            throttle: Phần băng thông của lượt tải, dùng chung cho mọi đoạn (tùy chọn)
+            hasher: Hash nội dung của file, mỗi đoạn cập nhật các khối của mình (tùy chọn)
+        
+        Returns:
+            True nếu đã đủ tất cả các đoạn
+        """
+        total = meta['length']
+        segments = meta['segments']
+        hasher = hasher or BlockHasher()
+        
+        # Cấp phát trước file với đúng kích thước
+        if not os.path.exists(part_path) or os.path.getsize(part_path) != total:
+            for segment in segments:
+                segment[2] = 0
+            hasher.reset(total)
+            with open(part_path, 'wb') as f:
+                self._preallocate(f, total)
+        transfer.reset(sum(segment[2] for segment in segments), total)
+        
+        meta_lock = threading.Lock()
+        last_saved = [time.monotonic()]
+        changed = threading.Event()
+        
+        def fetch_segment(segment: List[int]) -> bool:
+            start, end = segment[0], segment[1]
+            length = end - start + 1
+            
+            def advance(num_bytes: int):
+                segment[2] += num_bytes
+                transfer.add(num_bytes)
+                # Lưu tiến độ các đoạn định kỳ để tải tiếp được cả khi tiến trình bị tắt ngang
+                now = time.monotonic()
+                if now - last_saved[0] >= self.PART_CHECKPOINT_INTERVAL:
+                    with meta_lock:
+                        if now - last_saved[0] >= self.PART_CHECKPOINT_INTERVAL:
+                            last_saved[0] = now
+                            meta['blocks'] = hasher.snapshot()
+                            self._save_part_meta(meta_path, meta)
+            
+            for attempt in range(self.SEGMENT_RETRIES):
+                if segment[2] >= length:
+                    return True
+                if changed.is_set():
+                    return False
+                video_url = urls[attempt % len(urls)]
+                headers = {'Range': f"bytes={start + segment[2]}-{end}"}
+                validator = self._part_validator(meta, video_url)
+                if validator:
+                    headers['If-Range'] = validator
+                try:
+                    with self._open_stream(video_url, headers) as response:
+                        response.raise_for_status()
+                        self._check_response(video_url, response)
+                        content_total = self._parse_content_range_total(response.headers.get('Content-Range'))
+                        if response.status_code != 206 or content_total not in (None, total):
+                            # File đã thay đổi hoặc server không còn hỗ trợ Range
+                            changed.set()
+                            return False
+                        writer = hasher.writer(part_path, start, start + segment[2])
+                        # Không đệm: tiến độ các đoạn được lưu từ luồng khác nên byte đã đếm phải nằm trong file
+                        with open(part_path, 'r+b', buffering=0) as f:
+                            f.seek(start + segment[2])
+                            self._write_stream(
+                                video_url, response, f, limit=length - segment[2],
+                                on_bytes=advance, throttle=throttle, hasher=writer
+                            )
+                        writer.finish()
+                except requests.exceptions.RequestException as e:
+                    print(f"Lỗi khi tải đoạn {start}-{end} (lần {attempt + 1}/{self.SEGMENT_RETRIES}): {e}")
+                finally:
+                    with meta_lock:
+                        meta['blocks'] = hasher.snapshot()
+                        self._save_part_meta(meta_path, meta)
+            return segment[2] >= length
+        
+        pending = [segment for segment in segments if segment[2] < segment[1] - segment[0] + 1]
+        results = [False] * len(pending)
+        trace = self.tracer.current()
+        
+        def run(i: int, segment: List[int]):
+            self.tracer.attach(trace)
+            results[i] = fetch_segment(segment)
+        
+        threads = [
+            threading.Thread(target=run, args=(i, segment), daemon=True)
+            for i, segment in enumerate(pending)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if changed.is_set():
+            self._remove_file(part_path)
+            self._remove_file(meta_path)
+            hasher.reset()
             return False
+        return all(results)
+    
+    def _check_response(self, url: str, response: requests.Response):
+        """Báo IntegrityError (và ghi lỗi cho host) nếu Content-Type không phải video, ví dụ trang lỗi HTML"""
+        try:
+            check_content_type(response)
+        except IntegrityError:
+            self.mirrors.record_failure(url, "IntegrityError")
+            raise
+    
+    def _verify_part(self, part_path: str, meta_path: str, hasher: BlockHasher) -> Dict:
+        """
+        Kiểm tra file .part đã đủ byte trước khi đổi tên: không rỗng, bắt đầu bằng box ftyp của MP4
+        
+        File sai bị xóa (cùng file phụ) để lần thử sau tải lại từ đầu.
+        
+        Returns:
+            Dict gồm size và content_hash (hash tính dần trong lúc ghi, chỉ đọc lại các khối còn thiếu)
+        
+        Raises:
+            IntegrityError: File rỗng hoặc không phải MP4
+        """
+        size = os.path.getsize(part_path)
+        try:
+            if size == 0:
+                raise IntegrityError("File tải về rỗng")
+            with open(part_path, 'rb') as f:
+                check_mp4_header(f.read(8))
+        except IntegrityError:
+            self._remove_file(part_path)
+            self._remove_file(meta_path)
+            hasher.reset()
+            raise
+        content_hash = hasher.hexdigest(part_path, size)
+        if hasher.read_back:
+            self.tracer.add_count('hash_read_back', hasher.read_back)
+        return {'size': size, 'content_hash': content_hash}
+    
+    def _part_validator(self, meta: Dict, video_url: str) -> Optional[str]:
+        """
+        Lấy validator cho If-Range
+        
+        ETag/Last-Modified chỉ có ý nghĩa với đúng host đã trả về chúng; khi tải tiếp
+        qua mirror khác thì bỏ If-Range và dựa vào tổng kích thước trong Content-Range.
+        """
+        if meta.get('host') and meta.get('host') != self.mirrors.host_of(video_url):
+            return None
+        return meta.get('etag') or meta.get('last_modified')
+    
+    def open_stores(self, download_folder: str):
+        """
+        Mở cache thông tin video, ledger và cache link rút gọn nằm trong thư mục tải về theo settings
+        
+        Args:
+            download_folder: Thư mục lưu file
+        """
+        if self.settings.get("metadata_cache", True) and self.metadata_cache is None:
+            self.metadata_cache = MetadataCache.for_folder(
+                download_folder,
+                max_entries=self.settings.get("metadata_cache_max_entries", 50000)
+            )
+        if self.settings.get("skip_downloaded", True) and self.ledger is None:
+            self.ledger = DownloadLedger.for_folder(download_folder)
+        if self.settings.get("short_link_cache", True) and self.short_links.cache is None:
+            self.short_links.cache = RedirectCache.for_folder(download_folder)
+    
+    def close_stores(self):
+        """
+        Đóng cache thông tin video, ledger và cache link rút gọn đã mở bằng open_stores
+        
+        Đồng thời đóng file trace (nếu bật) và lưu bản tổng hợp <trace_file>.summary.json.
+        """
+        if self.metadata_cache:
+            self.metadata_cache.close()
+            self.metadata_cache = None
+        if self.ledger:
+            self.ledger.close()
+            self.ledger = None
+        if self.short_links.cache:
+            self.short_links.cache.close()
+            self.short_links.cache = None
+        self.tracer.close()
+    
+    def get_host_stats(self) -> Dict[str, Dict]:
+        """Thống kê tình trạng từng host CDN (xem MirrorSelector.get_stats)"""
+        return self.mirrors.get_stats()
+    
+    @staticmethod
+    def _parse_content_range_total(content_range: Optional[str]) -> Optional[int]:
+        """Lấy tổng kích thước từ header Content-Range ("bytes 100-199/1000")"""
+        if not content_range or '/' not in content_range:
+            return None
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    
+    @staticmethod
+    def _load_part_meta(meta_path: str) -> Optional[Dict]:
+        """Đọc file phụ của file .part, None nếu không có hoặc hỏng"""
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return meta if isinstance(meta, dict) else None
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _save_part_meta(meta_path: str, meta: Dict):
+        """Ghi file phụ của file .part (ghi ra file tạm rồi đổi tên, không bị hỏng nếu tiến trình bị tắt giữa chừng)"""
+        temp_path = meta_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, meta_path)
+    
+    @staticmethod
+    def _remove_file(path: str):
+        """Xóa file nếu tồn tại"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
     
     def process_video(self, url: str, download_folder: str, naming_mode: str = "video_id") -> Dict:
         """
@@ -203,58 +1195,650 @@ class VideoDownloader:
                 'success': bool,
                 'video_id': str,
                 'file_path': str,
-                'error': str
+                'error': str,
+                'skipped': str hoặc None ("downloaded" nếu đã tải ở lần trước,
+                           "duplicate" nếu trùng video_id trong cùng batch,
+                           "stopped" nếu batch bị dừng trước khi kịp tải)
             }
         """
+        result, video_info = self.resolve_video(url)
+        if video_info is None:
+            return result
+        return self.fetch_video(result, video_info, download_folder, naming_mode)
+    
+    def resolve_video(self, url: str) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Giai đoạn 1 của process_video: chuẩn hóa URL và lấy thông tin video
+        
+        Args:
+            url: URL video gốc
+            
+        Returns:
+            (result, video_info). video_info là None nếu lỗi, khi đó
+            result['error'] chứa lý do. result có thêm 'retries', 'throttled'
+            và 'rate_limit_wait' (giây chờ rate limiter)
+        """
+        self._job_stats.values = {}
+        self.tracer.begin(url)
+        result, video_info = self._resolve_video(url)
+        self._merge_job_stats(result)
+        if video_info is None:
+            self.tracer.finish(url, result)
+        return result, video_info
+    
+    def _resolve_video(self, url: str) -> Tuple[Dict, Optional[Dict]]:
+        """Phần chính của resolve_video"""
         result = {
             'success': False,
             'video_id': None,
             'file_path': None,
             'error': None,
+            'skipped': None,
             'url': url
         }
         
         try:
             # Bước 1: Chuẩn hóa URL
-            normalized_url = self.normalize_url(url)
+            with self.tracer.span('normalize'):
+                normalized_url = self.normalize_url(url)
             if not normalized_url:
                 result['error'] = "URL không hợp lệ"
-                return result
+                return result, None
+            
+            # Link rút gọn: theo redirect lấy video ID (có cache, không tải trang đích)
+            with self.tracer.span('short_link'):
+                normalized_url = self.resolve_short_url(normalized_url)
+            if not normalized_url:
+                result['error'] = "Không thể phân giải link rút gọn"
+                return result, None
+            
+            # Bỏ qua video đã tải ở lần chạy trước, không cần gọi mạng
+            if self.ledger:
+                video_id = self.extract_video_id(normalized_url)
+                with self.tracer.span('ledger'):
+                    entry = self.ledger.lookup(video_id) if video_id else None
+                if entry:
+                    self.take_prefetched(video_id)
+                    result.update({
+                        'success': True,
+                        'video_id': video_id,
+                        'file_path': entry['file_path'],
+                        'content_hash': entry['content_hash'],
+                        'skipped': "downloaded"
+                    })
+                    return result, None
             
             # Bước 2: Lấy thông tin video
-            video_info = self.get_video_info(normalized_url)
+            with self.tracer.span('video_info'):
+                video_info = self.get_video_info(normalized_url)
             if not video_info:
                 result['error'] = "Không thể lấy thông tin video"
-                return result
+                return result, None
             
-            video_id = video_info.get('video_id')
-            video_url = video_info.get('video_url')
+            result['video_id'] = video_info.get('video_id')
             
-            if not video_url:
+            if not video_info.get('video_url') and not video_info.get('images'):
                 result['error'] = "Không tìm thấy link video"
-                return result
+                return result, None
             
-            result['video_id'] = video_id
+            return result, video_info
             
-            # Bước 3: Tạo tên file
-            if naming_mode == "video_id":
-                filename = f"{video_id}.mp4"
-            else:
-                timestamp = int(time.time())
-                filename = f"video_{timestamp}.mp4"
+        except Exception as e:
+            result['error'] = f"Lỗi: {str(e)}"
+            return result, None
+    
+    def fetch_video(self, result: Dict, video_info: Dict, download_folder: str,
+                    naming_mode: str = "video_id") -> Dict:
+        """
+        Giai đoạn 2 của process_video: tải file từ thông tin đã lấy
+        
+        Args:
+            result: Dict kết quả trả về từ resolve_video
+            video_info: Thông tin video trả về từ resolve_video
+            download_folder: Thư mục lưu file
+            naming_mode: Chế độ đặt tên ("video_id" hoặc "timestamp")
+            
+        Returns:
+            Dict kết quả (chính là result đã được cập nhật)
+        """
+        self._job_stats.values = {}
+        self.tracer.begin(result.get('url'))
+        if video_info.get('images'):
+            return self._fetch_gallery(result, video_info, download_folder, naming_mode)
+        try:
+            video_id = video_info.get('video_id')
+            video_url = video_info.get('video_url')
             
-            file_path = os.path.join(download_folder, filename)
+            # Bước 3: Tạo tên file
+            with self.tracer.span('reserve_path'):
+                file_path = self._reserve_file_path(download_folder, video_id, naming_mode)
             
             # Bước 4: Tải video
-            if self.download_video(video_url, file_path):
-                result['success'] = True
-                result['file_path'] = file_path
-            else:
-                result['error'] = "Lỗi khi tải file"
+            try:
+                integrity = {}
+                with self.tracer.span('download'):
+                    downloaded = self.download_video(video_url, file_path, video_info.get('video_urls'),
+                                                     job=result.get('url'), video_id=video_id,
+                                                     integrity=integrity)
+                # Link phát lấy từ cache / danh sách profile đã hỏng: lấy link mới từ API và thử lại một lần
+                if not downloaded and integrity.get('dead_link') and video_info.get('source'):
+                    fresh = self._refresh_video_info(video_id)
+                    if fresh:
+                        integrity = {}
+                        with self.tracer.span('download'):
+                            downloaded = self.download_video(fresh['video_url'], file_path, fresh.get('video_urls'),
+                                                             job=result.get('url'), video_id=video_id,
+                                                             integrity=integrity)
+                if downloaded:
+                    result['success'] = True
+                    result['file_path'] = file_path
+                    result['content_hash'] = integrity.get('content_hash')
+                    if self.ledger:
+                        with self.tracer.span('ledger'):
+                            self.ledger.record(video_id, file_path, size=integrity.get('size'),
+                                               content_hash=result['content_hash'])
+                else:
+                    result['error'] = "Lỗi khi tải file"
+            finally:
+                self._release_file_path(file_path)
             
         except Exception as e:
             result['error'] = f"Lỗi: {str(e)}"
         
+        self._merge_job_stats(result)
+        self.tracer.finish(result.get('url'), result)
         return result
+    
+    def _refresh_video_info(self, video_id: str) -> Optional[Dict]:
+        """
+        Bỏ thông tin video trong cache (link phát không còn dùng được) và gọi lại API
+        
+        Returns:
+            Thông tin video mới có link phát, None nếu không lấy được
+        """
+        print(f"Link phát của video {video_id} không còn dùng được, lấy link mới")
+        if self.metadata_cache:
+            self.metadata_cache.delete(video_id)
+        self.tracer.add_count('url_refresh')
+        with self.tracer.span('video_info'):
+            fresh = self.get_video_info(self.canonical_url(video_id), use_cache=False)
+        return fresh if fresh and fresh.get('video_url') else None
+    
+    def _fetch_gallery(self, result: Dict, video_info: Dict, download_folder: str,
+                       naming_mode: str) -> Dict:
+        """
+        Phần của fetch_video cho bài ảnh: tải mọi ảnh vào thư mục riêng của bài
+        
+        result có thêm media_type "gallery", images (số ảnh), failed_images và
+        files (các ảnh đã lưu); file_path là thư mục của bài.
+        """
+        try:
+            video_id = video_info.get('video_id')
+            result['media_type'] = "gallery"
+            with self.tracer.span('reserve_path'):
+                folder = self._reserve_file_path(download_folder, video_id, naming_mode, ext="")
+            try:
+                with self.tracer.span('download'):
+                    gallery = self.gallery.download(video_info, folder, job=result.get('url'))
+                result['images'] = gallery['images']
+                result['failed_images'] = gallery['failed_images']
+                if gallery['success']:
+                    result['success'] = True
+                    result['file_path'] = folder
+                    result['files'] = gallery['files']
+                    if self.ledger:
+                        with self.tracer.span('ledger'):
+                            self.ledger.record(video_id, folder, size=gallery['bytes'],
+                                               files=len(gallery['files']))
+                else:
+                    result['error'] = gallery['error']
+            finally:
+                self._release_file_path(folder)
+        except Exception as e:
+            result['error'] = f"Lỗi: {str(e)}"
+        
+        self._merge_job_stats(result)
+        self.tracer.finish(result.get('url'), result)
+        return result
+    
+    def _reserve_file_path(self, download_folder: str, video_id: str, naming_mode: str,
+                           ext: str = ".mp4") -> str:
+        """
+        Chọn và giữ chỗ đường dẫn file cho một job
+        
+        Với chế độ timestamp, nhiều job song song có thể rơi vào cùng một giây,
+        nên thêm hậu tố _1, _2... để không ghi đè lên nhau.
+        
+        Args:
+            download_folder: Thư mục lưu file
+            video_id: ID video
+            naming_mode: Chế độ đặt tên ("video_id" hoặc "timestamp")
+            ext: Đuôi file ("" cho thư mục của bài ảnh)
+            
+        Returns:
+            Đường dẫn file đã được giữ chỗ
+        """
+        if naming_mode == "video_id":
+            base = f"{video_id}"
+        else:
+            base = f"video_{int(time.time())}"
+        
+        with self._path_lock:
+            file_path = os.path.join(download_folder, f"{base}{ext}")
+            if naming_mode != "video_id":
+                suffix = 1
+                while file_path in self._reserved_paths or os.path.exists(file_path):
+                    file_path = os.path.join(download_folder, f"{base}_{suffix}{ext}")
+                    suffix += 1
+            self._reserved_paths.add(file_path)
+        return file_path
+    
+    def _release_file_path(self, file_path: str):
+        """Bỏ giữ chỗ đường dẫn file sau khi job kết thúc"""
+        with self._path_lock:
+            self._reserved_paths.discard(file_path)
 
 
+class BatchDownloader:
+    """Tải nhiều video song song, tối đa max_concurrent job cùng lúc"""
+    
+    def __init__(self, downloader: VideoDownloader, download_folder: str,
+                 naming_mode: str = "video_id", max_concurrent: int = 3):
+        """
+        Khởi tạo BatchDownloader
+        
+        Args:
+            downloader: VideoDownloader dùng chung cho mọi job
+            download_folder: Thư mục lưu file
+            naming_mode: Chế độ đặt tên ("video_id" hoặc "timestamp")
+            max_concurrent: Số job tối đa chạy cùng lúc
+        """
+        self.downloader = downloader
+        self.download_folder = download_folder
+        self.naming_mode = naming_mode
+        self.max_concurrent = max(1, int(max_concurrent or 1))
+        self._stop_event = threading.Event()
+        # Hàng đợi lưu trạng thái job khi chạy bằng run_queue
+        self._queue: Optional[JobQueue] = None
+    
+    def stop(self):
+        """Yêu cầu dừng: các job đang chạy sẽ chạy nốt, job chưa bắt đầu bị bỏ qua"""
+        self._stop_event.set()
+    
+    @property
+    def is_stopped(self) -> bool:
+        """True nếu đã có yêu cầu dừng"""
+        return self._stop_event.is_set()
+    
+    def process_job(self, index: int, link: str) -> Dict:
+        """
+        Xử lý một job trong batch
+        
+        Args:
+            index: Vị trí của link trong danh sách đầu vào
+            link: URL video gốc
+            
+        Returns:
+            Dict kết quả giống process_video, thêm key 'index'
+        """
+        # Giống process_video, tách hai giai đoạn để ghi trạng thái downloading vào hàng đợi
+        result, video_info = self.downloader.resolve_video(link)
+        if video_info is not None:
+            self._mark_downloading(index)
+            result = self.downloader.fetch_video(result, video_info, self.download_folder, self.naming_mode)
+        result['index'] = index
+        return result
+    
+    def _mark_downloading(self, index: int):
+        """Ghi trạng thái downloading của job vào hàng đợi (nếu đang chạy bằng run_queue)"""
+        if self._queue is not None:
+            self._queue.mark_downloading(index)
+    
+    def run(self, links: Iterable[str],
+            on_start: Optional[Callable[[int, str], None]] = None,
+            on_result: Optional[Callable[[int, Dict], None]] = None,
+            collect_results: bool = True) -> List[Dict]:
+        """
+        Chạy batch và chờ đến khi xong hoặc bị dừng
+        
+        Link được lấy dần từ iterable nên có thể truyền generator cho danh sách lớn.
+        Callback được gọi từ worker thread, theo thứ tự job kết thúc.
+        
+        Args:
+            links: Danh sách (hoặc iterable) URL video
+            on_start: Callback(index, link) khi một job bắt đầu
+            on_result: Callback(index, result) khi một job kết thúc
+            collect_results: False để không giữ kết quả trong bộ nhớ
+            
+        Returns:
+            Danh sách kết quả theo đúng thứ tự đầu vào (chỉ gồm job đã chạy)
+        """
+        return self._run(enumerate(links), on_start, on_result, collect_results)
+    
+    def run_queue(self, job_queue: JobQueue,
+                  on_start: Optional[Callable[[int, str], None]] = None,
+                  on_result: Optional[Callable[[int, Dict], None]] = None,
+                  collect_results: bool = False,
+                  feeding: Optional[threading.Event] = None) -> List[Dict]:
+        """
+        Chạy các job pending trong hàng đợi cho đến khi hết hoặc bị dừng
+        
+        Trạng thái từng job được ghi vào hàng đợi nên nếu ứng dụng bị tắt ngang,
+        lần chạy sau tiếp tục từ các job chưa xong. index trong callback là ID job.
+        Hàng đợi đang pause thì worker chờ đến khi resume (hoặc stop).
+        Có feeding thì chạy song song với luồng đang thêm link: hết job thì chờ link
+        mới cho đến khi feeding được clear.
+        
+        Args:
+            job_queue: Hàng đợi job
+            on_start: Callback(job id, link) khi một job bắt đầu
+            on_result: Callback(job id, result) khi một job kết thúc
+            collect_results: True để giữ và trả về kết quả
+            feeding: Event được set trong khi luồng khác còn thêm link vào hàng đợi (tùy chọn)
+            
+        Returns:
+            Danh sách kết quả theo ID job (rỗng nếu collect_results=False)
+        """
+        self._queue = job_queue
+        try:
+            return self._run(job_queue.iter_claims(self._stop_event, feeding), on_start, on_result, collect_results)
+        finally:
+            self._queue = None
+            # Job bị bỏ dở vì dừng được đưa lại về pending
+            job_queue.recover()
+    
+    def _run(self, jobs: Iterator[Tuple[int, str]],
+             on_start: Optional[Callable[[int, str], None]],
+             on_result: Optional[Callable[[int, Dict], None]],
+             collect_results: bool) -> List[Dict]:
+        """Chạy các job (index, link) lấy từ iterator, trả về kết quả theo index"""
+        self._stop_event.clear()
+        self._jobs = jobs
+        self._jobs_lock = threading.Lock()
+        self._results = {}
+        self._results_lock = threading.Lock()
+        self._on_start = on_start
+        self._on_result = on_result
+        self._collect_results = collect_results
+        self._seen_ids = set()
+        
+        self._run_workers()
+        
+        results = [self._results[i] for i in sorted(self._results)]
+        self._results = {}
+        return results
+    
+    def _run_workers(self):
+        """Chạy pool worker, mỗi worker xử lý trọn một job từ đầu đến cuối"""
+        def worker():
+            while True:
+                job = self._next_job()
+                if job is None:
+                    return
+                index, link = job
+                try:
+                    result = self.process_job(index, link)
+                except Exception as e:
+                    result = self._error_result(index, link, e)
+                self._finish_job(index, result)
+        
+        self._join_all(self._start_threads(worker, self.max_concurrent, "download-worker"))
+    
+    def _next_job(self, notify_start: bool = True) -> Optional[Tuple[int, str]]:
+        """
+        Lấy job tiếp theo (thread-safe), None nếu hết job hoặc đã dừng
+        
+        Link trùng video_id với một link trước đó trong cùng batch được
+        trả kết quả bỏ qua (skipped "duplicate", không phải lỗi) ngay mà không chạy.
+        
+        Args:
+            notify_start: Gọi on_start ngay khi lấy job (False nếu người gọi tự báo lúc bắt đầu tải)
+        """
+        while True:
+            with self._jobs_lock:
+                if self._stop_event.is_set():
+                    return None
+                job = next(self._jobs, None)
+                if job is None:
+                    return None
+                index, link = job
+                normalized_url = self.downloader.normalize_url(link)
+                video_id = self.downloader.known_video_id(normalized_url) if normalized_url else None
+                duplicate = video_id is not None and video_id in self._seen_ids
+                if video_id is not None:
+                    self._seen_ids.add(video_id)
+            
+            if not duplicate:
+                if notify_start and self._on_start:
+                    self._on_start(index, link)
+                return job
+            
+            self._finish_job(index, {
+                'success': False,
+                'video_id': video_id,
+                'file_path': None,
+                'error': None,
+                'skipped': "duplicate",
+                'url': link,
+                'index': index
+            })
+    
+    def _finish_job(self, index: int, result: Dict):
+        """Ghi nhận kết quả của một job và gọi callback"""
+        # Job bị bỏ vì dừng giữ nguyên trạng thái trong hàng đợi, recover() đưa lại về pending
+        if self._queue is not None and result.get('skipped') != "stopped":
+            self._queue.finish(index, result)
+        if self._collect_results:
+            with self._results_lock:
+                self._results[index] = result
+        if self._on_result:
+            self._on_result(index, result)
+    
+    def _finish_stopped(self, index: int, result: Dict):
+        """Báo job đã lấy thông tin nhưng không được tải vì có yêu cầu dừng"""
+        result.update({'success': False, 'error': None, 'skipped': "stopped", 'index': index})
+        self._finish_job(index, result)
+    
+    @staticmethod
+    def _error_result(index: int, link: str, error: Exception) -> Dict:
+        """Tạo dict kết quả cho job bị lỗi ngoài dự kiến"""
+        return {
+            'success': False,
+            'video_id': None,
+            'file_path': None,
+            'error': f"Lỗi: {str(error)}",
+            'skipped': None,
+            'url': link,
+            'index': index
+        }
+    
+    @staticmethod
+    def _start_threads(target: Callable, count: int, name: str) -> List[threading.Thread]:
+        """Khởi chạy count thread cùng chạy target"""
+        threads = [
+            threading.Thread(target=target, name=f"{name}-{i}", daemon=True)
+            for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+    
+    @staticmethod
+    def _join_all(threads: List[threading.Thread]):
+        """Chờ tất cả thread kết thúc"""
+        for thread in threads:
+            thread.join()
+
+
+class PipelineDownloader(BatchDownloader):
+    """
+    Tải theo 2 giai đoạn chạy song song:
+    pool nhỏ lấy thông tin video trước vào hàng đợi có giới hạn,
+    pool khác lấy từ hàng đợi để tải file
+    
+    on_start được gọi khi job bắt đầu tải file (không phải lúc lấy thông tin).
+    Khi dừng, video đã lấy thông tin nhưng chưa tải được báo kết quả skipped "stopped".
+    """
+    
+    # Chu kỳ kiểm tra yêu cầu dừng khi đang chờ hàng đợi (giây)
+    POLL_INTERVAL = 0.2
+    
+    def __init__(self, downloader: VideoDownloader, download_folder: str,
+                 naming_mode: str = "video_id", resolve_concurrent: int = 2,
+                 download_concurrent: int = 3, queue_size: Optional[int] = None):
+        """
+        Khởi tạo PipelineDownloader
+        
+        Args:
+            downloader: VideoDownloader dùng chung cho mọi job
+            download_folder: Thư mục lưu file
+            naming_mode: Chế độ đặt tên ("video_id" hoặc "timestamp")
+            resolve_concurrent: Số luồng gọi API lấy thông tin video
+            download_concurrent: Số luồng tải file
+            queue_size: Số video đã lấy thông tin được phép chờ tải
+                        (mặc định gấp đôi download_concurrent)
+        """
+        super().__init__(downloader, download_folder, naming_mode, download_concurrent)
+        self.resolve_concurrent = max(1, int(resolve_concurrent or 1))
+        self.queue_size = max(1, int(queue_size or self.max_concurrent * 2))
+        self._ready = None
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+    
+    def _reset_stats(self):
+        """Đặt lại thống kê cho lượt chạy mới"""
+        with self._stats_lock:
+            self._stats = {
+                'resolved': 0,
+                'resolve_failed': 0,
+                'skipped': 0,
+                'downloaded': 0,
+                'download_failed': 0,
+                'dropped': 0,
+                'max_queue_depth': 0,
+                'resolve_blocked_seconds': 0.0,
+                'download_idle_seconds': 0.0
+            }
+    
+    def _add_stat(self, key: str, value=1):
+        with self._stats_lock:
+            self._stats[key] += value
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê của pipeline
+        
+        Returns:
+            Dict gồm số job mỗi giai đoạn, độ sâu hàng đợi hiện tại/lớn nhất,
+            thời gian giai đoạn lấy thông tin bị chặn vì hàng đợi đầy
+            và thời gian giai đoạn tải phải chờ vì hàng đợi rỗng
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._ready.qsize() if self._ready else 0
+        stats['queue_size'] = self.queue_size
+        stats['resolve_concurrent'] = self.resolve_concurrent
+        stats['download_concurrent'] = self.max_concurrent
+        return stats
+    
+    def _run_workers(self):
+        """Chạy pool lấy thông tin và pool tải file nối với nhau bằng hàng đợi"""
+        self._reset_stats()
+        ready = queue.Queue(maxsize=self.queue_size)
+        self._ready = ready
+        done = object()
+        
+        def resolver():
+            while True:
+                job = self._next_job(notify_start=False)
+                if job is None:
+                    return
+                index, link = job
+                try:
+                    result, video_info = self.downloader.resolve_video(link)
+                except Exception as e:
+                    result, video_info = self._error_result(index, link, e), None
+                
+                if video_info is None:
+                    self._add_stat('skipped' if result.get('skipped') else 'resolve_failed')
+                    result['index'] = index
+                    self._finish_job(index, result)
+                    continue
+                
+                self._add_stat('resolved')
+                # Backpressure: chờ khi hàng đợi đầy để link đã ký không bị tồn đọng
+                started = time.monotonic()
+                while not self._stop_event.is_set():
+                    try:
+                        ready.put((index, result, video_info), timeout=self.POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        continue
+                else:
+                    self._add_stat('dropped')
+                    self._finish_stopped(index, result)
+                self._add_stat('resolve_blocked_seconds', time.monotonic() - started)
+                with self._stats_lock:
+                    depth = ready.qsize()
+                    if depth > self._stats['max_queue_depth']:
+                        self._stats['max_queue_depth'] = depth
+        
+        def fetcher():
+            while True:
+                started = time.monotonic()
+                item = ready.get()
+                self._add_stat('download_idle_seconds', time.monotonic() - started)
+                if item is done:
+                    return
+                index, result, video_info = item
+                # Hàng đợi đang pause: video đã lấy thông tin cũng chờ đến khi resume
+                if self._queue is not None:
+                    self._queue.wait_resumed(self._stop_event)
+                if self._stop_event.is_set():
+                    self._add_stat('dropped')
+                    self._finish_stopped(index, result)
+                    continue
+                if self._on_start:
+                    self._on_start(index, result.get('url'))
+                self._mark_downloading(index)
+                try:
+                    result = self.downloader.fetch_video(
+                        result, video_info, self.download_folder, self.naming_mode
+                    )
+                except Exception as e:
+                    result = self._error_result(index, result.get('url'), e)
+                result['index'] = index
+                self._add_stat('downloaded' if result.get('success') else 'download_failed')
+                self._finish_job(index, result)
+        
+        fetchers = self._start_threads(fetcher, self.max_concurrent, "fetch-worker")
+        resolvers = self._start_threads(resolver, self.resolve_concurrent, "resolve-worker")
+        self._join_all(resolvers)
+        for _ in fetchers:
+            ready.put(done)
+        self._join_all(fetchers)
+
+
+def create_batch_downloader(downloader: VideoDownloader, download_folder: str,
+                            settings: Dict) -> BatchDownloader:
+    """
+    Tạo BatchDownloader hoặc PipelineDownloader theo settings
+    
+    Args:
+        downloader: VideoDownloader dùng chung cho mọi job
+        download_folder: Thư mục lưu file
+        settings: Phần "settings" trong config.json
+        
+    Returns:
+        PipelineDownloader nếu settings.pipeline_mode bật, ngược lại BatchDownloader
+    """
+    naming_mode = settings.get("naming_mode", "video_id")
+    max_concurrent = settings.get("max_concurrent", 3)
+    if settings.get("pipeline_mode", False):
+        return PipelineDownloader(
+            downloader, download_folder, naming_mode,
+            resolve_concurrent=settings.get("resolve_concurrent", 2),
+            download_concurrent=max_concurrent,
+            queue_size=settings.get("queue_size")
+        )
+    return BatchDownloader(downloader, download_folder, naming_mode, max_concurrent)
@@ -0,0 +1,253 @@
+"""
+Gallery Module
+Tải bài ảnh (图文): mọi ảnh của bài được tải song song vào thư mục riêng của bài
+"""
+
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from integrity import IMAGE_TYPES, IntegrityError, check_content_type
+from retry_policy import parse_retry_after
+
+
+class GalleryDownloader:
+    """
+    Tải tất cả ảnh của một bài ảnh vào <download_folder>/<video_id>/
+    
+    Ảnh được tải song song (tối đa max_workers ảnh mỗi bài) qua session dùng chung
+    của downloader, ghi vào thư mục tạm <thư mục bài>.part/ rồi đổi tên một lần
+    khi đủ mọi ảnh, nên thư mục của bài hoặc có đủ ảnh hoặc không tồn tại.
+    Khi lỗi, thư mục tạm chỉ được giữ nếu có ảnh đã tải xong: ảnh đó không tải lại
+    ở lần thử sau; thư mục tạm không có ảnh nào bị xóa.
+    """
+    
+    # Thư mục cũ của bài được đổi tên sang đây trong lúc thay bằng bản mới
+    OLD_SUFFIX = ".old"
+    
+    # Định dạng ảnh theo thứ tự ưu tiên (đứng trước = tốt hơn)
+    FORMATS = ('png', 'jpeg', 'jpg', 'webp', 'heic', 'heif', 'avif')
+    CONTENT_TYPES = {
+        'image/png': 'png', 'image/jpeg': 'jpeg', 'image/jpg': 'jpeg', 'image/webp': 'webp',
+        'image/heic': 'heic', 'image/heif': 'heif', 'image/avif': 'avif'
+    }
+    
+    def __init__(self, downloader, max_workers: int = 4):
+        """
+        Khởi tạo GalleryDownloader
+        
+        Args:
+            downloader: VideoDownloader (dùng session, retry, băng thông, tiến độ, thống kê host)
+            max_workers: Số ảnh tải cùng lúc trong một bài
+        """
+        self.downloader = downloader
+        self.max_workers = max(1, int(max_workers))
+    
+    @classmethod
+    def image_format(cls, url: str) -> Optional[str]:
+        """Định dạng ảnh đoán từ đuôi đường dẫn URL (…~tplv-xxx.webp, ….jpeg), None nếu không rõ"""
+        path = urlparse(url).path.lower()
+        ext = path.rsplit('.', 1)[-1] if '.' in path else ''
+        return ext if ext in cls.FORMATS else None
+    
+    @classmethod
+    def parse_images(cls, aweme: Dict) -> List[Dict]:
+        """
+        Đọc danh sách ảnh của bài ảnh
+        
+        Mỗi ảnh lấy bản lớn nhất (theo width x height) trong các phiên bản có trong
+        response; các link của ảnh được xếp theo FORMATS, link có watermark
+        (download_url_list) chỉ dùng khi mọi link khác lỗi.
+        
+        Args:
+            aweme: Dict aweme trong response API
+        
+        Returns:
+            Danh sách {'urls': [...], 'width', 'height'} theo thứ tự trong bài
+        """
+        def rank(url: str) -> int:
+            fmt = cls.image_format(url)
+            return cls.FORMATS.index(fmt) if fmt else len(cls.FORMATS)
+        
+        images = []
+        for image in aweme.get('images') or []:
+            if not isinstance(image, dict):
+                continue
+            # Một số response có thêm các phiên bản khác của cùng ảnh
+            versions = [image] + [v for v in image.get('variants') or [] if isinstance(v, dict)]
+            best = max(versions, key=lambda v: (v.get('width') or 0) * (v.get('height') or 0))
+            urls = sorted(best.get('url_list') or [], key=rank)
+            urls += [url for url in image.get('download_url_list') or [] if url not in urls]
+            if urls:
+                images.append({'urls': urls, 'width': best.get('width'), 'height': best.get('height')})
+        return images
+    
+    def download(self, video_info: Dict, folder: str, job: Optional[str] = None) -> Dict:
+        """
+        Tải mọi ảnh của bài vào folder
+        
+        Args:
+            video_info: Thông tin bài (có 'images' từ parse_images)
+            folder: Thư mục đích của bài
+            job: Khóa job trong cập nhật tiến độ (mặc định folder)
+        
+        Returns:
+            Dict gồm success, files (đường dẫn các ảnh theo thứ tự), images (số ảnh),
+            failed_images, bytes, error
+        """
+        images = video_info.get('images') or []
+        temp_folder = folder + self.downloader.PART_SUFFIX
+        downloader = self.downloader
+        transfer = downloader.progress.start(job or folder, video_info.get('video_id'), os.path.basename(folder))
+        throttle = downloader.bandwidth.open()
+        trace = downloader.tracer.current()
+        files: List[Optional[str]] = [None] * len(images)
+        # Bộ đếm retry/throttle của các luồng tải ảnh, cộng vào job sau khi xong
+        counts = {'retries': 0, 'throttled': 0}
+        counts_lock = threading.Lock()
+        pending = queue.Queue()
+        for index in range(len(images)):
+            pending.put(index)
+        
+        def worker():
+            downloader.tracer.attach(trace)
+            while True:
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+                files[index] = self._fetch_image(images[index], index, temp_folder, transfer, throttle,
+                                                 counts, counts_lock)
+        
+        state = "failed"
+        try:
+            os.makedirs(temp_folder, exist_ok=True)
+            threads = [
+                threading.Thread(target=worker, name=f"image-worker-{i}", daemon=True)
+                for i in range(min(self.max_workers, len(images)))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for key, value in counts.items():
+                if value:
+                    downloader._count_job_stat(key, value)
+            
+            failed = sum(1 for path in files if path is None)
+            result = {
+                'success': False,
+                'files': [],
+                'images': len(images),
+                'failed_images': failed,
+                'bytes': sum(os.path.getsize(path) for path in files if path),
+                'error': None
+            }
+            if not images:
+                result['error'] = "Bài không có ảnh"
+                self._discard_temp(temp_folder, files)
+                return result
+            if failed:
+                result['error'] = f"Lỗi khi tải {failed}/{len(images)} ảnh"
+                self._discard_temp(temp_folder, files)
+                return result
+            
+            # Đủ ảnh: thư mục cũ (tải lại bài) được đổi tên sang bên cạnh trước, rồi thư mục tạm
+            # được đổi tên thành thư mục của bài, nên folder không bao giờ là bản thiếu ảnh
+            with downloader.tracer.span('finalize'):
+                old_folder = folder + self.OLD_SUFFIX
+                if os.path.isdir(folder):
+                    if os.path.isdir(old_folder):
+                        shutil.rmtree(old_folder)
+                    os.replace(folder, old_folder)
+                os.replace(temp_folder, folder)
+                shutil.rmtree(old_folder, ignore_errors=True)
+            result['files'] = [os.path.join(folder, os.path.basename(path)) for path in files]
+            result['success'] = True
+            state = "done"
+            return result
+        finally:
+            throttle.close()
+            transfer.finish(state)
+    
+    def _discard_temp(self, temp_folder: str, files: List[Optional[str]]):
+        """
+        Dọn thư mục tạm sau khi tải lỗi
+        
+        Xóa file .part của ảnh tải dở; nếu không còn ảnh nào tải xong thì xóa cả thư mục.
+        
+        Args:
+            temp_folder: Thư mục tạm của bài
+            files: Đường dẫn các ảnh đã tải (None với ảnh lỗi)
+        """
+        if not any(files):
+            shutil.rmtree(temp_folder, ignore_errors=True)
+            return
+        for name in os.listdir(temp_folder):
+            if name.endswith(self.downloader.PART_SUFFIX):
+                try:
+                    os.remove(os.path.join(temp_folder, name))
+                except OSError:
+                    pass
+    
+    def _fetch_image(self, image: Dict, index: int, temp_folder: str, transfer, throttle,
+                     counts: Dict, counts_lock: threading.Lock) -> Optional[str]:
+        """
+        Tải một ảnh vào thư mục tạm, thử lần lượt các link của ảnh với backoff
+        
+        Returns:
+            Đường dẫn file ảnh, None nếu hết số lần thử
+        """
+        downloader = self.downloader
+        prefix = f"{index + 1:02d}."
+        for name in os.listdir(temp_folder):
+            if name.startswith(prefix) and not name.endswith(downloader.PART_SUFFIX):
+                return os.path.join(temp_folder, name)
+        
+        urls = image['urls']
+        policy = downloader.retry_policy
+        attempts = max(policy.max_attempts, len(urls))
+        for attempt in range(attempts):
+            url = urls[attempt % len(urls)]
+            if attempt > 0:
+                with counts_lock:
+                    counts['retries'] += 1
+            retry_after = None
+            try:
+                with downloader._open_stream(url, {}) as response:
+                    response.raise_for_status()
+                    check_content_type(response, IMAGE_TYPES)
+                    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                    fmt = self.CONTENT_TYPES.get(content_type) or self.image_format(url) or 'jpeg'
+                    path = os.path.join(temp_folder, prefix + fmt)
+                    part_path = path + downloader.PART_SUFFIX
+                    with open(part_path, 'wb') as f:
+                        received = downloader._write_stream(url, response, f, on_bytes=transfer.add,
+                                                            throttle=throttle)
+                    if not received:
+                        raise IntegrityError("Ảnh tải về rỗng")
+                os.replace(part_path, path)
+                return path
+            except requests.exceptions.RequestException as e:
+                print(f"Lỗi khi tải ảnh {index + 1} (lần {attempt + 1}/{attempts}): {e}")
+                response = getattr(e, 'response', None)
+                if response is not None and response.status_code in policy.THROTTLE_STATUS:
+                    with counts_lock:
+                        counts['throttled'] += 1
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                next_attempt = attempt + 1
+                if not policy.is_retryable_error(e) and next_attempt >= len(urls):
+                    return None
+                if next_attempt < attempts and next_attempt >= len(urls):
+                    with downloader.tracer.span('backoff'):
+                        time.sleep(policy.delay(next_attempt - len(urls) + 1, retry_after))
+            except OSError as e:
+                print(f"Lỗi khi ghi ảnh {index + 1}: {e}")
+                return None
+        return None
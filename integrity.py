@@ -0,0 +1,200 @@
+"""
+Integrity Module
+Kiểm tra file tải về ngay trong lúc ghi: Content-Type, kích thước theo Content-Length,
+header MP4 (ftyp) và hash nội dung tính dần theo từng khối
+"""
+
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+
+
+class IntegrityError(requests.exceptions.ConnectionError):
+    """Dữ liệu tải về không đúng (trang lỗi HTML, file rỗng, thiếu byte...), được thử lại như lỗi kết nối"""
+
+
+# Content-Type chấp nhận cho video / ảnh (rỗng = server không gửi, vẫn chấp nhận)
+VIDEO_TYPES = ('video/', 'application/mp4', 'application/octet-stream', 'binary/octet-stream')
+IMAGE_TYPES = ('image/', 'application/octet-stream', 'binary/octet-stream')
+
+
+def check_content_type(response: requests.Response, accepted: Tuple[str, ...] = VIDEO_TYPES):
+    """
+    Báo IntegrityError nếu Content-Type không phải loại file mong đợi (ví dụ text/html)
+    
+    Args:
+        response: Response dạng stream (chưa đọc body)
+        accepted: Các tiền tố Content-Type chấp nhận
+    """
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and not content_type.startswith(accepted):
+        raise IntegrityError(f"Content-Type không đúng: {content_type}", response=response)
+
+
+def check_mp4_header(head: bytes):
+    """
+    Báo IntegrityError nếu file không bắt đầu bằng box ftyp của MP4
+    
+    Args:
+        head: Ít nhất 8 byte đầu của file
+    """
+    if len(head) < 8 or head[4:8] != b'ftyp' or int.from_bytes(head[:4], 'big') < 8:
+        raise IntegrityError(f"Không phải file MP4 (header {bytes(head[:8])!r})")
+
+
+class BlockHasher:
+    """
+    Hash nội dung file tính dần trong lúc ghi, không phải đọc lại file sau khi tải
+    
+    File được chia thành các khối BLOCK_SIZE byte tính từ đầu file; mỗi khối có SHA-256
+    riêng và hash của file là SHA-256 của các hash khối nối lại. Nhờ vậy hash không phụ
+    thuộc file được tải một luồng, nhiều đoạn song song hay tải tiếp sau khi bị ngắt
+    (miễn là các đoạn bắt đầu ở ranh giới khối). Hash các khối đã xong được lưu kèm
+    file .part.json để lần chạy sau tải tiếp không phải tính lại; khối nào còn thiếu
+    (ví dụ file .part cũ) thì được đọc lại từ đĩa khi lấy hexdigest.
+    """
+    
+    BLOCK_SIZE = 1024 * 1024
+    # Tiền tố của hash trả về (phân biệt với SHA-256 của cả file)
+    ALGORITHM = "sha256-1m"
+    
+    def __init__(self):
+        """Khởi tạo BlockHasher rỗng"""
+        self._lock = threading.Lock()
+        self._blocks: Dict[int, str] = {}
+        self.total: Optional[int] = None
+        self.read_back = 0
+    
+    def reset(self, total: Optional[int] = None):
+        """Bỏ mọi hash khối (file được tải lại từ đầu)"""
+        with self._lock:
+            self._blocks = {}
+            self.total = total
+    
+    def load(self, blocks: Optional[Dict], total: Optional[int] = None):
+        """Nạp hash các khối đã lưu trong file phụ (dict {chỉ số khối: hex})"""
+        with self._lock:
+            for index, digest in (blocks or {}).items():
+                if str(index).isdigit() and isinstance(digest, str):
+                    self._blocks.setdefault(int(index), digest)
+            if total is not None:
+                self.total = total
+    
+    def snapshot(self) -> Dict[str, str]:
+        """Hash các khối đã xong, dạng lưu được vào JSON"""
+        with self._lock:
+            return {str(index): digest for index, digest in self._blocks.items()}
+    
+    def writer(self, path: str, range_start: int, offset: int) -> "BlockWriter":
+        """
+        Tạo BlockWriter cho một luồng ghi tuần tự
+        
+        Args:
+            path: File đang ghi (để đọc lại phần đầu khối khi tải tiếp giữa khối)
+            range_start: Vị trí bắt đầu của đoạn mà luồng ghi phụ trách (0 nếu tải một luồng)
+            offset: Vị trí byte đầu tiên luồng sẽ ghi
+        """
+        return BlockWriter(self, path, range_start, offset)
+    
+    def _store(self, index: int, digest: str):
+        """Lưu hash của một khối"""
+        with self._lock:
+            self._blocks[index] = digest
+    
+    def _read_block(self, path: str, index: int, end: int) -> str:
+        """Đọc lại một khối từ đĩa (chỉ dùng khi thiếu hash của khối)"""
+        start = index * self.BLOCK_SIZE
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            digest.update(f.read(min(self.BLOCK_SIZE, end - start)))
+        with self._lock:
+            self.read_back += min(self.BLOCK_SIZE, end - start)
+        return digest.hexdigest()
+    
+    def hexdigest(self, path: str, size: int) -> str:
+        """
+        Hash của file size byte
+        
+        Args:
+            path: File đã ghi xong
+            size: Kích thước file
+        
+        Returns:
+            "<ALGORITHM>:<hex>"
+        """
+        count = -(-size // self.BLOCK_SIZE)
+        digests = []
+        for index in range(count):
+            with self._lock:
+                digest = self._blocks.get(index)
+            if digest is None:
+                digest = self._read_block(path, index, size)
+            digests.append(bytes.fromhex(digest))
+        return f"{self.ALGORITHM}:{hashlib.sha256(b''.join(digests)).hexdigest()}"
+
+
+class BlockWriter:
+    """
+    Cập nhật hash khối cho một luồng ghi tuần tự (một lượt tải hoặc một đoạn)
+    
+    Khối đầu tiên nằm trước range_start (đoạn không bắt đầu ở ranh giới khối) bị bỏ qua
+    để hexdigest đọc lại; khi tải tiếp giữa khối thì phần đầu khối được đọc lại từ đĩa
+    (không quá một khối).
+    """
+    
+    def __init__(self, hasher: BlockHasher, path: str, range_start: int, offset: int):
+        """
+        Khởi tạo BlockWriter (dùng BlockHasher.writer)
+        
+        Args:
+            hasher: BlockHasher chung của file
+            path: File đang ghi
+            range_start: Vị trí bắt đầu đoạn của luồng ghi
+            offset: Vị trí byte đầu tiên luồng sẽ ghi
+        """
+        self.hasher = hasher
+        block_size = hasher.BLOCK_SIZE
+        self._index = offset // block_size
+        self._position = offset
+        self._block_end = (self._index + 1) * block_size
+        self._digest = None
+        block_start = self._index * block_size
+        if block_start >= range_start:
+            self._digest = hashlib.sha256()
+            if offset > block_start:
+                with open(path, 'rb') as f:
+                    f.seek(block_start)
+                    self._digest.update(f.read(offset - block_start))
+                with hasher._lock:
+                    hasher.read_back += offset - block_start
+    
+    def update(self, data):
+        """Cập nhật hash với dữ liệu vừa nhận (bytes hoặc memoryview), ghi nối tiếp vị trí trước"""
+        view = memoryview(data)
+        while len(view):
+            take = min(len(view), self._block_end - self._position)
+            if self._digest is not None:
+                self._digest.update(view[:take])
+            self._position += take
+            view = view[take:]
+            if self._position == self._block_end:
+                self._finish_block()
+    
+    def finish(self):
+        """Luồng ghi kết thúc bình thường: lưu hash khối cuối nếu đó là khối cuối của file"""
+        total = self.hasher.total
+        if self._digest is not None and (total is None or self._position == total):
+            if self._position > self._index * self.hasher.BLOCK_SIZE:
+                self.hasher._store(self._index, self._digest.hexdigest())
+            self._digest = None
+    
+    def _finish_block(self):
+        """Lưu hash khối vừa đủ và chuyển sang khối kế tiếp"""
+        if self._digest is not None:
+            self.hasher._store(self._index, self._digest.hexdigest())
+        self._index += 1
+        self._block_end += self.hasher.BLOCK_SIZE
+        self._digest = hashlib.sha256()
@@ -0,0 +1,390 @@
+"""
+Job Queue Module
+Hàng đợi job lưu trên SQLite (WAL): trạng thái từng link, số lần thử, ưu tiên, tạm dừng và khôi phục sau khi bị tắt ngang
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class JobQueue:
+    """
+    Hàng đợi link cần tải, giữ nguyên qua các lần chạy
+    
+    Mỗi link đi qua các trạng thái pending -> resolving -> downloading -> done/failed.
+    Job đang resolving/downloading khi ứng dụng bị tắt được đưa lại về pending
+    lúc mở hàng đợi (file .part giúp tải tiếp chứ không tải lại từ đầu).
+    Job được lấy theo priority giảm dần rồi theo thứ tự thêm vào.
+    """
+    
+    FILENAME = ".douyin_queue.sqlite3"
+    
+    PENDING = "pending"
+    RESOLVING = "resolving"
+    DOWNLOADING = "downloading"
+    DONE = "done"
+    FAILED = "failed"
+    STATES = (PENDING, RESOLVING, DOWNLOADING, DONE, FAILED)
+    
+    # Chu kỳ kiểm tra yêu cầu dừng khi hàng đợi đang tạm dừng / đang chờ link mới (giây)
+    POLL_INTERVAL = 0.2
+    
+    def __init__(self, db_path: str, recover: bool = True):
+        """
+        Khởi tạo JobQueue và khôi phục các job đang chạy dở từ lần trước
+        
+        Args:
+            db_path: Đường dẫn file SQLite
+            recover: Khôi phục job đang chạy dở; tắt khi chỉ sửa hàng đợi trong lúc
+                tiến trình khác có thể đang tải
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        # Được set mỗi khi add() thêm / đưa lại job về pending
+        self._added = threading.Event()
+        self._stats = {'added': 0, 'claimed': 0, 'recovered': 0}
+        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commit không fsync, chỉ checkpoint mới fsync nên ghi trạng thái rất rẻ
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT NOT NULL UNIQUE,"
+            " state TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " paused INTEGER NOT NULL DEFAULT 0,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " video_id TEXT,"
+            " file_path TEXT,"
+            " error TEXT,"
+            " skipped TEXT,"
+            " added_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_next ON jobs (state, paused, priority DESC, id)"
+        )
+        self._conn.commit()
+        if recover:
+            self._stats['recovered'] = self.recover()
+    
+    @classmethod
+    def for_folder(cls, download_folder: str, recover: bool = True) -> "JobQueue":
+        """Tạo hàng đợi nằm trong thư mục tải về"""
+        return cls(os.path.join(download_folder, cls.FILENAME), recover=recover)
+    
+    def recover(self) -> int:
+        """
+        Đưa các job đang resolving/downloading về pending
+        
+        Gọi khi mở hàng đợi (job của lần chạy bị tắt ngang) và khi một lượt chạy
+        kết thúc (job bị bỏ dở vì dừng).
+        
+        Returns:
+            Số job được đưa lại về pending
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE state IN (?, ?)",
+                (self.PENDING, time.time(), self.RESOLVING, self.DOWNLOADING)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+    
+    def add(self, urls: Iterable[str], priority: int = 0, requeue_done: bool = False) -> int:
+        """
+        Thêm link vào hàng đợi (một transaction cho cả danh sách)
+        
+        Link đã có trong hàng đợi được giữ nguyên trạng thái, riêng job failed
+        được đưa lại về pending để thử lại. Priority chỉ được nâng lên, không bị hạ.
+        
+        Args:
+            urls: Các link đã chuẩn hóa
+            priority: Độ ưu tiên (lớn hơn được lấy trước)
+            requeue_done: Đưa cả job đã done về pending (người dùng chủ động thêm lại link)
+        
+        Returns:
+            Số link mới được thêm
+        """
+        now = time.time()
+        rows = [(url, self.PENDING, priority, now, now) for url in urls]
+        if not rows:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (url, state, priority, added_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            added = self._conn.total_changes - before
+            requeue = self.DONE if requeue_done else self.FAILED
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, error = NULL, skipped = NULL, updated_at = ?"
+                " WHERE url = ? AND state IN (?, ?)",
+                [(self.PENDING, now, row[0], requeue, self.FAILED) for row in rows]
+            )
+            self._conn.executemany(
+                "UPDATE jobs SET priority = ?, updated_at = ? WHERE url = ? AND priority < ?",
+                [(priority, now, row[0], priority) for row in rows]
+            )
+            self._conn.commit()
+            self._stats['added'] += added
+        self._added.set()
+        return added
+    
+    def claim(self) -> Optional[Tuple[int, str]]:
+        """
+        Lấy job pending có ưu tiên cao nhất và chuyển sang resolving
+        
+        Returns:
+            (job id, url), None nếu không còn job nào đang chờ
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, url FROM jobs WHERE state = ? AND paused = 0"
+                " ORDER BY priority DESC, id LIMIT 1",
+                (self.PENDING,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (self.RESOLVING, time.time(), row[0])
+            )
+            self._conn.commit()
+            self._stats['claimed'] += 1
+        return row[0], row[1]
+    
+    def iter_claims(self, stop_event: Optional[threading.Event] = None,
+                    feeding: Optional[threading.Event] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Lấy lần lượt các job pending cho đến khi hết hoặc có yêu cầu dừng
+        
+        Khi hàng đợi đang tạm dừng (pause) thì chờ đến khi resume.
+        Trong khi feeding còn được set (luồng khác đang thêm link), hết job thì chờ link mới thay vì dừng.
+        
+        Args:
+            stop_event: Event báo dừng (tùy chọn)
+            feeding: Event được set trong khi còn link đang được thêm vào (tùy chọn)
+        
+        Yields:
+            (job id, url)
+        """
+        while self.wait_resumed(stop_event):
+            self._added.clear()
+            job = self.claim()
+            if job is None:
+                if feeding is None or not feeding.is_set():
+                    # Luồng thêm link vừa xong: lấy nốt các link của lô cuối
+                    job = self.claim()
+                    if job is None:
+                        return
+                else:
+                    self._added.wait(self.POLL_INTERVAL)
+                    continue
+            yield job
+    
+    def wait_resumed(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Chờ trong khi hàng đợi đang tạm dừng
+        
+        Args:
+            stop_event: Event báo dừng (tùy chọn)
+        
+        Returns:
+            True nếu được chạy tiếp, False nếu có yêu cầu dừng
+        """
+        while not self._resumed.wait(self.POLL_INTERVAL):
+            if stop_event is not None and stop_event.is_set():
+                return False
+        return stop_event is None or not stop_event.is_set()
+    
+    def mark_downloading(self, job_id: int):
+        """Chuyển job sang downloading (đã lấy được thông tin video, bắt đầu tải file)"""
+        self._set_state(job_id, self.DOWNLOADING)
+    
+    def finish(self, job_id: int, result: Dict):
+        """
+        Ghi kết quả của job: done nếu thành công hoặc được bỏ qua, ngược lại failed
+        
+        Args:
+            job_id: ID job
+            result: Dict kết quả của process_video
+        """
+        state = self.DONE if result.get('success') or result.get('skipped') else self.FAILED
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, video_id = ?, file_path = ?, error = ?, skipped = ?,"
+                " updated_at = ? WHERE id = ?",
+                (state, result.get('video_id'), result.get('file_path'),
+                 None if state == self.DONE else result.get('error'),
+                 result.get('skipped'), time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def _set_state(self, job_id: int, state: str):
+        """Đổi trạng thái một job"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                (state, time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def retry_failed(self, max_attempts: Optional[int] = None) -> int:
+        """
+        Đưa các job failed về pending
+        
+        Args:
+            max_attempts: Chỉ chạy lại job đã thử ít hơn số lần này (None = tất cả)
+        
+        Returns:
+            Số job được chạy lại
+        """
+        query = "UPDATE jobs SET state = ?, error = NULL, updated_at = ? WHERE state = ?"
+        params = [self.PENDING, time.time(), self.FAILED]
+        if max_attempts is not None:
+            query += " AND attempts < ?"
+            params.append(max_attempts)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            self._conn.commit()
+        return cursor.rowcount
+    
+    def clear_pending(self) -> int:
+        """
+        Xóa các job chưa chạy (pending) khỏi hàng đợi
+        
+        Returns:
+            Số job đã xóa
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE state = ?", (self.PENDING,))
+            self._conn.commit()
+        return cursor.rowcount
+    
+    def pause(self):
+        """Tạm dừng cả hàng đợi: job đang chạy chạy nốt, không lấy job mới"""
+        self._resumed.clear()
+    
+    def resume(self):
+        """Tiếp tục hàng đợi sau pause"""
+        self._resumed.set()
+    
+    @property
+    def is_paused(self) -> bool:
+        """True nếu hàng đợi đang tạm dừng"""
+        return not self._resumed.is_set()
+    
+    def pause_job(self, job_id: int):
+        """Tạm dừng một job: job chưa chạy sẽ không được lấy cho đến khi resume_job"""
+        self._set_paused(job_id, 1)
+    
+    def resume_job(self, job_id: int):
+        """Cho phép lấy lại một job đã tạm dừng"""
+        self._set_paused(job_id, 0)
+    
+    def _set_paused(self, job_id: int, paused: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET paused = ?, updated_at = ? WHERE id = ?",
+                (paused, time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def set_priority(self, job_id: int, priority: int):
+        """Đổi độ ưu tiên của một job (lớn hơn được lấy trước)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?",
+                (priority, time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def job_id(self, url: str) -> Optional[int]:
+        """ID job của một link, None nếu link không có trong hàng đợi"""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM jobs WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+    
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """
+        Lấy thông tin một job
+        
+        Returns:
+            Dict gồm id, url, state, priority, paused, attempts, video_id,
+            file_path, error, skipped, added_at, updated_at; None nếu không có
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            columns = [column[0] for column in cursor.description]
+        if row is None:
+            return None
+        job = dict(zip(columns, row))
+        job['paused'] = bool(job['paused'])
+        return job
+    
+    def list_jobs(self, state: Optional[str] = None, limit: Optional[int] = 100) -> List[Dict]:
+        """
+        Liệt kê job theo thứ tự sẽ được lấy
+        
+        Args:
+            state: Chỉ lấy job ở trạng thái này (None = tất cả)
+            limit: Số job tối đa (None = tất cả)
+        """
+        query = "SELECT id FROM jobs"
+        params: list = []
+        if state:
+            query += " WHERE state = ?"
+            params.append(state)
+        query += " ORDER BY priority DESC, id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(query, params)]
+        return [job for job in (self.get_job(job_id) for job_id in ids) if job]
+    
+    def count(self, *states: str) -> int:
+        """Số job ở các trạng thái cho trước (không truyền = tất cả)"""
+        query = "SELECT COUNT(*) FROM jobs"
+        if states:
+            query += f" WHERE state IN ({', '.join('?' * len(states))})"
+        with self._lock:
+            return self._conn.execute(query, states).fetchone()[0]
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê hàng đợi
+        
+        Returns:
+            Dict gồm số job theo từng trạng thái, paused_jobs (job bị tạm dừng riêng),
+            paused (cả hàng đợi đang tạm dừng), added/claimed trong phiên này
+            và recovered (job chạy dở được khôi phục khi mở hàng đợi)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            stats['paused_jobs'] = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE paused = 1 AND state = ?", (self.PENDING,)
+            ).fetchone()[0]
+        for state in self.STATES:
+            stats[state] = counts.get(state, 0)
+        stats['paused'] = self.is_paused
+        return stats
+    
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,151 @@
+"""
+Link Import Module
+Đọc danh sách link theo từng dòng, chuẩn hóa, lọc link lỗi và link trùng video ID
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class LinkImporter:
+    """
+    Đọc link theo kiểu streaming (không nạp cả file vào bộ nhớ)
+    
+    Mỗi dòng được chuẩn hóa bằng normalize_url / extract_video_id của downloader;
+    dòng không có link Douyin hợp lệ bị bỏ, link trùng video ID chỉ giữ lần đầu.
+    Link rút gọn (v.douyin.com) được giữ lại; nếu bật resolve_short thì được
+    phân giải song song theo từng lô thành link dạng chuẩn trước khi lọc trùng.
+    Nếu có profiles (ProfileCrawler), link profile (/user/...) được thay bằng
+    link các video của profile, lấy dần theo từng trang.
+    """
+    
+    # Tìm URL trong dòng (dòng chia sẻ thường có kèm chữ trước/sau link)
+    URL_PATTERN = re.compile(r'https?://[^\s"\'<>]+')
+    
+    def __init__(self, downloader, resolve_short: bool = False, batch_size: int = 32,
+                 profiles=None):
+        """
+        Khởi tạo LinkImporter
+        
+        Args:
+            downloader: VideoDownloader (dùng normalize_url, known_video_id, resolve_short_links)
+            resolve_short: Phân giải link rút gọn ngay khi đọc (gọi mạng, không dùng trên luồng giao diện)
+            batch_size: Số link đọc trước mỗi lô khi phân giải link rút gọn
+            profiles: ProfileCrawler để mở rộng link profile (gọi mạng, tùy chọn)
+        """
+        self.downloader = downloader
+        self.resolve_short = resolve_short
+        self.batch_size = max(1, int(batch_size))
+        self.profiles = profiles
+        self._seen = set()
+        self.stats = {'lines': 0, 'valid': 0, 'duplicates': 0, 'invalid': 0, 'unresolved': 0, 'profiles': 0}
+    
+    def iter_links(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Lọc và chuẩn hóa link từ các dòng đầu vào
+        
+        Args:
+            lines: Các dòng (file đã mở, stdin, list...)
+        
+        Yields:
+            URL đã chuẩn hóa, không trùng video ID
+        """
+        urls = self._iter_normalized(lines)
+        if self.resolve_short:
+            urls = self._iter_resolved(urls)
+        
+        for url in urls:
+            if self.profiles is not None and self.profiles.is_profile_link(url):
+                self.stats['profiles'] += 1
+                for link in self.profiles.iter_links(url):
+                    if self._accept(link):
+                        yield link
+                continue
+            if self._accept(url):
+                yield url
+    
+    def _accept(self, url: Optional[str]) -> bool:
+        """Ghi nhận một link vào thống kê, False nếu link không hợp lệ hoặc trùng"""
+        key = self._dedupe_key(url) if url else None
+        if not key:
+            self.stats['invalid'] += 1
+            return False
+        if key in self._seen:
+            self.stats['duplicates'] += 1
+            return False
+        
+        self._seen.add(key)
+        self.stats['valid'] += 1
+        return True
+    
+    def _iter_normalized(self, lines: Iterable[str]) -> Iterator[Optional[str]]:
+        """Tách URL khỏi từng dòng và chuẩn hóa (None nếu dòng không có link hợp lệ)"""
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            self.stats['lines'] += 1
+            
+            match = self.URL_PATTERN.search(line)
+            yield self.downloader.normalize_url(match.group(0) if match else line)
+    
+    def _iter_resolved(self, urls: Iterable[Optional[str]]) -> Iterator[Optional[str]]:
+        """Đọc trước từng lô, phân giải song song các link rút gọn trong lô, giữ nguyên thứ tự"""
+        batch = []
+        for url in urls:
+            batch.append(url)
+            if len(batch) >= self.batch_size:
+                yield from self._resolve_batch(batch)
+                batch = []
+        yield from self._resolve_batch(batch)
+    
+    def _resolve_batch(self, batch: List[Optional[str]]) -> List[Optional[str]]:
+        """Thay link rút gọn trong lô bằng link dạng chuẩn"""
+        resolved = self.downloader.resolve_short_links(url for url in batch if url)
+        output = []
+        for url in batch:
+            if url in resolved:
+                if resolved[url] is None:
+                    # Không phân giải được: giữ link rút gọn, process_video sẽ thử lại
+                    self.stats['unresolved'] += 1
+                else:
+                    url = resolved[url]
+            output.append(url)
+        return output
+    
+    def _dedupe_key(self, url: str) -> Optional[str]:
+        """
+        Khóa để lọc trùng: video ID nếu biết được mà không gọi mạng,
+        chính link nếu là link rút gọn chưa phân giải, None nếu link không dùng được
+        """
+        video_id = self.downloader.known_video_id(url)
+        if video_id is None and self.downloader.short_links.is_short_link(url):
+            return url
+        return video_id
+    
+    def import_file(self, file_path: str) -> List[str]:
+        """
+        Đọc file .txt theo từng dòng
+        
+        Args:
+            file_path: Đường dẫn file
+        
+        Returns:
+            Danh sách URL đã chuẩn hóa và lọc trùng
+        """
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            return list(self.iter_links(f))
+    
+    def summary(self) -> str:
+        """Mô tả ngắn kết quả import"""
+        return (
+            f"Đã đọc {self.stats['lines']} dòng: {self.stats['valid']} link hợp lệ, "
+            f"{self.stats['duplicates']} link trùng, {self.stats['invalid']} dòng không hợp lệ"
+            + (f", {self.stats['unresolved']} link rút gọn chưa phân giải được"
+               if self.stats['unresolved'] else "")
+            + (f", {self.stats['profiles']} profile" if self.stats['profiles'] else "")
+        )
+    
+    def get_stats(self) -> Dict:
+        """Lấy thống kê: lines, valid, duplicates, invalid, unresolved (link rút gọn chưa phân giải được), profiles"""
+        return dict(self.stats)
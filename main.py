@@ -28,7 +28,10 @@ def main():
         app = MainWindow(root, cookie_manager, VideoDownloader)
         
         # Chạy ứng dụng
-        root.mainloop()
+        try:
+            root.mainloop()
+        finally:
+            cookie_manager.close()
         
     except KeyboardInterrupt:
         print("\nỨng dụng đã được dừng bởi người dùng")
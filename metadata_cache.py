@@ -0,0 +1,229 @@
+"""
+Metadata Cache Module
+Lưu thông tin video (kết quả get_video_info) vào SQLite để không phải gọi lại API
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+class MetadataCache:
+    """
+    Cache thông tin video theo video_id
+    
+    Metadata tĩnh (tiêu đề, tác giả, danh sách mirror, kích thước) được giữ lâu dài.
+    Link phát đã ký có hạn dùng riêng, lấy từ tham số hết hạn trong URL;
+    khi link hết hạn thì get() trả về None để gọi lại API lấy link mới (API chi tiết
+    là nguồn duy nhất của link phát nên không có cách làm mới riêng phần link).
+    Link bị thu hồi trước hạn (CDN trả 403/410) thì người dùng gọi delete() để bỏ.
+    Thời điểm dùng gần nhất (cho việc xóa bớt) được giữ trong bộ nhớ và ghi xuống
+    theo lô, lần tra cứu trúng cache không phải ghi SQLite.
+    """
+    
+    FILENAME = ".douyin_cache.sqlite3"
+    # Thời gian sống mặc định của link đã ký khi không đọc được hạn từ URL (giây)
+    DEFAULT_URL_TTL = 3600
+    # Trừ bớt khỏi hạn của link để không dùng link sắp hết hạn (giây)
+    EXPIRY_MARGIN = 120
+    # Số lần put giữa hai lần kiểm tra giới hạn kích thước
+    EVICT_EVERY = 100
+    # Số video được dùng lại (cache hit) giữ trong bộ nhớ trước khi ghi last_access xuống SQLite
+    ACCESS_FLUSH_EVERY = 100
+    # Tham số query chứa thời điểm hết hạn (unix timestamp)
+    EXPIRY_PARAMS = ('x-expires', 'expires', 'expire', 'x-expire')
+    
+    def __init__(self, db_path: str, max_entries: int = 50000, url_ttl: Optional[int] = None):
+        """
+        Khởi tạo MetadataCache
+        
+        Args:
+            db_path: Đường dẫn file SQLite
+            max_entries: Số video tối đa trong cache, cũ nhất bị xóa trước
+            url_ttl: Thời gian sống mặc định của link đã ký (giây)
+        """
+        self.db_path = db_path
+        self.max_entries = max(1, int(max_entries))
+        self.url_ttl = int(url_ttl) if url_ttl else self.DEFAULT_URL_TTL
+        self._lock = threading.Lock()
+        self._puts = 0
+        # video_id -> last_access chưa ghi xuống SQLite
+        self._accessed: Dict[str, float] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'deleted': 0}
+        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS video_info ("
+            " video_id TEXT PRIMARY KEY,"
+            " info TEXT NOT NULL,"
+            " urls_expire_at REAL NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_video_info_last_access ON video_info (last_access)"
+        )
+        self._conn.commit()
+    
+    @classmethod
+    def for_folder(cls, download_folder: str, **kwargs) -> "MetadataCache":
+        """Tạo cache nằm trong thư mục tải về"""
+        return cls(os.path.join(download_folder, cls.FILENAME), **kwargs)
+    
+    def url_expiry(self, urls: List[str], now: Optional[float] = None) -> float:
+        """
+        Tính thời điểm hết hạn của danh sách link đã ký
+        
+        Đọc tham số x-expires/expires trong query, hoặc đoạn hex 8 ký tự trong path
+        (dạng link douyinvod.com). Lấy hạn sớm nhất; nếu không đọc được thì dùng url_ttl.
+        
+        Args:
+            urls: Danh sách link phát
+            now: Thời điểm hiện tại (mặc định time.time())
+        
+        Returns:
+            Unix timestamp hết hạn (đã trừ EXPIRY_MARGIN)
+        """
+        now = time.time() if now is None else now
+        expiries = [e for e in (self._parse_expiry(url, now) for url in urls if url) if e]
+        expire_at = min(expiries) if expiries else now + self.url_ttl
+        return expire_at - self.EXPIRY_MARGIN
+    
+    def _parse_expiry(self, url: str, now: float) -> Optional[float]:
+        """Đọc thời điểm hết hạn từ một link, None nếu không có"""
+        parsed = urlparse(url)
+        params = parse_qs(parsed.query)
+        for key in self.EXPIRY_PARAMS:
+            value = params.get(key, [''])[0]
+            if value.isdigit():
+                return float(value)
+        for part in parsed.path.split('/'):
+            if re.fullmatch(r'[0-9a-f]{8}', part):
+                value = int(part, 16)
+                # Chỉ chấp nhận giá trị trông giống timestamp gần hiện tại
+                if now - 86400 < value < now + 30 * 86400:
+                    return float(value)
+        return None
+    
+    def get(self, video_id: str) -> Optional[Dict]:
+        """
+        Lấy thông tin video còn dùng được
+        
+        Args:
+            video_id: ID video
+        
+        Returns:
+            Dict giống get_video_info, hoặc None nếu chưa có / link đã hết hạn
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info, urls_expire_at FROM video_info WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            if row[1] <= now:
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._accessed[video_id] = now
+            if len(self._accessed) >= self.ACCESS_FLUSH_EVERY:
+                self._flush_access()
+                self._conn.commit()
+            self._stats['hits'] += 1
+        return json.loads(row[0])
+    
+    def delete(self, video_id: str):
+        """
+        Xóa thông tin video khỏi cache (link phát không còn dùng được dù chưa hết hạn)
+        
+        Args:
+            video_id: ID video
+        """
+        with self._lock:
+            self._accessed.pop(video_id, None)
+            cursor = self._conn.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+            self._conn.commit()
+            self._stats['deleted'] += cursor.rowcount
+    
+    def _flush_access(self):
+        """Ghi last_access của các video vừa được dùng lại (gọi khi đang giữ lock)"""
+        if not self._accessed:
+            return
+        self._conn.executemany(
+            "UPDATE video_info SET last_access = ? WHERE video_id = ?",
+            [(last_access, video_id) for video_id, last_access in self._accessed.items()]
+        )
+        self._accessed = {}
+    
+    def put(self, video_info: Dict):
+        """
+        Lưu thông tin video vào cache
+        
+        Args:
+            video_info: Dict trả về từ get_video_info (phải có 'video_id')
+        """
+        video_id = video_info.get('video_id')
+        if not video_id:
+            return
+        now = time.time()
+        urls = video_info.get('video_urls') or [video_info.get('video_url')]
+        if video_info.get('images'):
+            urls = [image['urls'][0] for image in video_info['images']]
+        expire_at = self.url_expiry(urls, now)
+        info = json.dumps(video_info, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO video_info"
+                " (video_id, info, urls_expire_at, fetched_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (video_id, info, expire_at, now, now)
+            )
+            self._accessed.pop(video_id, None)
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Xóa các video ít được dùng nhất khi vượt quá max_entries (gọi khi đang giữ lock)"""
+        self._flush_access()
+        count = self._conn.execute("SELECT COUNT(*) FROM video_info").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM video_info WHERE video_id IN"
+            " (SELECT video_id FROM video_info ORDER BY last_access LIMIT ?)",
+            (excess,)
+        )
+        self._stats['evictions'] += excess
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê cache
+        
+        Returns:
+            Dict gồm hits, misses, expired (miss do link hết hạn), evictions,
+            deleted (bỏ vì link hỏng trước hạn), entries
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = self._conn.execute("SELECT COUNT(*) FROM video_info").fetchone()[0]
+        return stats
+    
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,149 @@
+"""
+Mirror Selector Module
+Theo dõi tình trạng các host CDN và chọn thứ tự thử các link mirror
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+
+class MirrorSelector:
+    """Ghi nhận độ trễ / tốc độ / lỗi theo host CDN và xếp hạng các mirror"""
+    
+    # Hệ số làm mượt EWMA cho độ trễ và tốc độ
+    EWMA_ALPHA = 0.3
+    # Số lỗi liên tiếp để tạm xếp host xuống cuối
+    COOLDOWN_FAILURES = 3
+    # Thời gian tạm xếp host xuống cuối (giây)
+    COOLDOWN_SECONDS = 60
+    # Kích thước tham chiếu để quy đổi tốc độ ra thời gian (1 MB)
+    REFERENCE_BYTES = 1024 * 1024
+    
+    def __init__(self):
+        """Khởi tạo MirrorSelector"""
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict] = {}
+    
+    @staticmethod
+    def host_of(url: str) -> str:
+        """Lấy host từ URL"""
+        return urlparse(url).netloc
+    
+    def _host_stats(self, host: str) -> Dict:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = {
+                'requests': 0,
+                'successes': 0,
+                'failures': 0,
+                'consecutive_failures': 0,
+                'last_failure': 0.0,
+                'last_error': None,
+                'ttfb': None,
+                'throughput': None,
+                'bytes': 0
+            }
+            self._hosts[host] = stats
+        return stats
+    
+    def _ewma(self, old: Optional[float], value: float) -> float:
+        if old is None:
+            return value
+        return old + self.EWMA_ALPHA * (value - old)
+    
+    def record_response(self, url: str, ttfb: float):
+        """
+        Ghi nhận thời gian đến byte đầu tiên (header) của một request
+        
+        Args:
+            url: URL đã gửi request
+            ttfb: Thời gian từ lúc gửi đến khi nhận header (giây)
+        """
+        with self._lock:
+            stats = self._host_stats(self.host_of(url))
+            stats['ttfb'] = self._ewma(stats['ttfb'], ttfb)
+    
+    def record_success(self, url: str, num_bytes: int, seconds: float):
+        """
+        Ghi nhận một lần tải thành công
+        
+        Args:
+            url: URL đã tải
+            num_bytes: Số byte nhận được
+            seconds: Thời gian truyền dữ liệu (giây)
+        """
+        with self._lock:
+            stats = self._host_stats(self.host_of(url))
+            stats['requests'] += 1
+            stats['successes'] += 1
+            stats['consecutive_failures'] = 0
+            stats['bytes'] += num_bytes
+            if num_bytes > 0 and seconds > 0:
+                stats['throughput'] = self._ewma(stats['throughput'], num_bytes / seconds)
+    
+    def record_failure(self, url: str, error: str, num_bytes: int = 0):
+        """
+        Ghi nhận một lần tải lỗi
+        
+        Args:
+            url: URL đã tải
+            error: Mô tả lỗi (status code hoặc exception)
+            num_bytes: Số byte đã nhận trước khi lỗi
+        """
+        with self._lock:
+            stats = self._host_stats(self.host_of(url))
+            stats['requests'] += 1
+            stats['failures'] += 1
+            stats['consecutive_failures'] += 1
+            stats['last_failure'] = time.monotonic()
+            stats['last_error'] = error
+            stats['bytes'] += num_bytes
+    
+    def _score(self, stats: Optional[Dict], now: float) -> tuple:
+        """Điểm để sắp xếp: nhỏ hơn là tốt hơn"""
+        if stats is None:
+            # Host chưa thử: ưu tiên để đo
+            return (0, 0.0)
+        cooling = (
+            stats['consecutive_failures'] >= self.COOLDOWN_FAILURES
+            and now - stats['last_failure'] < self.COOLDOWN_SECONDS
+        )
+        ttfb = stats['ttfb'] or 0.0
+        transfer = self.REFERENCE_BYTES / stats['throughput'] if stats['throughput'] else 0.0
+        failure_rate = stats['failures'] / stats['requests'] if stats['requests'] else 0.0
+        return (1 if cooling else 0, (ttfb + transfer) * (1 + 4 * failure_rate))
+    
+    def order(self, urls: List[str]) -> List[str]:
+        """
+        Sắp xếp danh sách mirror theo tình trạng host
+        
+        Host đang lỗi liên tiếp bị xếp cuối; các host còn lại xếp theo thời gian
+        ước tính để tải 1 MB. Khi bằng điểm giữ nguyên thứ tự Douyin trả về.
+        
+        Args:
+            urls: Danh sách URL mirror
+        
+        Returns:
+            Danh sách URL đã sắp xếp (không trùng lặp)
+        """
+        unique = list(dict.fromkeys(url for url in urls if url))
+        now = time.monotonic()
+        with self._lock:
+            scores = {url: self._score(self._hosts.get(self.host_of(url)), now) for url in unique}
+        return sorted(unique, key=lambda url: scores[url])
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Lấy thống kê theo host
+        
+        Returns:
+            Dict host -> {requests, successes, failures, consecutive_failures,
+            last_error, ttfb (giây), throughput (byte/giây), bytes}
+        """
+        with self._lock:
+            return {
+                host: {key: value for key, value in stats.items() if key != 'last_failure'}
+                for host, stats in self._hosts.items()
+            }
@@ -0,0 +1,453 @@
+"""
+Profile Crawler Module
+Duyệt danh sách bài của một tài khoản (link /user/<sec_uid>) theo từng trang, trả về dạng generator;
+chế độ đồng bộ chỉ lấy bài mới hơn lần chạy trước
+"""
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+
+class ProfileSyncError(Exception):
+    """Không lấy được hết phần bài mới của profile (mốc đồng bộ được giữ nguyên)"""
+
+
+class ProfileSyncStore:
+    """
+    Mốc đồng bộ của từng profile (bài mới nhất đã thấy) để lần sau chỉ lấy bài mới hơn
+    
+    Mốc là (create_time, aweme_id) của bài mới nhất. Khi đang đồng bộ, sau mỗi trang
+    đã xử lý xong thì lưu pending (bài mới nhất của lượt này) và resume_cursor
+    (cursor trang kế tiếp): nếu bị dừng giữa chừng, lần sau lấy bài mới hơn pending
+    rồi đi tiếp từ resume_cursor xuống đến mốc cũ thay vì duyệt lại từ đầu.
+    """
+    
+    FILENAME = ".douyin_profiles.sqlite3"
+    
+    def __init__(self, db_path: str):
+        """
+        Khởi tạo ProfileSyncStore
+        
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " sec_uid TEXT PRIMARY KEY,"
+            " latest_time INTEGER,"
+            " latest_id TEXT,"
+            " pending_time INTEGER,"
+            " pending_id TEXT,"
+            " resume_cursor INTEGER,"
+            " synced_at REAL,"
+            " new_posts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.commit()
+    
+    @classmethod
+    def for_folder(cls, download_folder: str) -> "ProfileSyncStore":
+        """Tạo store nằm trong thư mục tải về"""
+        return cls(os.path.join(download_folder, cls.FILENAME))
+    
+    def get(self, sec_uid: str) -> Optional[Dict]:
+        """
+        Lấy mốc đồng bộ của profile
+        
+        Args:
+            sec_uid: sec_uid của profile
+        
+        Returns:
+            Dict gồm latest, pending ((create_time, aweme_id) hoặc None), resume_cursor,
+            synced_at, new_posts; None nếu profile chưa đồng bộ lần nào
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT latest_time, latest_id, pending_time, pending_id, resume_cursor, synced_at, new_posts"
+                " FROM profiles WHERE sec_uid = ?",
+                (sec_uid,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            'latest': (row[0], row[1]) if row[1] is not None else None,
+            'pending': (row[2], row[3]) if row[3] is not None else None,
+            'resume_cursor': row[4],
+            'synced_at': row[5],
+            'new_posts': row[6]
+        }
+    
+    def checkpoint(self, sec_uid: str, latest: Optional[Tuple[int, str]],
+                   pending: Optional[Tuple[int, str]], resume_cursor: int):
+        """Lưu tiến độ giữa chừng: đã xử lý hết các bài từ pending xuống đến resume_cursor"""
+        self._save(sec_uid, latest, pending, resume_cursor, None, 0)
+    
+    def commit(self, sec_uid: str, latest: Optional[Tuple[int, str]], new_posts: int):
+        """Đồng bộ xong: đặt mốc mới và xóa tiến độ giữa chừng"""
+        self._save(sec_uid, latest, None, None, time.time(), new_posts)
+    
+    def _save(self, sec_uid: str, latest, pending, resume_cursor, synced_at, new_posts: int):
+        latest = latest or (None, None)
+        pending = pending or (None, None)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO profiles (sec_uid, latest_time, latest_id, pending_time, pending_id,"
+                " resume_cursor, synced_at, new_posts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(sec_uid) DO UPDATE SET latest_time = excluded.latest_time,"
+                " latest_id = excluded.latest_id, pending_time = excluded.pending_time,"
+                " pending_id = excluded.pending_id, resume_cursor = excluded.resume_cursor,"
+                " synced_at = COALESCE(excluded.synced_at, profiles.synced_at),"
+                " new_posts = excluded.new_posts",
+                (sec_uid, latest[0], latest[1], pending[0], pending[1], resume_cursor, synced_at, new_posts)
+            )
+            self._conn.commit()
+    
+    def get_stats(self) -> Dict:
+        """Thống kê: profiles (số profile đã có mốc), interrupted (số profile đang đồng bộ dở)"""
+        with self._lock:
+            profiles, interrupted = self._conn.execute(
+                "SELECT COUNT(*), COUNT(resume_cursor) FROM profiles"
+            ).fetchone()
+        return {'profiles': profiles, 'interrupted': interrupted}
+    
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class ProfileCrawler:
+    """
+    Duyệt bài đăng của profile theo cursor (aweme/post), mỗi lần một trang
+    
+    Bài được trả về ngay khi trang của nó về tới, trong lúc đó luồng nền đã lấy
+    trang kế tiếp, nên video của trang 1 bắt đầu tải khi trang 2 còn đang lấy.
+    Không giữ cả danh sách bài trong bộ nhớ: tối đa prefetch_pages trang chờ xử lý.
+    
+    Danh sách bài đã có link phát nên thông tin video được giao cho downloader
+    (add_prefetched): job của các video này không phải gọi aweme/detail nữa.
+    
+    Nếu có store (ProfileSyncStore), iter_links chỉ trả về bài mới hơn mốc của
+    lần đồng bộ trước và dừng lấy trang ngay khi gặp bài đã thấy. Mốc mới không
+    được lưu ngay mà chờ đến khi gọi save_marks(), sau khi các link đã trả về được
+    lưu lại (ví dụ đã vào JobQueue), để link chưa kịp lưu không bị mất khi dừng giữa chừng.
+    """
+    
+    API_PATH = "/aweme/v1/web/aweme/post/"
+    # sec_uid trong link profile (https://www.douyin.com/user/MS4wLjABAAAA...)
+    USER_PATTERN = re.compile(r'/user/([A-Za-z0-9_.\-]+)')
+    # Chu kỳ kiểm tra yêu cầu dừng khi hàng đợi trang đầy (giây)
+    POLL_INTERVAL = 0.2
+    
+    def __init__(self, downloader, page_size: int = 18, prefetch_pages: int = 1,
+                 store: Optional[ProfileSyncStore] = None):
+        """
+        Khởi tạo ProfileCrawler
+        
+        Args:
+            downloader: VideoDownloader (dùng session, rate limiter, retry và parse_aweme)
+            page_size: Số bài mỗi trang
+            prefetch_pages: Số trang được lấy trước khi trang hiện tại chưa xử lý xong
+            store: Mốc đồng bộ của các profile, có thì chỉ lấy bài mới (tùy chọn)
+        """
+        self.downloader = downloader
+        self.page_size = max(1, int(page_size))
+        self.prefetch_pages = max(1, int(prefetch_pages))
+        self.store = store
+        # Các lần lưu mốc đồng bộ đang chờ save_marks(): (hàm của store, tham số)
+        self._pending_marks = []
+        self._marks_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'profiles': 0, 'pages': 0, 'posts': 0, 'videos': 0, 'no_video': 0, 'errors': 0,
+            'up_to_date': 0, 'reached_mark': 0
+        }
+    
+    def is_profile_link(self, url: Optional[str]) -> bool:
+        """True nếu là link profile Douyin"""
+        return bool(url) and self.extract_sec_uid(url) is not None
+    
+    def extract_sec_uid(self, url: str) -> Optional[str]:
+        """
+        Lấy sec_uid từ link profile
+        
+        Args:
+            url: Link profile (https://www.douyin.com/user/<sec_uid>)
+        
+        Returns:
+            sec_uid hoặc None nếu không phải link profile
+        """
+        if "douyin.com" not in url:
+            return None
+        match = self.USER_PATTERN.search(url)
+        return match.group(1) if match else None
+    
+    def iter_posts(self, sec_uid: str, max_cursor: int = 0) -> Iterator[Dict]:
+        """
+        Duyệt các aweme của profile, mới nhất trước
+        
+        Args:
+            sec_uid: sec_uid của profile
+            max_cursor: Cursor bắt đầu (0 = từ bài mới nhất)
+        
+        Yields:
+            Dict aweme trong response API
+        """
+        self._count('profiles')
+        for page in self.iter_pages(sec_uid, max_cursor):
+            yield from page['awemes']
+    
+    def iter_pages(self, sec_uid: str, max_cursor: int = 0) -> Iterator[Dict]:
+        """
+        Duyệt từng trang bài đăng, luồng nền lấy trước prefetch_pages trang
+        
+        Dừng khi hết trang hoặc API lỗi. Đóng generator giữa chừng (break, close)
+        thì luồng lấy trang cũng dừng.
+        
+        Args:
+            sec_uid: sec_uid của profile
+            max_cursor: Cursor bắt đầu (0 = từ bài mới nhất)
+        
+        Yields:
+            Dict trang giống fetch_page
+        """
+        pages = queue.Queue(maxsize=self.prefetch_pages)
+        stop = threading.Event()
+        done = object()
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=self.POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def fetch_pages():
+            cursor = max_cursor
+            try:
+                while not stop.is_set():
+                    page = self.fetch_page(sec_uid, cursor)
+                    if page is None or not put(page):
+                        return
+                    if not page['has_more'] or page['max_cursor'] == cursor:
+                        return
+                    cursor = page['max_cursor']
+            except Exception as e:
+                print(f"Lỗi khi lấy danh sách bài của {sec_uid}: {e}")
+                self._count('errors')
+            finally:
+                put(done)
+        
+        thread = threading.Thread(target=fetch_pages, name="profile-pages", daemon=True)
+        thread.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is done:
+                    return
+                yield page
+        finally:
+            stop.set()
+    
+    def fetch_page(self, sec_uid: str, max_cursor: int = 0) -> Optional[Dict]:
+        """
+        Lấy một trang bài đăng
+        
+        Args:
+            sec_uid: sec_uid của profile
+            max_cursor: Cursor của trang (0 = trang đầu)
+        
+        Returns:
+            {'awemes': [...], 'has_more': bool, 'max_cursor': int}, None nếu lỗi
+        """
+        downloader = self.downloader
+        api_url = (
+            f"{downloader.api_base}{self.API_PATH}?sec_user_id={quote(sec_uid)}"
+            f"&max_cursor={int(max_cursor)}&count={self.page_size}"
+        )
+        data = downloader._api_get_json(api_url)
+        if data is None or not isinstance(data.get('aweme_list') or [], list):
+            print(f"Không lấy được danh sách bài của {sec_uid}")
+            self._count('errors')
+            return None
+        awemes = data.get('aweme_list') or []
+        self._count('pages')
+        self._count('posts', len(awemes))
+        return {
+            'awemes': awemes,
+            'has_more': bool(data.get('has_more')),
+            'max_cursor': int(data.get('max_cursor') or 0)
+        }
+    
+    def iter_links(self, url: str) -> Iterator[str]:
+        """
+        Duyệt profile và trả về link video dạng chuẩn của từng bài
+        
+        Thông tin video (link phát) của mỗi bài được giao cho downloader để
+        job tải không phải gọi lại API. Bài không có video lẫn ảnh bị bỏ qua.
+        Có store thì chỉ trả về bài mới hơn lần đồng bộ trước (xem iter_new_posts).
+        
+        Args:
+            url: Link profile hoặc sec_uid
+        
+        Yields:
+            Link video dạng chuẩn (https://www.douyin.com/video/<id>)
+        """
+        sec_uid = self.extract_sec_uid(url) or url
+        if self.store is not None:
+            awemes = self.iter_new_posts(sec_uid)
+        else:
+            awemes = self.iter_posts(sec_uid)
+        for aweme in awemes:
+            video_info = self.downloader.parse_aweme(aweme)
+            if not video_info['video_id'] or not (video_info['video_url'] or video_info['images']):
+                self._count('no_video')
+                continue
+            self._count('videos')
+            self.downloader.add_prefetched(video_info)
+            yield self.downloader.canonical_url(video_info['video_id'])
+    
+    def iter_new_posts(self, sec_uid: str) -> Iterator[Dict]:
+        """
+        Duyệt các aweme mới hơn mốc đồng bộ của profile, dừng lấy trang khi gặp bài đã thấy
+        
+        Trang đầu được lấy trực tiếp (không lấy trước trang 2), nên profile không có
+        bài mới chỉ tốn một request. Bài ghim (is_top) nằm đầu trang dù cũ nên
+        không dùng để xác định điểm dừng. Mốc mới chỉ được ghi nhận khi đã duyệt hết phần
+        bài mới (generator chạy đến cuối); dừng giữa chừng thì lần sau đi tiếp từ
+        trang đã xử lý xong cuối cùng. Mốc được lưu vào store khi gọi save_marks().
+        
+        Args:
+            sec_uid: sec_uid của profile
+        
+        Yields:
+            Dict aweme mới, mới nhất trước
+        """
+        self._count('profiles')
+        state = self.store.get(sec_uid) or {}
+        latest = state.get('latest')
+        resume_cursor = state.get('resume_cursor')
+        # Mỗi đoạn: (cursor bắt đầu, mốc dừng, có lưu tiến độ không). Lần trước dừng giữa chừng thì
+        # lấy bài mới hơn pending trước, sau đó đi tiếp từ resume_cursor xuống đến mốc cũ
+        if resume_cursor:
+            segments = [(0, state.get('pending'), False), (resume_cursor, latest, True)]
+        else:
+            segments = [(0, latest, True)]
+        newest = state.get('pending') if resume_cursor else None
+        new_posts = 0
+        
+        try:
+            for start, stop, checkpoint in segments:
+                for page in self._iter_sync_pages(sec_uid, start):
+                    reached = False
+                    for aweme in page['awemes']:
+                        key = self._post_key(aweme)
+                        if stop is not None and key is not None and self._key_order(key) <= self._key_order(stop):
+                            if aweme.get('is_top'):
+                                continue
+                            reached = True
+                            break
+                        if key is not None and (newest is None or self._key_order(key) > self._key_order(newest)):
+                            newest = key
+                        new_posts += 1
+                        yield aweme
+                    if reached:
+                        self._count('reached_mark')
+                        break
+                    if checkpoint and page['has_more'] and newest is not None:
+                        self._defer_mark(self.store.checkpoint, sec_uid, latest, newest, page['max_cursor'])
+        except ProfileSyncError as e:
+            print(f"{e}, giữ mốc đồng bộ cũ")
+            return
+        
+        if not new_posts:
+            self._count('up_to_date')
+        if newest is None or (latest is not None and self._key_order(latest) > self._key_order(newest)):
+            newest = latest
+        self._defer_mark(self.store.commit, sec_uid, newest, new_posts)
+    
+    def _defer_mark(self, save, *args):
+        """Ghi nhận một lần lưu mốc đồng bộ, thực hiện khi gọi save_marks()"""
+        with self._marks_lock:
+            self._pending_marks.append((save, args))
+    
+    def has_pending_marks(self) -> bool:
+        """True nếu có mốc đồng bộ chờ save_marks() (vừa duyệt xong một trang / một profile)"""
+        with self._marks_lock:
+            return bool(self._pending_marks)
+    
+    def save_marks(self) -> int:
+        """
+        Lưu các mốc đồng bộ đang chờ vào store
+        
+        Chỉ gọi khi mọi link iter_links đã trả về đều đã được lưu lại (ví dụ đã vào
+        JobQueue): mốc của một trang được ghi nhận sau khi toàn bộ bài của trang đã trả về.
+        
+        Returns:
+            Số lần lưu mốc đã thực hiện
+        """
+        with self._marks_lock:
+            pending, self._pending_marks = self._pending_marks, []
+        for save, args in pending:
+            save(*args)
+        return len(pending)
+    
+    def _iter_sync_pages(self, sec_uid: str, max_cursor: int) -> Iterator[Dict]:
+        """Trang đầu lấy trực tiếp, từ trang 2 mới lấy trước bằng iter_pages"""
+        page = self.fetch_page(sec_uid, max_cursor)
+        if page is None:
+            raise ProfileSyncError(f"Không lấy được danh sách bài của {sec_uid}")
+        yield page
+        if page['has_more'] and page['max_cursor'] != max_cursor:
+            for page in self.iter_pages(sec_uid, page['max_cursor']):
+                yield page
+                if not page['has_more']:
+                    return
+            # iter_pages dừng khi API lỗi: không được lưu mốc mới
+            if page['has_more']:
+                raise ProfileSyncError(f"Không lấy hết danh sách bài của {sec_uid}")
+    
+    @staticmethod
+    def _post_key(aweme: Dict) -> Optional[Tuple[int, str]]:
+        """(create_time, aweme_id) của bài, None nếu thiếu"""
+        aweme_id = aweme.get('aweme_id')
+        create_time = aweme.get('create_time')
+        if not aweme_id or create_time is None:
+            return None
+        return int(create_time), str(aweme_id)
+    
+    @staticmethod
+    def _key_order(key: Tuple[int, str]) -> Tuple[int, int]:
+        """Khóa so sánh: theo create_time, cùng thời điểm thì theo aweme_id (số)"""
+        create_time, aweme_id = key
+        return create_time, int(aweme_id) if str(aweme_id).isdigit() else 0
+    
+    def _count(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê
+        
+        Returns:
+            Dict gồm profiles, pages, posts, videos (bài video hoặc ảnh), no_video (bài không tải được), errors,
+            up_to_date (profile không có bài mới), reached_mark (profile dừng ở bài đã thấy)
+        """
+        with self._stats_lock:
+            return dict(self._stats)
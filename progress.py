@@ -0,0 +1,246 @@
+"""
+Progress Module
+Theo dõi số byte đã nhận, tốc độ và thời gian còn lại của từng lượt tải và của cả batch
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+
+
+class TransferStalled(requests.exceptions.ConnectionError):
+    """Không nhận được byte nào trong stall_timeout giây (được thử lại như lỗi kết nối)"""
+
+
+class TransferProgress:
+    """
+    Tiến độ của một lượt tải
+    
+    add() được gọi sau mỗi chunk nên chỉ cộng dồn; callback chỉ được gọi
+    tối đa một lần mỗi interval giây để không làm chậm vòng ghi file.
+    """
+    
+    # Hệ số làm mượt tốc độ (EWMA), càng lớn càng bám sát tốc độ tức thời
+    SMOOTHING = 0.3
+    
+    def __init__(self, tracker: "ProgressTracker", job: str, video_id: Optional[str] = None,
+                 file_name: Optional[str] = None):
+        """
+        Khởi tạo TransferProgress (dùng ProgressTracker.start thay vì gọi trực tiếp)
+        
+        Args:
+            tracker: ProgressTracker quản lý lượt tải này
+            job: Khóa của job (link gốc hoặc đường dẫn file)
+            video_id: ID video (tùy chọn)
+            file_name: Tên file đang ghi (tùy chọn)
+        """
+        self.tracker = tracker
+        self.job = job
+        self.video_id = video_id
+        self.file_name = file_name
+        self.state = "downloading"
+        self.received = 0
+        self.total: Optional[int] = None
+        self.speed = 0.0
+        self.avg_speed = 0.0
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._started = now
+        self._last_byte = now
+        self._last_emit = now
+        self._emitted_bytes = 0
+    
+    def reset(self, received: int = 0, total: Optional[int] = None):
+        """
+        Đặt lại tiến độ khi bắt đầu (hoặc tải tiếp) một lần thử
+        
+        Args:
+            received: Số byte đã có sẵn trong file .part
+            total: Tổng kích thước (Content-Length / Content-Range), None nếu chưa biết
+        """
+        with self._lock:
+            self.received = received
+            self._emitted_bytes = received
+            if total is not None:
+                self.total = total
+            self._last_byte = time.monotonic()
+    
+    def add(self, num_bytes: int):
+        """Cộng số byte vừa ghi (có thể gọi từ nhiều luồng khi tải nhiều đoạn)"""
+        now = time.monotonic()
+        with self._lock:
+            self.received += num_bytes
+            self._last_byte = now
+            if now - self._last_emit < self.tracker.interval:
+                return
+            self._update_speed(now)
+        self.tracker.emit(self)
+    
+    def _update_speed(self, now: float):
+        """Tính tốc độ tức thời từ lần emit trước và cập nhật tốc độ trung bình (gọi khi giữ lock)"""
+        elapsed = now - self._last_emit
+        if elapsed <= 0:
+            return
+        self.speed = max(0, self.received - self._emitted_bytes) / elapsed
+        if self.avg_speed:
+            self.avg_speed += self.SMOOTHING * (self.speed - self.avg_speed)
+        else:
+            self.avg_speed = self.speed
+        self._last_emit = now
+        self._emitted_bytes = self.received
+    
+    def stalled_for(self) -> float:
+        """Số giây kể từ byte cuối cùng nhận được"""
+        return time.monotonic() - self._last_byte
+    
+    def finish(self, state: str):
+        """
+        Kết thúc lượt tải và gửi cập nhật cuối cùng
+        
+        Args:
+            state: "done", "failed" hoặc "stalled"
+        """
+        with self._lock:
+            self.state = state
+            self._update_speed(time.monotonic())
+        self.tracker.finish(self)
+    
+    def snapshot(self) -> Dict:
+        """
+        Trạng thái hiện tại
+        
+        Returns:
+            Dict gồm job, video_id, file, state, received, total, percent,
+            speed (byte/s tức thời), avg_speed (byte/s đã làm mượt), eta (giây),
+            elapsed, stalled_for (giây) và stalled (True nếu đã lâu không nhận byte nào)
+        """
+        with self._lock:
+            received, total = self.received, self.total
+            stalled_for = self.stalled_for()
+            # Đang không nhận được byte nào: tốc độ cũ không còn đúng
+            stalled = self.state == "downloading" and stalled_for > self.tracker.stall_after
+            speed = 0.0 if stalled else self.speed
+            avg_speed = 0.0 if stalled else self.avg_speed
+            snapshot = {
+                'job': self.job,
+                'video_id': self.video_id,
+                'file': self.file_name,
+                'state': self.state,
+                'received': received,
+                'total': total,
+                'percent': received / total * 100 if total else None,
+                'speed': speed,
+                'avg_speed': avg_speed,
+                'elapsed': time.monotonic() - self._started,
+                'stalled_for': stalled_for,
+                'stalled': stalled
+            }
+        snapshot['eta'] = (total - received) / avg_speed if total and avg_speed > 0 else None
+        return snapshot
+
+
+class ProgressTracker:
+    """
+    Quản lý tiến độ của các lượt tải đang chạy và tổng hợp cho cả batch
+    
+    Callback nhận snapshot của TransferProgress và được gọi từ luồng tải,
+    nên giao diện cần tự chuyển sang main thread (ví dụ đẩy vào hàng đợi).
+    """
+    
+    def __init__(self, callback: Optional[Callable[[Dict], None]] = None, interval: float = 0.5):
+        """
+        Khởi tạo ProgressTracker
+        
+        Args:
+            callback: Hàm nhận snapshot tiến độ (tùy chọn)
+            interval: Khoảng cách tối thiểu giữa hai lần gọi callback cho cùng một job (giây)
+        """
+        self.callback = callback
+        self.interval = float(interval)
+        # Quá số giây này không nhận byte nào thì coi là đang đứng (chỉ để hiển thị)
+        self.stall_after = max(2 * self.interval, 2.0)
+        self._lock = threading.Lock()
+        self._active: Dict[int, TransferProgress] = {}
+        self._stats = {'completed': 0, 'failed': 0, 'aborted_stalled': 0, 'bytes': 0}
+    
+    def start(self, job: str, video_id: Optional[str] = None,
+              file_name: Optional[str] = None) -> TransferProgress:
+        """
+        Bắt đầu theo dõi một lượt tải
+        
+        Args:
+            job: Khóa của job (link gốc hoặc đường dẫn file)
+            video_id: ID video (tùy chọn)
+            file_name: Tên file đang ghi (tùy chọn)
+        
+        Returns:
+            TransferProgress để cập nhật số byte
+        """
+        transfer = TransferProgress(self, job, video_id, file_name)
+        with self._lock:
+            self._active[id(transfer)] = transfer
+        return transfer
+    
+    def emit(self, transfer: TransferProgress):
+        """Gửi snapshot của một lượt tải tới callback"""
+        if self.callback:
+            try:
+                self.callback(transfer.snapshot())
+            except Exception as e:
+                print(f"Lỗi trong callback tiến độ: {e}")
+    
+    def finish(self, transfer: TransferProgress):
+        """Ngừng theo dõi một lượt tải và gửi cập nhật cuối cùng"""
+        with self._lock:
+            self._active.pop(id(transfer), None)
+            key = {'done': 'completed', 'stalled': 'aborted_stalled'}.get(transfer.state, 'failed')
+            self._stats[key] += 1
+            self._stats['bytes'] += transfer.received
+        self.emit(transfer)
+    
+    def aggregate(self) -> Dict:
+        """
+        Tổng hợp các lượt tải đang chạy
+        
+        Returns:
+            Dict gồm active (số lượt đang tải), received, total (tổng kích thước đã biết),
+            speed (tổng tốc độ đã làm mượt, byte/s), eta (giây, None nếu chưa ước lượng được),
+            stalled (số lượt đang đứng, không nhận byte nào), completed, failed,
+            aborted_stalled (bị hủy vì đứng quá stall_timeout), bytes (tổng byte của các lượt đã kết thúc)
+        """
+        with self._lock:
+            transfers = list(self._active.values())
+            stats = dict(self._stats)
+        snapshots = [transfer.snapshot() for transfer in transfers]
+        remaining = sum(s['total'] - s['received'] for s in snapshots if s['total'])
+        speed = sum(s['avg_speed'] for s in snapshots)
+        stats.update({
+            'active': len(snapshots),
+            'received': sum(s['received'] for s in snapshots),
+            'total': sum(s['total'] for s in snapshots if s['total']),
+            'speed': speed,
+            'eta': remaining / speed if speed > 0 else None,
+            'stalled': sum(1 for s in snapshots if s['stalled'])
+        })
+        return stats
+
+
+def format_bytes(num_bytes: float) -> str:
+    """Định dạng số byte dễ đọc (B, KB, MB, GB)"""
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.2f} GB"
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    """Định dạng thời gian còn lại (m:ss hoặc h:mm:ss), "--" nếu chưa biết"""
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
@@ -0,0 +1,209 @@
+"""
+Retry Policy Module
+Chính sách thử lại (backoff + jitter) và giới hạn tốc độ gọi API thích ứng với 429/403
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import requests
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Đọc header Retry-After (số giây hoặc ngày giờ HTTP)
+    
+    Args:
+        value: Giá trị header
+    
+    Returns:
+        Số giây cần chờ hoặc None nếu không đọc được
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Quyết định lỗi nào được thử lại và chờ bao lâu giữa các lần thử"""
+    
+    # Status code tạm thời, nên thử lại
+    RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+    # Status code cho thấy bị giới hạn tốc độ / chặn tạm thời
+    THROTTLE_STATUS = {403, 429}
+    
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        """
+        Khởi tạo RetryPolicy
+        
+        Args:
+            max_attempts: Tổng số lần thử (gồm lần đầu)
+            base_delay: Thời gian chờ cơ sở cho lần thử lại đầu tiên (giây)
+            max_delay: Thời gian chờ tối đa giữa hai lần thử (giây)
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+    
+    @classmethod
+    def from_settings(cls, settings: Dict) -> "RetryPolicy":
+        """Tạo RetryPolicy từ phần settings trong config.json"""
+        return cls(
+            max_attempts=settings.get("retry_attempts", 4),
+            base_delay=settings.get("retry_base_delay", 1.0),
+            max_delay=settings.get("retry_max_delay", 30.0)
+        )
+    
+    def is_retryable_status(self, status_code: int) -> bool:
+        """Status code có nên thử lại không (403 được coi là bị chặn tạm thời)"""
+        return status_code in self.RETRYABLE_STATUS or status_code in self.THROTTLE_STATUS
+    
+    def is_retryable_error(self, error: Exception) -> bool:
+        """
+        Exception có nên thử lại không
+        
+        Lỗi kết nối, timeout, stream bị ngắt là tạm thời; lỗi HTTP xét theo status code;
+        URL sai, thiếu schema... là lỗi vĩnh viễn.
+        """
+        if isinstance(error, requests.exceptions.HTTPError):
+            response = error.response
+            return response is None or self.is_retryable_status(response.status_code)
+        return isinstance(error, (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.ContentDecodingError,
+            ValueError
+        )) and not isinstance(error, (
+            requests.exceptions.InvalidURL,
+            requests.exceptions.MissingSchema,
+            requests.exceptions.InvalidSchema
+        ))
+    
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Thời gian chờ trước lần thử lại thứ attempt (bắt đầu từ 1)
+        
+        Dùng exponential backoff với full jitter; nếu server gửi Retry-After
+        thì chờ ít nhất bằng giá trị đó.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** max(0, attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket dùng chung cho các request API
+    
+    Khi gặp 429/403 thì giảm tốc độ một nửa và tạm dừng theo Retry-After;
+    sau đó mỗi request thành công tăng dần tốc độ trở lại mức tối đa.
+    """
+    
+    # Tỷ lệ tăng tốc độ sau mỗi request thành công (so với tốc độ tối đa)
+    RAMP_UP_STEP = 0.05
+    # Khoảng thời gian chỉ giảm tốc độ một lần dù nhiều request cùng bị 429 (giây)
+    DECREASE_WINDOW = 2.0
+    # Thời gian tạm dừng mặc định khi không có Retry-After (giây)
+    DEFAULT_PAUSE = 2.0
+    
+    def __init__(self, rate: float = 2.0, burst: int = 4, min_rate: float = 0.1):
+        """
+        Khởi tạo AdaptiveRateLimiter
+        
+        Args:
+            rate: Số request tối đa mỗi giây
+            burst: Số request được gửi dồn cùng lúc
+            min_rate: Tốc độ thấp nhất khi bị giảm liên tục
+        """
+        self.max_rate = max(float(rate), 0.01)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = max(1, int(burst))
+        self._rate = self.max_rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'throttle_events': 0, 'waits': 0, 'wait_seconds': 0.0}
+    
+    @property
+    def rate(self) -> float:
+        """Tốc độ hiện tại (request/giây)"""
+        return self._rate
+    
+    def set_rate(self, rate: float):
+        """Đổi tốc độ tối đa khi đang chạy"""
+        with self._lock:
+            self.max_rate = max(float(rate), 0.01)
+            self._rate = min(self._rate, self.max_rate)
+    
+    def acquire(self) -> float:
+        """
+        Chờ đến khi được phép gửi một request
+        
+        Returns:
+            Số giây đã phải chờ
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    if waited > 0:
+                        self._stats['waits'] += 1
+                        self._stats['wait_seconds'] += waited
+                    return waited
+                wait = max(self._paused_until - now, (1 - self._tokens) / self._rate)
+            time.sleep(wait)
+            waited += wait
+    
+    def on_success(self):
+        """Request thành công: tăng dần tốc độ về mức tối đa"""
+        with self._lock:
+            if time.monotonic() >= self._paused_until:
+                self._rate = min(self.max_rate, self._rate + self.max_rate * self.RAMP_UP_STEP)
+    
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """
+        Request bị 429/403: giảm tốc độ và tạm dừng
+        
+        Args:
+            retry_after: Số giây server yêu cầu chờ (header Retry-After)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._stats['throttle_events'] += 1
+            pause = retry_after if retry_after is not None else self.DEFAULT_PAUSE
+            self._paused_until = max(self._paused_until, now + pause)
+            if now - self._last_decrease >= self.DECREASE_WINDOW:
+                self._rate = max(self.min_rate, self._rate / 2)
+                self._last_decrease = now
+            self._tokens = min(self._tokens, 0.0)
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê
+        
+        Returns:
+            Dict gồm rate hiện tại, max_rate, throttle_events, waits, wait_seconds
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['rate'] = self._rate
+            stats['max_rate'] = self.max_rate
+        return stats
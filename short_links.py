@@ -0,0 +1,253 @@
+"""
+Short Link Module
+Phân giải link rút gọn (v.douyin.com/xxxx) ra video ID, có cache lâu dài trong SQLite
+"""
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+
+class RedirectCache:
+    """
+    Cache ánh xạ link rút gọn -> video ID
+    
+    Link rút gọn đã chia sẻ không đổi đích nên bản ghi được giữ lâu dài;
+    chỉ lưu kết quả thành công, link lỗi sẽ được thử lại ở lần sau.
+    """
+    
+    FILENAME = ".douyin_redirects.sqlite3"
+    
+    def __init__(self, db_path: str):
+        """
+        Khởi tạo RedirectCache
+        
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0}
+        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS short_links ("
+            " short_url TEXT PRIMARY KEY,"
+            " video_id TEXT NOT NULL,"
+            " resolved_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+    
+    @classmethod
+    def for_folder(cls, download_folder: str) -> "RedirectCache":
+        """Tạo cache nằm trong thư mục tải về"""
+        return cls(os.path.join(download_folder, cls.FILENAME))
+    
+    def get(self, short_url: str) -> Optional[str]:
+        """
+        Tra video ID của link rút gọn
+        
+        Args:
+            short_url: Link rút gọn đã chuẩn hóa
+        
+        Returns:
+            Video ID hoặc None nếu chưa có trong cache
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_id FROM short_links WHERE short_url = ?", (short_url,)
+            ).fetchone()
+            self._stats['hits' if row else 'misses'] += 1
+        return row[0] if row else None
+    
+    def put(self, short_url: str, video_id: str):
+        """Lưu video ID của link rút gọn"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO short_links (short_url, video_id, resolved_at)"
+                " VALUES (?, ?, ?)",
+                (short_url, video_id, time.time())
+            )
+            self._conn.commit()
+            self._stats['stored'] += 1
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê cache
+        
+        Returns:
+            Dict gồm hits, misses, stored (ghi mới trong phiên này), entries
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = self._conn.execute("SELECT COUNT(*) FROM short_links").fetchone()[0]
+        return stats
+    
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class ShortLinkResolver:
+    """
+    Theo redirect của link rút gọn đến link video để lấy video ID
+    
+    Mỗi bước chỉ gửi HEAD (hoặc GET không đọc body nếu server không hỗ trợ HEAD)
+    và dừng ngay khi Location đã chứa video ID, không tải trang đích.
+    """
+    
+    # Host của link rút gọn
+    SHORT_HOSTS = ('v.douyin.com', 'v.iesdouyin.com')
+    # Tìm video ID trong link đích (www.douyin.com/video/..., iesdouyin.com/share/video/..., /note/... của bài ảnh)
+    VIDEO_ID_PATTERN = re.compile(r'/(?:video|note)/(\d+)')
+    # Số redirect tối đa cho một link
+    MAX_REDIRECTS = 5
+    
+    def __init__(self, session: requests.Session, cache: Optional[RedirectCache] = None,
+                 max_workers: int = 8, timeout: float = 10):
+        """
+        Khởi tạo ShortLinkResolver
+        
+        Args:
+            session: Session HTTP dùng chung (đã có header/cookie)
+            cache: Cache ánh xạ link rút gọn -> video ID (tùy chọn)
+            max_workers: Số luồng phân giải song song trong resolve_many
+            timeout: Timeout mỗi request (giây)
+        """
+        self.session = session
+        self.cache = cache
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {'resolved': 0, 'failed': 0, 'requests': 0}
+    
+    def is_short_link(self, url: str) -> bool:
+        """Link có phải link rút gọn không"""
+        return urlparse(url).netloc.lower() in self.SHORT_HOSTS
+    
+    def cached_video_id(self, url: str) -> Optional[str]:
+        """Video ID của link rút gọn nếu đã có trong cache (không gọi mạng)"""
+        return self.cache.get(self._cache_key(url)) if self.cache else None
+    
+    def resolve(self, url: str) -> Optional[str]:
+        """
+        Phân giải một link rút gọn
+        
+        Args:
+            url: Link rút gọn (v.douyin.com/xxxx)
+        
+        Returns:
+            Video ID hoặc None nếu không phân giải được
+        """
+        return self.cached_video_id(url) or self._resolve_uncached(url)
+    
+    def _resolve_uncached(self, url: str) -> Optional[str]:
+        """Phân giải qua mạng và lưu kết quả vào cache"""
+        try:
+            video_id = self._follow(url)
+        except requests.exceptions.RequestException as e:
+            print(f"Lỗi khi phân giải link rút gọn {url}: {e}")
+            video_id = None
+        
+        with self._lock:
+            self._stats['resolved' if video_id else 'failed'] += 1
+        if video_id and self.cache:
+            self.cache.put(self._cache_key(url), video_id)
+        return video_id
+    
+    def resolve_many(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Phân giải nhiều link rút gọn song song
+        
+        Link đã có trong cache được trả ngay, chỉ link chưa biết mới gọi mạng.
+        
+        Args:
+            urls: Danh sách link rút gọn
+        
+        Returns:
+            Dict {link: video ID hoặc None}
+        """
+        results: Dict[str, Optional[str]] = {}
+        pending = queue.Queue()
+        for url in urls:
+            if url in results:
+                continue
+            results[url] = self.cached_video_id(url)
+            if results[url] is None:
+                pending.put(url)
+        
+        def worker():
+            while True:
+                try:
+                    url = pending.get_nowait()
+                except queue.Empty:
+                    return
+                results[url] = self._resolve_uncached(url)
+        
+        threads = [
+            threading.Thread(target=worker, daemon=True)
+            for _ in range(min(self.max_workers, pending.qsize()))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    def _follow(self, url: str) -> Optional[str]:
+        """Theo từng bước redirect đến khi thấy video ID"""
+        for _ in range(self.MAX_REDIRECTS):
+            match = self.VIDEO_ID_PATTERN.search(urlparse(url).path)
+            if match:
+                return match.group(1)
+            
+            response = self._request(url)
+            location = response.headers.get('Location')
+            if not response.is_redirect or not location:
+                # Không còn redirect: link đích cuối cùng là URL hiện tại
+                match = self.VIDEO_ID_PATTERN.search(urlparse(response.url).path)
+                return match.group(1) if match else None
+            url = urljoin(url, location)
+        return None
+    
+    def _request(self, url: str) -> requests.Response:
+        """Gửi HEAD, nếu server không hỗ trợ thì GET nhưng không đọc body"""
+        with self._lock:
+            self._stats['requests'] += 1
+        response = self.session.head(url, allow_redirects=False, timeout=self.timeout)
+        if response.status_code in (405, 501):
+            response = self.session.get(url, allow_redirects=False, stream=True, timeout=self.timeout)
+            response.close()
+        return response
+    
+    @staticmethod
+    def _cache_key(url: str) -> str:
+        """Khóa cache: host + path, bỏ query và dấu / cuối"""
+        parsed = urlparse(url)
+        return f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}"
+    
+    def get_stats(self) -> Dict:
+        """
+        Lấy thống kê
+        
+        Returns:
+            Dict gồm resolved, failed, requests (số request HTTP đã gửi)
+            và cache (thống kê RedirectCache nếu có)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        if self.cache:
+            stats['cache'] = self.cache.get_stats()
+        return stats
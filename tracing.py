@@ -0,0 +1,279 @@
+"""
+Tracing Module
+Đo thời gian từng giai đoạn của mỗi job, ghi trace JSONL và tổng hợp percentile cuối lượt chạy
+"""
+
+import heapq
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class _NullSpan:
+    """Span không làm gì, dùng khi tắt trace"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Đo thời gian một đoạn code và cộng vào giai đoạn tương ứng của job"""
+    
+    __slots__ = ('job', 'stage', 'started')
+    
+    def __init__(self, job: "JobTrace", stage: str):
+        self.job = job
+        self.stage = stage
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.job.add_time(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class JobTrace:
+    """Thời gian theo giai đoạn, số byte và bộ đếm của một job"""
+    
+    def __init__(self, job: str):
+        """
+        Khởi tạo JobTrace
+        
+        Args:
+            job: Khóa của job (link gốc)
+        """
+        self.job = job
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def add_time(self, stage: str, seconds: float):
+        """Cộng thời gian vào một giai đoạn (giai đoạn lặp lại khi thử lại được cộng dồn)"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def add_count(self, key: str, value: int = 1):
+        """Cộng bộ đếm (bytes, số request...)"""
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + value
+
+
+class Tracer:
+    """
+    Ghi trace theo job ra file JSONL (mỗi job xong một dòng)
+    
+    Khi không có đường dẫn trace thì mọi hàm trả về ngay, span() trả về
+    một context manager dùng chung không làm gì nên gần như không tốn chi phí.
+    Job được gắn vào luồng hiện tại (attach) để các hàm sâu bên trong
+    ghi vào đúng job mà không cần truyền tham số.
+    """
+    
+    # Số job chậm nhất giữ lại trong bản tổng hợp
+    SLOWEST_JOBS = 10
+    # Các percentile trong bản tổng hợp
+    PERCENTILES = (50, 90, 99)
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Khởi tạo Tracer
+        
+        Args:
+            path: File JSONL ghi trace (None = tắt)
+        """
+        self.path = path
+        self.enabled = bool(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open_jobs: Dict[str, JobTrace] = {}
+        self._durations: Dict[str, List[float]] = {}
+        self._slowest: List[tuple] = []
+        self._jobs = 0
+        self._file = open(path, 'a', encoding='utf-8') if self.enabled else None
+    
+    def begin(self, job: str) -> Optional[JobTrace]:
+        """
+        Bắt đầu (hoặc tiếp tục) trace của một job và gắn vào luồng hiện tại
+        
+        Ở chế độ pipeline, resolve và fetch chạy trên hai luồng khác nhau:
+        fetch gọi lại begin với cùng khóa để nối tiếp trace đã có.
+        
+        Args:
+            job: Khóa của job (link gốc)
+        
+        Returns:
+            JobTrace, None nếu đang tắt trace
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            trace = self._open_jobs.get(job)
+            if trace is None:
+                trace = self._open_jobs[job] = JobTrace(job)
+        self._local.job = trace
+        return trace
+    
+    def current(self) -> Optional[JobTrace]:
+        """JobTrace đang gắn với luồng hiện tại"""
+        return getattr(self._local, 'job', None) if self.enabled else None
+    
+    def attach(self, trace: Optional[JobTrace]):
+        """Gắn một JobTrace vào luồng hiện tại (dùng cho luồng con, ví dụ luồng tải từng đoạn)"""
+        if self.enabled:
+            self._local.job = trace
+    
+    def span(self, stage: str):
+        """
+        Context manager đo thời gian một giai đoạn của job hiện tại
+        
+        Args:
+            stage: Tên giai đoạn (normalize, api, cdn_ttfb, transfer...)
+        """
+        trace = self.current()
+        return _Span(trace, stage) if trace is not None else _NULL_SPAN
+    
+    def add_time(self, stage: str, seconds: float):
+        """Cộng thời gian đã đo sẵn vào giai đoạn của job hiện tại"""
+        trace = self.current()
+        if trace is not None:
+            trace.add_time(stage, seconds)
+    
+    def add_count(self, key: str, value: int = 1):
+        """Cộng bộ đếm của job hiện tại"""
+        trace = self.current()
+        if trace is not None:
+            trace.add_count(key, value)
+    
+    def finish(self, job: str, result: Dict):
+        """
+        Kết thúc trace của một job và ghi một dòng JSONL
+        
+        Args:
+            job: Khóa của job
+            result: Dict kết quả của process_video
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            trace = self._open_jobs.pop(job, None)
+        if getattr(self._local, 'job', None) is trace:
+            self._local.job = None
+        if trace is None:
+            return
+        
+        total = time.perf_counter() - trace.started
+        record = {
+            'job': job,
+            'video_id': result.get('video_id'),
+            'success': result.get('success'),
+            'skipped': result.get('skipped'),
+            'error': result.get('error'),
+            'started_at': round(trace.started_at, 3),
+            'total': round(total, 6),
+            'stages': {stage: round(seconds, 6) for stage, seconds in trace.stages.items()},
+            'counts': dict(trace.counts)
+        }
+        for key in ('retries', 'throttled', 'rate_limit_wait', 'stalls'):
+            if result.get(key):
+                record[key] = result[key]
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        
+        with self._lock:
+            self._jobs += 1
+            self._durations.setdefault('total', []).append(total)
+            for stage, seconds in trace.stages.items():
+                self._durations.setdefault(stage, []).append(seconds)
+            entry = (total, job, record['video_id'])
+            if len(self._slowest) < self.SLOWEST_JOBS:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+            if self._file:
+                self._file.write(line)
+    
+    def summary(self) -> Dict:
+        """
+        Tổng hợp các job đã ghi trace
+        
+        Returns:
+            Dict gồm jobs, stages {tên: {count, total, mean, p50, p90, p99, max}}
+            và slowest (các job chậm nhất: job, video_id, total)
+        """
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+            slowest = sorted(self._slowest, reverse=True)
+            jobs = self._jobs
+        
+        stages = {}
+        for stage, values in durations.items():
+            stats = {
+                'count': len(values),
+                'total': round(sum(values), 3),
+                'mean': round(sum(values) / len(values), 6)
+            }
+            for p in self.PERCENTILES:
+                stats[f'p{p}'] = round(self._percentile(values, p), 6)
+            stats['max'] = round(values[-1], 6)
+            stages[stage] = stats
+        return {
+            'jobs': jobs,
+            'stages': stages,
+            'slowest': [
+                {'job': job, 'video_id': video_id, 'total': round(total, 3)}
+                for total, job, video_id in slowest
+            ]
+        }
+    
+    @staticmethod
+    def _percentile(values: List[float], p: float) -> float:
+        """Percentile theo nearest-rank trên danh sách đã sắp xếp"""
+        if not values:
+            return 0.0
+        rank = max(1, -(-len(values) * p // 100))
+        return values[int(rank) - 1]
+    
+    def format_summary(self, summary: Optional[Dict] = None) -> str:
+        """Bản tổng hợp dạng bảng để in ra màn hình"""
+        summary = summary or self.summary()
+        lines = [f"Trace: {summary['jobs']} job"]
+        lines.append(f"{'Giai đoạn':<16}{'Số lần':>8}{'Tổng(s)':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+        stages = sorted(summary['stages'].items(), key=lambda item: -item[1]['total'])
+        for stage, stats in stages:
+            lines.append(
+                f"{stage:<16}{stats['count']:>8}{stats['total']:>10.2f}"
+                f"{stats['p50']:>10.3f}{stats['p90']:>10.3f}{stats['p99']:>10.3f}{stats['max']:>10.3f}"
+            )
+        if summary['slowest']:
+            lines.append("Chậm nhất:")
+            for item in summary['slowest']:
+                lines.append(f"  {item['total']:>8.2f}s  {item['video_id'] or '-'}  {item['job']}")
+        return "\n".join(lines)
+    
+    def close(self) -> Optional[Dict]:
+        """
+        Đóng file trace và lưu bản tổng hợp vào <path>.summary.json
+        
+        Returns:
+            Bản tổng hợp, None nếu đang tắt trace
+        """
+        if not self.enabled:
+            return None
+        summary = self.summary()
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+        with open(self.path + ".summary.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        self.enabled = False
+        return summary
@@ -7,13 +7,31 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
 import os
-from typing import List, Callable, Optional
+from typing import List, Callable, Optional, Dict, Iterator
+from collections import deque
 import queue
 
+from downloader import create_batch_downloader
+from bandwidth import parse_rate
+from job_queue import JobQueue
+from link_import import LinkImporter
+from progress import format_bytes, format_eta
+
 
 class MainWindow:
     """Cửa sổ chính của ứng dụng"""
     
+    # Chu kỳ lấy sự kiện từ worker để cập nhật giao diện (ms)
+    UI_TICK_MS = 100
+    # Số sự kiện tối đa xử lý trong một lần cập nhật
+    MAX_EVENTS_PER_TICK = 5000
+    # Số dòng tối đa giữ trong bảng trạng thái (dòng xong cũ nhất bị ẩn bớt)
+    MAX_STATUS_ROWS = 500
+    # Số link xem trước hiển thị trong text box sau khi import file
+    PREVIEW_LINKS = 20
+    # Số link import được ghi vào hàng đợi mỗi lần (mỗi lô báo tiến độ một lần)
+    IMPORT_BATCH = 500
+    
     def __init__(self, root: tk.Tk, cookie_manager, downloader_class):
         """
         Khởi tạo MainWindow
@@ -27,16 +45,41 @@ class MainWindow:
         self.cookie_manager = cookie_manager
         self.downloader_class = downloader_class
         self.downloader = None
+        self.batch = None
+        # Hàng đợi job lưu trong thư mục tải về (tiếp tục được sau khi tắt app)
+        self.job_queue: Optional[JobQueue] = None
         
         # Trạng thái
         self.is_downloading = False
         self.should_stop = False
         self.download_queue = queue.Queue()
         self.results = []
+        # Link import từ file được ghi thẳng vào hàng đợi, text box chỉ hiện tóm tắt
+        self.link_importer = None
+        self.is_importing = False
+        self.is_queueing = False
+        self.is_draining = False
+        # VideoDownloader không cookie chỉ dùng để chuẩn hóa link (tạo một lần)
+        self.link_normalizer = None
+        
+        # Worker chỉ đẩy sự kiện vào hàng đợi, giao diện lấy ra theo chu kỳ UI_TICK_MS
+        self.ui_events = queue.Queue()
+        # index job -> id dòng trong treeview (chỉ các dòng đang hiển thị)
+        self.row_ids: Dict[int, str] = {}
+        self.finished_rows = {'success': deque(), 'failed': deque()}
+        # link gốc -> index job, và tỷ lệ đã tải (0-1) của các job đang tải
+        self.job_indexes: Dict[str, int] = {}
+        self.active_progress: Dict[str, float] = {}
+        self.total_jobs = 0
+        self.success_count = 0
+        self.failed_count = 0
+        self.duplicate_count = 0
+        self.stopped_count = 0
         
         # Thiết lập giao diện
         self._setup_ui()
         self._load_saved_cookie()
+        self._show_unfinished_jobs()
     
     def _setup_ui(self):
         """Thiết lập giao diện"""
@@ -60,7 +103,7 @@ class MainWindow:
         cookie_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
         cookie_frame.columnconfigure(0, weight=1)
         
-        ttk.Label(cookie_frame, text="Nhập cookie Douyin:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        ttk.Label(cookie_frame, text="Nhập cookie Douyin (nhiều tài khoản: mỗi dòng một cookie):").grid(row=0, column=0, sticky=tk.W, pady=5)
         
         self.cookie_text = scrolledtext.ScrolledText(cookie_frame, height=4, wrap=tk.WORD)
         self.cookie_text.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=5)
@@ -111,9 +154,24 @@ class MainWindow:
         self.stop_btn = ttk.Button(download_buttons, text="Dừng", command=self._stop_download, state=tk.DISABLED)
         self.stop_btn.pack(side=tk.LEFT, padx=5)
         
+        self.pause_btn = ttk.Button(download_buttons, text="Tạm dừng", command=self._toggle_pause, state=tk.DISABLED)
+        self.pause_btn.pack(side=tk.LEFT, padx=5)
+        
         self.select_folder_btn = ttk.Button(download_buttons, text="Chọn thư mục", command=self._select_folder)
         self.select_folder_btn.pack(side=tk.LEFT, padx=5)
         
+        # Giới hạn băng thông (KB/s), đổi được cả khi đang tải
+        ttk.Label(download_buttons, text="Giới hạn (KB/s, 0 = không):").pack(side=tk.LEFT, padx=(15, 5))
+        limit = self.cookie_manager.get_setting("bandwidth_limit", 0)
+        self.limit_var = tk.StringVar(value=str(int(parse_rate(limit) // 1024)))
+        self.limit_spin = ttk.Spinbox(
+            download_buttons, from_=0, to=1000000, increment=256, width=8,
+            textvariable=self.limit_var, command=self._apply_bandwidth_limit
+        )
+        self.limit_spin.pack(side=tk.LEFT)
+        self.limit_spin.bind('<Return>', lambda e: self._apply_bandwidth_limit())
+        self.limit_spin.bind('<FocusOut>', lambda e: self._apply_bandwidth_limit())
+        
         # Progress bar
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(download_frame, variable=self.progress_var, maximum=100, length=400)
@@ -151,20 +209,38 @@ class MainWindow:
     
     def _load_saved_cookie(self):
         """Tải cookie đã lưu vào ô nhập"""
-        cookie = self.cookie_manager.get_cookie()
-        if cookie:
-            self.cookie_text.insert('1.0', cookie)
-            self.cookie_status_label.config(text="✓ Đã tải cookie đã lưu", foreground="green")
+        cookies = self.cookie_manager.get_cookies()
+        if cookies:
+            self.cookie_text.insert('1.0', "\n".join(cookies))
+            text = "✓ Đã tải cookie đã lưu" + (f" ({len(cookies)} tài khoản)" if len(cookies) > 1 else "")
+            self.cookie_status_label.config(text=text, foreground="green")
+    
+    def _show_unfinished_jobs(self):
+        """Báo số link chưa tải xong còn trong hàng đợi từ lần chạy trước"""
+        download_folder = self.cookie_manager.get_download_folder()
+        if not os.path.exists(os.path.join(download_folder, JobQueue.FILENAME)):
+            return
+        try:
+            job_queue = JobQueue.for_folder(download_folder)
+        except Exception as e:
+            print(f"Không mở được hàng đợi: {e}")
+            return
+        pending = job_queue.count(JobQueue.PENDING)
+        job_queue.close()
+        if pending:
+            self.progress_label.config(
+                text=f"Còn {pending} link chưa tải xong từ lần trước, bấm \"Bắt đầu tải\" để tiếp tục"
+            )
     
     def _save_cookie(self):
-        """Lưu cookie"""
-        cookie = self.cookie_text.get('1.0', tk.END).strip()
+        """Lưu cookie (mỗi dòng một tài khoản)"""
+        cookies = [line.strip() for line in self.cookie_text.get('1.0', tk.END).split('\n') if line.strip()]
         
-        if not cookie:
+        if not cookies:
             messagebox.showwarning("Cảnh báo", "Vui lòng nhập cookie!")
             return
         
-        if not self.cookie_manager.validate_cookie(cookie):
+        if not all(self.cookie_manager.validate_cookie(cookie) for cookie in cookies):
             result = messagebox.askyesno(
                 "Cảnh báo",
                 "Cookie có vẻ không hợp lệ. Bạn có muốn tiếp tục lưu không?"
@@ -172,8 +248,9 @@ class MainWindow:
             if not result:
                 return
         
-        if self.cookie_manager.save_cookie(cookie):
-            self.cookie_status_label.config(text="✓ Cookie đã được lưu", foreground="green")
+        if self.cookie_manager.save_cookies(cookies):
+            text = "✓ Cookie đã được lưu" + (f" ({len(cookies)} tài khoản)" if len(cookies) > 1 else "")
+            self.cookie_status_label.config(text=text, foreground="green")
             messagebox.showinfo("Thành công", "Cookie đã được lưu thành công!")
         else:
             self.cookie_status_label.config(text="✗ Lỗi khi lưu cookie", foreground="red")
@@ -186,18 +263,112 @@ class MainWindow:
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
         )
         
-        if file_path:
+        if not file_path:
+            return
+        
+        # Đọc, chuẩn hóa và ghi vào hàng đợi trên thread riêng, tiến độ báo qua ui_events
+        if self.link_importer is None:
+            self.link_importer = LinkImporter(self._get_link_normalizer())
+        self.is_importing = True
+        self.import_btn.config(state=tk.DISABLED)
+        self.clear_links_btn.config(state=tk.DISABLED)
+        self.start_btn.config(state=tk.DISABLED)
+        self.progress_label.config(text=f"Đang import {os.path.basename(file_path)}...")
+        thread = threading.Thread(target=self._import_worker, args=(file_path,), daemon=True)
+        thread.start()
+        self._schedule_drain()
+    
+    def _import_worker(self, file_path: str):
+        """
+        Worker thread đọc file link theo từng dòng và ghi vào hàng đợi theo từng lô
+        
+        Lọc trùng cả với các file đã import trước (dùng chung link_importer);
+        chỉ giữ PREVIEW_LINKS link đầu để hiển thị, không giữ cả danh sách.
+        """
+        name = os.path.basename(file_path)
+        before = self.link_importer.get_stats()
+        preview = []
+        count = 0
+        try:
+            job_queue = JobQueue.for_folder(self.cookie_manager.get_download_folder())
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    self.links_text.insert('1.0', content)
-                messagebox.showinfo("Thành công", f"Đã import {len(content.splitlines())} link!")
-            except Exception as e:
-                messagebox.showerror("Lỗi", f"Không thể đọc file: {e}")
+                batch = []
+                for link in self.link_importer.iter_links(self._read_lines(file_path)):
+                    if len(preview) < self.PREVIEW_LINKS:
+                        preview.append(link)
+                    batch.append(link)
+                    if len(batch) >= self.IMPORT_BATCH:
+                        job_queue.add(batch, requeue_done=True)
+                        count += len(batch)
+                        batch = []
+                        self.ui_events.put(('import_progress', name, count))
+                job_queue.add(batch, requeue_done=True)
+                count += len(batch)
+            finally:
+                job_queue.close()
+        except Exception as e:
+            self.ui_events.put(('import_failed', str(e), count))
+            return
+        after = self.link_importer.get_stats()
+        stats = {key: after[key] - before[key] for key in ('duplicates', 'invalid')}
+        self.ui_events.put(('imported', name, count, preview, stats))
+    
+    def _on_links_imported(self, name: str, count: int, preview: List[str], stats: Dict):
+        """Hiển thị kết quả import (chạy trên main thread)"""
+        self._import_finished()
+        
+        # Text box chỉ hiện tóm tắt và vài link đầu (dạng comment, không bị thêm lại)
+        lines = [f"# Import {name}: {count} link đã thêm vào hàng đợi"]
+        lines += [f"#   {link}" for link in preview]
+        if count > len(preview):
+            lines.append(f"#   ... và {count - len(preview)} link nữa")
+        self.links_text.insert(tk.END, "\n".join(lines) + "\n")
+        self.progress_label.config(text=f"Đã import {count} link, bấm \"Bắt đầu tải\" để tải")
+        
+        messagebox.showinfo(
+            "Thành công",
+            f"Đã import {count} link vào hàng đợi!\n\n"
+            f"Trùng lặp: {stats['duplicates']}\n"
+            f"Không hợp lệ: {stats['invalid']}"
+        )
+    
+    def _import_finished(self):
+        """Mở lại các nút sau khi import xong hoặc lỗi"""
+        self.is_importing = False
+        self.import_btn.config(state=tk.NORMAL)
+        self.clear_links_btn.config(state=tk.NORMAL)
+        self.start_btn.config(state=tk.NORMAL)
+    
+    @staticmethod
+    def _read_lines(file_path: str):
+        """Đọc file theo từng dòng (không nạp cả file vào bộ nhớ)"""
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                yield line
     
     def _clear_links(self):
-        """Xóa tất cả link"""
+        """Xóa tất cả link (hỏi trước khi xóa cả các link đang chờ trong hàng đợi)"""
         self.links_text.delete('1.0', tk.END)
+        self.link_importer = None
+        if self.is_downloading or self.is_queueing:
+            return
+        download_folder = self.cookie_manager.get_download_folder()
+        if not os.path.exists(os.path.join(download_folder, JobQueue.FILENAME)):
+            return
+        try:
+            job_queue = JobQueue.for_folder(download_folder)
+        except Exception as e:
+            print(f"Không mở được hàng đợi: {e}")
+            return
+        try:
+            pending = job_queue.count(JobQueue.PENDING)
+            if pending and messagebox.askyesno(
+                "Xác nhận", f"Xóa cả {pending} link đã import / chưa tải đang chờ trong hàng đợi?"
+            ):
+                job_queue.clear_pending()
+                self.progress_label.config(text="Sẵn sàng")
+        finally:
+            job_queue.close()
     
     def _select_folder(self):
         """Chọn thư mục lưu video"""
@@ -206,103 +377,343 @@ class MainWindow:
             self.cookie_manager.set_download_folder(folder)
             messagebox.showinfo("Thành công", f"Đã chọn thư mục: {folder}")
     
-    def _get_links(self) -> List[str]:
-        """Lấy danh sách link từ text box"""
-        content = self.links_text.get('1.0', tk.END).strip()
-        if not content:
-            return []
-        
-        links = [line.strip() for line in content.split('\n') if line.strip()]
-        return links
+    def _apply_bandwidth_limit(self):
+        """Lưu giới hạn băng thông và áp dụng ngay cho lượt tải đang chạy"""
+        try:
+            limit = max(0, int(float(self.limit_var.get() or 0) * 1024))
+        except ValueError:
+            limit = int(parse_rate(self.cookie_manager.get_setting("bandwidth_limit", 0)))
+            self.limit_var.set(str(limit // 1024))
+            return
+        self.cookie_manager.set_setting("bandwidth_limit", limit)
+        if self.downloader:
+            self.downloader.bandwidth.set_limit(limit)
+    
+    def _get_link_normalizer(self):
+        """VideoDownloader dùng để chuẩn hóa link (tạo lần đầu cần đến)"""
+        if self.link_normalizer is None:
+            self.link_normalizer = self.downloader_class("")
+        return self.link_normalizer
+    
+    def _get_links(self, content: str) -> Iterator[str]:
+        """
+        Lấy các link dán trong text box
+        
+        Link import từ file đã nằm sẵn trong hàng đợi; các dòng trong text box được
+        chuẩn hóa lười trên luồng đọc iterator. Link trùng với link đã import được
+        hàng đợi (cùng URL) và batch (cùng video ID) bỏ qua.
+        
+        Args:
+            content: Nội dung text box
+        """
+        importer = LinkImporter(self._get_link_normalizer())
+        return importer.iter_links(content.split('\n'))
     
     def _start_download(self):
         """Bắt đầu tải video"""
         # Kiểm tra cookie
-        cookie = self.cookie_manager.get_cookie()
-        if not cookie:
+        cookies = self.cookie_manager.get_cookies()
+        if not cookies:
             messagebox.showerror("Lỗi", "Vui lòng nhập và lưu cookie trước!")
             return
         
-        # Lấy danh sách link
-        links = self._get_links()
-        if not links:
-            messagebox.showwarning("Cảnh báo", "Vui lòng nhập ít nhất một link video!")
+        # Chuẩn hóa link và thêm vào hàng đợi chạy trên thread riêng, xong thì báo qua ui_events
+        links = self._get_links(self.links_text.get('1.0', tk.END))
+        if not self.is_draining:
+            self.ui_events = queue.Queue()
+        self.is_queueing = True
+        # Import mở hàng đợi riêng (khôi phục job đang chạy) nên chỉ cho import khi không tải
+        self.start_btn.config(state=tk.DISABLED)
+        self.import_btn.config(state=tk.DISABLED)
+        self.progress_label.config(text="Đang chuẩn bị danh sách link...")
+        thread = threading.Thread(target=self._queue_links_worker, args=(links,), daemon=True)
+        thread.start()
+        self._schedule_drain()
+    
+    def _schedule_drain(self):
+        """Bắt đầu lấy sự kiện từ ui_events theo chu kỳ (nếu chưa chạy)"""
+        if not self.is_draining:
+            self.is_draining = True
+            self.root.after(self.UI_TICK_MS, self._drain_ui_events)
+    
+    def _queue_links_worker(self, links: Iterator[str]):
+        """Worker thread thêm link vào hàng đợi cùng các link chưa xong từ lần trước"""
+        try:
+            job_queue = JobQueue.for_folder(self.cookie_manager.get_download_folder())
+            job_queue.add(links, requeue_done=True)
+            pending = job_queue.count(JobQueue.PENDING)
+        except Exception as e:
+            self.ui_events.put(('queue_failed', str(e)))
             return
+        self.ui_events.put(('queued', job_queue, pending))
+    
+    def _on_links_queued(self, job_queue: JobQueue, pending: int) -> bool:
+        """
+        Bắt đầu tải khi link đã vào hàng đợi
+        
+        Returns:
+            True nếu đã bắt đầu tải, False nếu hàng đợi không có link nào
+        """
+        self.is_queueing = False
+        if not pending:
+            job_queue.close()
+            self.start_btn.config(state=tk.NORMAL)
+            self.import_btn.config(state=tk.NORMAL)
+            self.progress_label.config(text="Sẵn sàng")
+            messagebox.showwarning("Cảnh báo", "Vui lòng nhập ít nhất một link video!")
+            return False
+        self.job_queue = job_queue
+        cookies = self.cookie_manager.get_cookies()
         
         # Khởi tạo downloader
-        self.downloader = self.downloader_class(cookie)
+        self.downloader = self.downloader_class(cookies, self.cookie_manager.get_settings())
         
         # Reset trạng thái
         self.is_downloading = True
         self.should_stop = False
         self.results = []
         self.status_tree.delete(*self.status_tree.get_children())
+        self.row_ids = {}
+        self.finished_rows = {'success': deque(), 'failed': deque()}
+        self.job_indexes = {}
+        self.active_progress = {}
+        self.total_jobs = pending
+        self.success_count = 0
+        self.failed_count = 0
+        self.duplicate_count = 0
+        self.stopped_count = 0
         
         # Cập nhật UI
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
+        self.pause_btn.config(state=tk.NORMAL, text="Tạm dừng")
         self.progress_var.set(0)
-        self.progress_label.config(text=f"Đang tải 0/{len(links)}...")
-        
-        # Thêm các link vào treeview
-        for link in links:
-            self.status_tree.insert('', tk.END, values=(link, 'Đang chờ...', ''))
+        self.progress_label.config(text=f"Đang tải 0/{pending}...")
+        self._update_stats_label()
         
-        # Chạy download trong thread riêng
-        thread = threading.Thread(target=self._download_worker, args=(links,), daemon=True)
+        # Chạy download trong thread riêng; dòng trạng thái chỉ được tạo khi job bắt đầu
+        thread = threading.Thread(target=self._download_worker, args=(job_queue,), daemon=True)
         thread.start()
+        return True
     
-    def _download_worker(self, links: List[str]):
-        """Worker thread để tải video"""
-        total = len(links)
+    def _download_worker(self, job_queue: JobQueue):
+        """Worker thread để tải video (lấy job từ hàng đợi theo độ ưu tiên)"""
         download_folder = self.cookie_manager.get_download_folder()
-        naming_mode = self.cookie_manager.get_setting("naming_mode", "video_id")
         
-        for idx, link in enumerate(links):
-            if self.should_stop:
+        self.downloader.open_stores(download_folder)
+        self.batch = create_batch_downloader(
+            self.downloader, download_folder, self.cookie_manager.get_settings()
+        )
+        if self.should_stop:
+            self.batch.stop()
+        
+        def on_start(idx, link):
+            self.ui_events.put(('start', idx, link))
+        
+        def on_result(idx, result):
+            self.ui_events.put(('result', idx, result))
+        
+        def on_progress(snapshot):
+            self.ui_events.put(('progress', snapshot))
+        
+        self.downloader.progress.callback = on_progress
+        
+        try:
+            self.results = self.batch.run_queue(job_queue, on_start=on_start, on_result=on_result)
+        finally:
+            self.downloader.close_stores()
+            job_queue.close()
+            # Hoàn tất
+            self.ui_events.put(('done',))
+    
+    def _drain_ui_events(self):
+        """
+        Lấy các sự kiện worker đã đẩy vào hàng đợi và cập nhật giao diện một lượt
+        
+        Chạy trên main thread theo chu kỳ UI_TICK_MS, nên worker không bao giờ
+        chạm trực tiếp vào widget Tk. Dừng khi không còn import, thêm link hay tải.
+        """
+        done = False
+        changed = False
+        # Chỉ giữ cập nhật tiến độ mới nhất của mỗi job trong lượt này
+        progress = {}
+        for _ in range(self.MAX_EVENTS_PER_TICK):
+            try:
+                event = self.ui_events.get_nowait()
+            except queue.Empty:
                 break
             
-            # Cập nhật progress
-            progress = (idx / total) * 100
-            self.root.after(0, lambda p=progress, i=idx, t=total: self._update_progress(p, i, t))
-            
-            # Xử lý video
-            result = self.downloader.process_video(link, download_folder, naming_mode)
-            self.results.append(result)
-            
-            # Cập nhật trạng thái trong treeview
+            kind = event[0]
+            if kind == 'start':
+                _, idx, link = event
+                self.job_indexes[link] = idx
+                self._show_row(idx, (link, 'Đang tải...', ''))
+            elif kind == 'progress':
+                _, snapshot = event
+                progress[snapshot['job']] = snapshot
+            elif kind == 'result':
+                _, idx, result = event
+                progress.pop(result.get('url'), None)
+                self._apply_result(idx, result)
+                changed = True
+            elif kind == 'done':
+                done = True
+                break
+            elif kind == 'queued':
+                _, job_queue, pending = event
+                self._on_links_queued(job_queue, pending)
+            elif kind == 'queue_failed':
+                _, error = event
+                self.is_queueing = False
+                self.start_btn.config(state=tk.NORMAL)
+                self.import_btn.config(state=tk.NORMAL)
+                self.progress_label.config(text="Sẵn sàng")
+                messagebox.showerror("Lỗi", f"Không thể thêm link vào hàng đợi: {error}")
+            elif kind == 'import_progress':
+                _, name, count = event
+                self.progress_label.config(text=f"Đang import {name}: {count} link...")
+            elif kind == 'imported':
+                _, name, count, preview, stats = event
+                self._on_links_imported(name, count, preview, stats)
+            elif kind == 'import_failed':
+                _, error, count = event
+                self._import_finished()
+                self.progress_label.config(text="Sẵn sàng")
+                messagebox.showerror("Lỗi", f"Không thể import file (đã thêm {count} link): {error}")
+        
+        for snapshot in progress.values():
+            self._apply_progress(snapshot)
+        
+        if changed or progress or self.active_progress:
+            finished = self.success_count + self.failed_count + self.duplicate_count + self.stopped_count
+            total = max(self.total_jobs, 1)
+            partial = sum(self.active_progress.values())
+            self._update_progress((finished + partial) / total * 100, finished, self.total_jobs)
+        if changed:
+            self._update_stats_label()
+        
+        if done:
+            self._download_complete()
+        if self.is_downloading or self.is_queueing or self.is_importing:
+            self.root.after(self.UI_TICK_MS, self._drain_ui_events)
+        else:
+            self.is_draining = False
+    
+    def _show_row(self, idx: int, values: tuple):
+        """Cập nhật dòng của job idx, tạo dòng mới nếu chưa hiển thị"""
+        row_id = self.row_ids.get(idx)
+        if row_id is None:
+            self.row_ids[idx] = self.status_tree.insert('', tk.END, values=values)
+        else:
+            self.status_tree.item(row_id, values=values)
+    
+    def _apply_progress(self, snapshot: Dict):
+        """Hiện phần trăm, tốc độ và thời gian còn lại của một job đang tải"""
+        job = snapshot['job']
+        idx = self.job_indexes.get(job)
+        if idx is None or snapshot['state'] != "downloading":
+            return
+        if snapshot['percent'] is not None:
+            self.active_progress[job] = snapshot['percent'] / 100
+        
+        if snapshot['stalled']:
+            status = f"Đang đứng {snapshot['stalled_for']:.0f}s..."
+        elif snapshot['percent'] is not None:
+            status = (
+                f"{snapshot['percent']:.0f}% · {format_bytes(snapshot['avg_speed'])}/s"
+                f" · còn {format_eta(snapshot['eta'])}"
+            )
+        else:
+            status = f"{format_bytes(snapshot['received'])} · {format_bytes(snapshot['avg_speed'])}/s"
+        if idx in self.row_ids:
+            self._show_row(idx, (job, status, snapshot.get('file') or ''))
+    
+    def _apply_result(self, idx: int, result: Dict):
+        """Cập nhật bộ đếm và dòng trạng thái khi một job kết thúc"""
+        url = result.get('url')
+        self.active_progress.pop(url, None)
+        self.job_indexes.pop(url, None)
+        if result.get('skipped') == "downloaded":
+            status = "✓ Đã tải trước đó"
+        elif result.get('skipped') == "duplicate":
+            status = "↷ Trùng lặp trong danh sách"
+        elif result.get('skipped') == "stopped":
+            status = "■ Đã dừng trước khi tải"
+        else:
             status = "✓ Thành công" if result['success'] else f"✗ {result.get('error', 'Lỗi')}"
-            file_path = result.get('file_path', '')
-            
-            # Tìm item trong treeview và cập nhật
-            items = self.status_tree.get_children()
-            if idx < len(items):
-                item = items[idx]
-                self.root.after(0, lambda i=item, s=status, f=file_path: 
-                               self.status_tree.item(i, values=(link, s, os.path.basename(f) if f else '')))
-        
-        # Hoàn tất
-        self.root.after(0, self._download_complete)
+        file_path = result.get('file_path') or ''
+        self._show_row(idx, (result.get('url', ''), status, os.path.basename(file_path)))
+        
+        # Link trùng lặp / job bị dừng không phải lỗi: không tính vào thất bại, dòng được ẩn như dòng thành công
+        outcome = 'success' if result['success'] or result.get('skipped') in ("duplicate", "stopped") else 'failed'
+        if result['success']:
+            self.success_count += 1
+        elif result.get('skipped') == "duplicate":
+            self.duplicate_count += 1
+        elif result.get('skipped') == "stopped":
+            self.stopped_count += 1
+        else:
+            self.failed_count += 1
+        self.finished_rows[outcome].append(idx)
+        self._trim_rows()
+    
+    def _trim_rows(self):
+        """Ẩn bớt dòng đã xong cũ nhất (ưu tiên dòng thành công) khi vượt MAX_STATUS_ROWS"""
+        while len(self.row_ids) > self.MAX_STATUS_ROWS:
+            finished = self.finished_rows['success'] or self.finished_rows['failed']
+            if not finished:
+                break
+            row_id = self.row_ids.pop(finished.popleft(), None)
+            if row_id is not None:
+                self.status_tree.delete(row_id)
+    
+    def _update_stats_label(self):
+        """Cập nhật dòng thống kê"""
+        finished = self.success_count + self.failed_count + self.duplicate_count + self.stopped_count
+        hidden = finished - len(self.finished_rows['success']) - len(self.finished_rows['failed'])
+        text = (
+            f"Tổng: {self.total_jobs} | Thành công: {self.success_count} | "
+            f"Thất bại: {self.failed_count} | Đang chờ: {self.total_jobs - finished}"
+        )
+        if self.duplicate_count:
+            text += f" | Trùng lặp: {self.duplicate_count}"
+        if self.stopped_count:
+            text += f" | Đã dừng: {self.stopped_count}"
+        if hidden > 0:
+            text += f" | Đã ẩn {hidden} dòng cũ"
+        self.stats_label.config(text=text)
     
     def _update_progress(self, progress: float, current: int, total: int):
-        """Cập nhật progress bar"""
+        """Cập nhật progress bar kèm tổng tốc độ và thời gian còn lại của các job đang tải"""
         self.progress_var.set(progress)
-        self.progress_label.config(text=f"Đang tải {current}/{total}...")
+        text = f"Đang tải {current}/{total}..."
+        aggregate = self.downloader.progress.aggregate() if self.downloader else None
+        if aggregate and aggregate['active']:
+            text += (
+                f" | {aggregate['active']} đang tải · {format_bytes(aggregate['speed'])}/s"
+                f" · còn {format_eta(aggregate['eta'])}"
+            )
+            if aggregate['stalled']:
+                text += f" · {aggregate['stalled']} đang đứng"
+        self.progress_label.config(text=text)
     
     def _download_complete(self):
         """Hoàn tất quá trình tải"""
         self.is_downloading = False
         self.start_btn.config(state=tk.NORMAL)
+        self.import_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
+        self.pause_btn.config(state=tk.DISABLED, text="Tạm dừng")
+        self.job_queue = None
         self.progress_var.set(100)
         
         # Thống kê
-        total = len(self.results)
-        success = sum(1 for r in self.results if r['success'])
-        failed = total - success
+        success = self.success_count
+        failed = self.failed_count
+        total = success + failed
         
         self.progress_label.config(text=f"Hoàn tất! Thành công: {success}/{total}")
-        self.stats_label.config(text=f"Tổng: {total} | Thành công: {success} | Thất bại: {failed}")
+        self._update_stats_label()
         
         # Hiển thị thông báo
         download_folder = self.cookie_manager.get_download_folder()
@@ -310,13 +721,28 @@ class MainWindow:
             "Hoàn tất",
             f"Đã tải xong {total} video!\n\n"
             f"Thành công: {success}\n"
-            f"Thất bại: {failed}\n\n"
+            f"Thất bại: {failed}\n"
+            f"Bỏ qua (trùng lặp): {self.duplicate_count}\n\n"
             f"Thư mục: {download_folder}"
         )
     
+    def _toggle_pause(self):
+        """Tạm dừng / tiếp tục hàng đợi (video đang tải dở vẫn tải nốt)"""
+        if not self.job_queue:
+            return
+        if self.job_queue.is_paused:
+            self.job_queue.resume()
+            self.pause_btn.config(text="Tạm dừng")
+        else:
+            self.job_queue.pause()
+            self.pause_btn.config(text="Tiếp tục")
+            self.progress_label.config(text="Đã tạm dừng (video đang tải dở sẽ tải nốt)")
+    
     def _stop_download(self):
-        """Dừng quá trình tải"""
+        """Dừng quá trình tải (link chưa tải vẫn nằm trong hàng đợi cho lần sau)"""
         self.should_stop = True
+        if self.batch:
+            self.batch.stop()
         self.progress_label.config(text="Đang dừng...")
 
 